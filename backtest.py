@@ -0,0 +1,541 @@
+#!/usr/bin/env python3
+"""Offline backtest of signal providers for the FX Signal Copier bot.
+
+Replays a file of historical signals through ParseSignal and the position sizing of SizeTrade, and
+simulates the fills, stop losses and take profits of every signal against local M1 bars or ticks. Price files
+are converted once into NumPy arrays next to them and memory-mapped from then on, and every signal is resolved
+with vectorized scans over the bars that follow it instead of a Python loop per bar, so years of M1 data for
+all symbols replay in seconds.
+
+Run with `python backtest.py signals.jsonl --prices data/`. The signals file is JSON lines or CSV with the
+fields time, provider and text. The prices directory holds one file per symbol, e.g. EURUSD.csv or
+EURUSD.parquet, with a time column (or date and time columns) and either open/high/low/close or bid columns.
+CSV files may be separated by commas, tabs or semicolons, so MetaTrader exports can be used as they are.
+"""
+import argparse
+import collections
+import csv
+import dataclasses
+import heapq
+import json
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+from prettytable import PrettyTable
+
+import run
+
+# bars scanned at once when looking for a price crossing, doubled after every miss (one day of M1 bars)
+SCAN_CHUNK = 1440
+
+# names that price files use for their time column
+TIME_COLUMNS = ['time', 'timestamp', 'datetime', 'date']
+
+# delimiters of CSV price files, MetaTrader exports use tabs and some locales semicolons
+DELIMITERS = ',\t;'
+
+
+# Price Data
+def ParseTimes(values: list) -> np.ndarray:
+    """Converts the time column of a price or signal file to Unix seconds.
+
+    Arguments:
+        values: Unix times or ISO/MetaTrader dates such as '2021-01-04 00:01' and '2021.01.04 00:01'
+
+    Returns:
+        an int64 array of Unix seconds
+    """
+
+    try:
+        return np.asarray(values, dtype=np.float64).astype(np.int64)
+
+    except ValueError:
+        return np.array([NormalizeDate(str(value)) for value in values], dtype='datetime64[s]').astype(np.int64)
+
+def NormalizeDate(value: str) -> str:
+    """Rewrites a date in the ISO 8601 form that NumPy parses.
+
+    Arguments:
+        value: date such as '2021.01.04 00:01', '2021-01-04T00:01:00Z' or '2021-01-04'
+
+    Returns:
+        the date as 'YYYY-MM-DDTHH:MM:SS' or 'YYYY-MM-DD', without a time zone
+    """
+
+    value = value.strip().rstrip('Z')
+
+    # MetaTrader writes dates with dots
+    date = value[:10].replace('.', '-')
+
+    if len(value) <= 10:
+        return date
+
+    return date + 'T' + value[11:19]
+
+def ReadColumns(path: str) -> dict:
+    """Reads every column of a CSV or Parquet price file, CSV files may be separated by commas, tabs or semicolons.
+
+    Arguments:
+        path: price file
+
+    Returns:
+        a dictionary from lowercase column names to lists or arrays of values
+    """
+
+    if path.endswith('.parquet'):
+        try:
+            import pyarrow.parquet
+        except ImportError:
+            raise SystemExit(f'Reading {path} needs pyarrow, install it or convert the file to CSV')
+
+        table = pyarrow.parquet.read_table(path)
+
+        return {name.lower(): table.column(name).to_numpy() for name in table.column_names}
+
+    with open(path, newline='') as file:
+        firstLine = file.readline()
+        file.seek(0)
+
+        try:
+            dialect = csv.Sniffer().sniff(firstLine, delimiters=DELIMITERS)
+        except csv.Error:
+            dialect = csv.excel
+
+        reader = csv.reader(file, dialect)
+        header = [name.strip().lower().strip('<>').strip() for name in next(reader, [])]
+        columns = [[] for _ in header]
+
+        for row in reader:
+            for column, value in zip(columns, row):
+                column.append(value)
+
+    return dict(zip(header, columns))
+
+def ReadPriceFile(path: str) -> tuple:
+    """Reads a file of M1 bars or ticks into arrays sorted by time.
+
+    Arguments:
+        path: CSV or Parquet price file
+
+    Returns:
+        the bar times in Unix seconds and a (4, bars) array of open, high, low and close prices
+    """
+
+    columns = ReadColumns(path)
+    timeColumn = next((name for name in TIME_COLUMNS if name in columns), None)
+
+    if timeColumn is None:
+        raise ValueError(f"{path} has no time column, expected one of {', '.join(TIME_COLUMNS)} but found {', '.join(columns) or 'no columns'}")
+
+    missing = [name for name in ['open', 'high', 'low', 'close'] if name not in columns] if 'open' in columns or 'bid' not in columns else []
+
+    if missing:
+        raise ValueError(f"{path} has no {', '.join(missing)} column, expected open, high, low and close or bid prices")
+
+    # MetaTrader exports keep the date and the time of day in separate columns
+    if 'date' in columns and 'time' in columns:
+        times = ParseTimes([f'{date} {clock}' for date, clock in zip(columns['date'], columns['time'])])
+    else:
+        times = ParseTimes(columns[timeColumn])
+
+    # ticks become bars whose four prices are the bid
+    if 'open' in columns:
+        prices = np.vstack([np.asarray(columns[name], dtype=np.float64) for name in ['open', 'high', 'low', 'close']])
+    else:
+        prices = np.tile(np.asarray(columns['bid'], dtype=np.float64), (4, 1))
+
+    if len(times) > 1 and np.any(np.diff(times) < 0):
+        order = np.argsort(times, kind='stable')
+        times, prices = times[order], prices[:, order]
+
+    return times, prices
+
+
+class PriceData:
+    """Memory-mapped price arrays of every symbol, converted from the CSV or Parquet files on first use.
+
+    The converted arrays are stored as .npy files next to the source file and rebuilt when the source changes,
+    so only the first run pays for parsing the text files.
+    """
+
+    def __init__(self, directory: str):
+        """Creates the price data of a directory without reading anything yet.
+
+        Arguments:
+            directory: directory with one price file per symbol
+        """
+
+        self.directory = directory
+
+        # bar times and prices keyed by symbol, None for symbols without a price file
+        self.series = {}
+
+    def source(self, symbol: str) -> str:
+        """Finds the price file of a symbol.
+
+        Arguments:
+            symbol: symbol from SYMBOLS
+
+        Returns:
+            the path of the price file, or None if there is none
+        """
+
+        for name in [symbol, symbol.lower()]:
+            for extension in ['.parquet', '.csv']:
+                path = os.path.join(self.directory, name + extension)
+
+                if os.path.exists(path):
+                    return path
+
+        return None
+
+    def get(self, symbol: str) -> tuple:
+        """Returns the memory-mapped prices of a symbol, converting its price file first if needed.
+
+        Arguments:
+            symbol: symbol from SYMBOLS
+
+        Returns:
+            the bar times and the (4, bars) array of open, high, low and close, or None without a price file
+        """
+
+        if symbol in self.series:
+            return self.series[symbol]
+
+        path = self.source(symbol)
+
+        if path is None:
+            self.series[symbol] = None
+            return None
+
+        timesPath = os.path.join(self.directory, f'{symbol}.times.npy')
+        pricesPath = os.path.join(self.directory, f'{symbol}.prices.npy')
+
+        # converts the text file again only when it is newer than the arrays
+        if not os.path.exists(pricesPath) or os.path.getmtime(pricesPath) < os.path.getmtime(path):
+            times, prices = ReadPriceFile(path)
+            np.save(timesPath, times)
+            np.save(pricesPath, prices)
+
+        self.series[symbol] = (np.load(timesPath, mmap_mode='r'), np.load(pricesPath, mmap_mode='r'))
+
+        return self.series[symbol]
+
+
+# Signal History
+def LoadSignals(path: str) -> list:
+    """Loads the historical signals to replay, oldest first.
+
+    Arguments:
+        path: JSON lines or CSV file with the fields time, provider and text
+
+    Returns:
+        a list of dictionaries with the keys Time, Provider and Text
+    """
+
+    if path.endswith('.csv'):
+        with open(path, newline='') as file:
+            records = list(csv.DictReader(file))
+    else:
+        with open(path) as file:
+            records = [json.loads(line) for line in file if line.strip()]
+
+    times = ParseTimes([record['time'] for record in records]) if records else []
+
+    signals = [{'Time': int(signalTime), 'Provider': record.get('provider') or 'default', 'Text': record['text']} for signalTime, record in zip(times, records)]
+    signals.sort(key=lambda signal: signal['Time'])
+
+    return signals
+
+
+# Simulation
+def FirstCrossing(prices: np.ndarray, start: int, stop: int, level: float, above: bool) -> int:
+    """Finds the first bar that reaches a price level, scanning chunks of growing size with NumPy.
+
+    Arguments:
+        prices: highs when looking for a crossing from below, lows otherwise
+        start: index of the first bar to scan
+        stop: index after the last bar to scan
+        level: price level
+        above: whether the price has to reach the level from below
+
+    Returns:
+        the index of the first bar that reaches the level, or -1 if none does
+    """
+
+    chunk = SCAN_CHUNK
+
+    while start < stop:
+        end = min(stop, start + chunk)
+        window = prices[start:end]
+        hits = window >= level if above else window <= level
+
+        if hits.any():
+            return start + int(hits.argmax())
+
+        # most levels are reached within a day, the rest are looked for in ever larger chunks
+        start = end
+        chunk *= 2
+
+    return -1
+
+def SimulateTrade(trade: run.Trade, times: np.ndarray, prices: np.ndarray, signalTime: int, balance: float, specification: dict, currency: str, maxHold: float, pendingExpiry: float) -> dict:
+    """Simulates the fill and the exit of every take profit leg of a parsed signal.
+
+    A bar that reaches both the stop loss and a take profit counts as a stop loss, since M1 bars do not tell
+    which came first. Legs that are neither stopped nor taken within the holding time are closed at the close.
+
+    Arguments:
+        trade: trade signal information, as returned by ParseSignal
+        times: bar times in Unix seconds
+        prices: (4, bars) array of open, high, low and close
+        signalTime: Unix time the signal was sent
+        balance: balance the trade is sized for
+        specification: broker symbol specification of the symbol, may be None
+        currency: account currency
+        maxHold: seconds after which open legs are closed
+        pendingExpiry: seconds after which a pending order that was not filled is cancelled
+
+    Returns:
+        a dictionary with the status, the fill and every leg with its exit, exit time and profit
+    """
+
+    start = int(np.searchsorted(times, signalTime, 'left'))
+
+    if start >= len(times):
+        return {'Status': 'No Data', 'Legs': []}
+
+    buy = trade.side is run.Side.BUY
+    direction = 1 if buy else -1
+    opens, highs, lows, closes = prices
+
+    # fills market executions at the open of the next bar and pending orders when the price reaches the entry
+    if trade.market:
+        fillIndex = start
+        fill = float(opens[start])
+    else:
+        expiry = int(np.searchsorted(times, signalTime + pendingExpiry, 'left'))
+        reachesFromBelow = trade.order_type in [run.OrderType.BUY_STOP, run.OrderType.SELL_LIMIT]
+        fillIndex = FirstCrossing(highs if reachesFromBelow else lows, start, expiry, trade.entry, reachesFromBelow)
+        fill = trade.entry
+
+        if fillIndex < 0:
+            return {'Status': 'Expired', 'Legs': []}
+
+    # sizes the trade exactly like the live bot does
+    trade = run.SizeTrade(dataclasses.replace(trade, entry=fill), balance, specification, currency)
+    legVolume = trade.leg_volume
+
+    end = int(np.searchsorted(times, times[fillIndex] + maxHold, 'left'))
+    stopIndex = FirstCrossing(highs if not buy else lows, fillIndex, end, trade.stop_loss, not buy)
+
+    legs = []
+
+    for takeProfit in trade.take_profits:
+        # a take profit only matters if it is reached before the stop loss
+        takeProfitIndex = FirstCrossing(highs if buy else lows, fillIndex, stopIndex if stopIndex >= 0 else end, takeProfit, buy)
+
+        if takeProfitIndex >= 0:
+            status, exitIndex, exitPrice = 'TP', takeProfitIndex, takeProfit
+        elif stopIndex >= 0:
+            status, exitIndex, exitPrice = 'SL', stopIndex, trade.stop_loss
+        else:
+            status, exitIndex = 'Closed', max(fillIndex, end - 1)
+            exitPrice = float(closes[exitIndex])
+
+        profit = (exitPrice - fill) * direction / trade.pip_size * trade.pip_value * legVolume
+        legs.append({'Status': status, 'ExitTime': int(times[exitIndex]), 'Profit': profit, 'Volume': legVolume})
+
+    return {'Status': 'Filled', 'FillTime': int(times[fillIndex]), 'Fill': fill, 'PositionSize': trade.position_size, 'Legs': legs}
+
+def Backtest(signals: list, prices: PriceData, balance: float, riskFactor: float, specifications: dict, currency: str, maxHold: float, pendingExpiry: float) -> dict:
+    """Replays every signal in time order, each provider on its own simulated account.
+
+    Trades are sized on the balance that was realized when their signal arrived, so the profits of earlier
+    signals compound like they would on a live account.
+
+    Arguments:
+        signals: signals returned by LoadSignals
+        prices: price data of the symbols
+        balance: starting balance of every provider's account
+        riskFactor: share of the balance risked per signal
+        specifications: broker symbol specifications keyed by symbol
+        currency: account currency
+        maxHold: seconds after which open legs are closed
+        pendingExpiry: seconds after which a pending order that was not filled is cancelled
+
+    Returns:
+        the statistics of every provider keyed by provider name
+    """
+
+    providers = {}
+
+    def Realize(state: dict, until: float) -> None:
+        while state['Open'] and state['Open'][0][0] <= until:
+            exitTime, profit = heapq.heappop(state['Open'])
+            state['Balance'] += profit
+            state['Closed'].append((exitTime, profit))
+
+    for signal in signals:
+        state = providers.setdefault(signal['Provider'], {'Balance': balance, 'Open': [], 'Closed': [], 'Signals': 0, 'Skipped': 0, 'Invalid': 0, 'NoData': 0, 'Expired': 0, 'Filled': 0, 'Legs': collections.Counter()})
+        state['Signals'] += 1
+
+        Realize(state, signal['Time'])
+
+        # a provider that wiped out its account copies nothing anymore
+        if state['Balance'] <= 0:
+            state['Skipped'] += 1
+            continue
+
+        trade = run.ParseSignal(signal['Text'], riskFactor)
+
+        if not trade:
+            state['Invalid'] += 1
+            continue
+
+        series = prices.get(trade.symbol)
+
+        if series is None:
+            state['NoData'] += 1
+            continue
+
+        result = SimulateTrade(trade, series[0], series[1], signal['Time'], state['Balance'], specifications.get(trade.symbol), currency, maxHold, pendingExpiry)
+
+        if result['Status'] == 'No Data':
+            state['NoData'] += 1
+        elif result['Status'] == 'Expired':
+            state['Expired'] += 1
+        else:
+            state['Filled'] += 1
+
+        for leg in result['Legs']:
+            state['Legs'][leg['Status']] += 1
+            heapq.heappush(state['Open'], (leg['ExitTime'], leg['Profit']))
+
+    results = {}
+
+    for provider, state in providers.items():
+        Realize(state, float('inf'))
+        results[provider] = Summarize(state, balance)
+
+    return results
+
+def Summarize(state: dict, balance: float) -> dict:
+    """Computes the profit, drawdown and hit rate of a provider from its closed legs.
+
+    Arguments:
+        state: simulated account of the provider after the replay
+        balance: starting balance of the account
+
+    Returns:
+        a dictionary with the statistics of the provider
+    """
+
+    closed = sorted(state['Closed'])
+    profits = np.array([profit for _, profit in closed], dtype=np.float64)
+
+    # the equity curve after every closed leg, starting from the initial balance
+    equity = balance + np.concatenate([[0.0], np.cumsum(profits)])
+    peaks = np.maximum.accumulate(equity)
+    drawdown = min(1.0, float(np.max((peaks - equity) / peaks)))
+
+    decided = state['Legs']['TP'] + state['Legs']['SL']
+
+    return {
+        'Signals': state['Signals'],
+        'Skipped': state['Skipped'],
+        'Invalid': state['Invalid'],
+        'NoData': state['NoData'],
+        'Expired': state['Expired'],
+        'Filled': state['Filled'],
+        'Legs': dict(state['Legs']),
+        'HitRate': state['Legs']['TP'] / decided if decided else 0.0,
+        'NetProfit': float(profits.sum()),
+        'GrossProfit': float(profits[profits > 0].sum()),
+        'GrossLoss': float(np.abs(profits[profits < 0].sum())),
+        'MaxDrawdown': drawdown,
+        'FinalBalance': float(equity[-1]),
+    }
+
+
+# Reports
+def CreateBacktestTable(results: dict) -> PrettyTable:
+    """Creates PrettyTable object to display the backtest of every provider.
+
+    Arguments:
+        results: statistics returned by Backtest
+
+    Returns:
+        a Pretty Table object with one row per provider, the most profitable first
+    """
+
+    table = PrettyTable()
+
+    table.title = "Provider Backtest"
+    table.field_names = ["Provider", "Signals", "Filled", "Legs", "Hit Rate", "Net P&L", "Max DD", "Balance"]
+    table.align["Provider"] = "l"
+
+    for provider, result in sorted(results.items(), key=lambda item: -item[1]['NetProfit']):
+        table.add_row([provider, result['Signals'], result['Filled'], sum(result['Legs'].values()), '{:.0%}'.format(result['HitRate']), '$ {:,.2f}'.format(result['NetProfit']), '{:.1%}'.format(result['MaxDrawdown']), '$ {:,.2f}'.format(result['FinalBalance'])])
+
+    return table
+
+def LoadSpecifications(path: str) -> dict:
+    """Loads broker symbol specifications from the cache file that the bot writes.
+
+    Arguments:
+        path: file written by SymbolSpecificationCache, nothing is loaded when it does not exist
+
+    Returns:
+        the specifications of the first account keyed by symbol
+    """
+
+    if not path or not os.path.exists(path):
+        return {}
+
+    with open(path) as file:
+        data = json.load(file)
+
+    return next(iter(data.values()), {}).get('Specifications', {})
+
+def main() -> None:
+    """Runs the backtest and prints the statistics of every provider."""
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('signals', help='JSON lines or CSV file with the fields time, provider and text')
+    parser.add_argument('--prices', required=True, help='directory with one CSV or Parquet price file per symbol')
+    parser.add_argument('--balance', type=float, default=10000, help='starting balance of every provider')
+    parser.add_argument('--risk-factor', type=float, default=run.DEFAULT_RISK_FACTOR, help='share of the balance risked per signal')
+    parser.add_argument('--currency', default='USD', help='account currency')
+    parser.add_argument('--specifications', default=run.SYMBOL_CACHE_FILE, help='symbol specifications cached by the bot, used for pip sizes and values')
+    parser.add_argument('--max-hold', type=float, default=7 * 24, help='hours after which open legs are closed')
+    parser.add_argument('--pending-expiry', type=float, default=24, help='hours after which unfilled pending orders are cancelled')
+    parser.add_argument('--json', action='store_true', help='print the statistics as JSON instead of a table')
+
+    arguments = parser.parse_args()
+
+    # the bot logs every parsed signal, which would flood the output
+    logging.disable(logging.CRITICAL)
+
+    start = time.perf_counter()
+
+    signals = LoadSignals(arguments.signals)
+    results = Backtest(signals, PriceData(arguments.prices), arguments.balance, arguments.risk_factor, LoadSpecifications(arguments.specifications), arguments.currency, arguments.max_hold * 60 * 60, arguments.pending_expiry * 60 * 60)
+
+    elapsed = time.perf_counter() - start
+
+    if arguments.json:
+        json.dump({'elapsed_seconds': elapsed, 'providers': results}, sys.stdout, indent=2)
+        print()
+    else:
+        print(CreateBacktestTable(results))
+        print(f'Replayed {len(signals)} signals in {elapsed:.2f} seconds')
+
+    return
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,557 @@
+#!/usr/bin/env python3
+"""Benchmarks for the FX Signal Copier bot.
+
+Run with `python benchmark.py parser` to measure the throughput of ParseSignal over a generated corpus of signal
+formats, or with `python benchmark.py e2e` to drive PlaceTrade/CalculateTrade end to end against local stand-ins
+for MetaApi and Telegram with injected latency and failures, in one process or sharded over --workers processes. Results are printed as a single JSON object so they
+can be stored and compared between deploys.
+"""
+import argparse
+import asyncio
+import functools
+import itertools
+import json
+import logging
+import math
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import run
+
+# symbols and the number of decimals their prices are quoted with
+BENCHMARK_SYMBOLS = {'EURUSD': 5, 'GBPUSD': 5, 'AUDCAD': 5, 'NZDUSD': 5, 'USDJPY': 3, 'GBPJPY': 3, 'XAUUSD': 2, 'XAGUSD': 3}
+
+# the different ways channels write each part of a signal
+SYMBOL_FORMATS = ['{symbol}', '#{symbol}', '{base}/{quote}', '{symbol_lower}', '{symbol}.m']
+ORDER_FORMATS = ['{order}', '{order_upper}', '{order_lower}']
+ENTRY_FORMATS = ['Entry {entry}', 'Entry: {entry}', '@ {entry}', 'Price {entry}', 'Entry {entry} - {entry_range}']
+STOP_LOSS_FORMATS = ['SL {stop_loss}', 'SL: {stop_loss}', 'S/L {stop_loss}', 'Stop Loss {stop_loss}', 'sl - {stop_loss}']
+TAKE_PROFIT_FORMATS = ['TP {take_profit}', 'TP{index} {take_profit}', 'TP{index}: {take_profit}', 'T/P {take_profit}', 'Take Profit {index} = {take_profit}']
+NOISE = ['🔥🔥 VIP SIGNAL 🔥🔥', 'Risk 1% per trade', 'Use proper money management!', '']
+
+
+def GenerateSignal(rng: random.Random) -> str:
+    """Generates one signal in a randomly chosen real-world format.
+
+    Arguments:
+        rng: random number generator
+
+    Returns:
+        the signal text
+    """
+
+    symbol, digits = rng.choice(list(BENCHMARK_SYMBOLS.items()))
+    order = rng.choice(['Buy', 'Sell', 'Buy Limit', 'Sell Limit', 'Buy Stop', 'Sell Stop'])
+    pip = 10 ** -(digits - 1) if digits in (3, 5) else 10 ** -digits * 10
+
+    entry = round(rng.uniform(1, 2) * (100 if digits == 3 else 1) * (1000 if symbol == 'XAUUSD' else 1), digits)
+    direction = 1 if order.startswith('Buy') else -1
+
+    values = {
+        'symbol': symbol, 'base': symbol[:3], 'quote': symbol[3:], 'symbol_lower': symbol.lower(),
+        'order': order, 'order_upper': order.upper(), 'order_lower': order.lower(),
+        'entry': f'{entry:.{digits}f}', 'entry_range': f'{entry + direction * 5 * pip:.{digits}f}',
+        'stop_loss': f'{entry - direction * 30 * pip:.{digits}f}',
+    }
+
+    header = f"{rng.choice(ORDER_FORMATS)} {rng.choice(SYMBOL_FORMATS)}".format(**values)
+
+    # market executions use the "NOW" keyword for the entry in most channels
+    if order in ('Buy', 'Sell'):
+        lines = [rng.choice(['Entry NOW', 'NOW', 'Entry: NOW'])]
+    else:
+        lines = [rng.choice(ENTRY_FORMATS).format(**values)]
+
+    lines.append(rng.choice(STOP_LOSS_FORMATS).format(**values))
+
+    takeProfitFormat = rng.choice(TAKE_PROFIT_FORMATS)
+
+    for index in range(1, rng.randint(1, 5) + 1):
+        takeProfit = f'{entry + direction * 20 * index * pip:.{digits}f}'
+        lines.append(takeProfitFormat.format(index=index, take_profit=takeProfit))
+
+    # some channels put the labels in a different order
+    if rng.random() < 0.3:
+        rng.shuffle(lines)
+
+    lines.insert(0, header)
+
+    if rng.random() < 0.3:
+        lines.append(rng.choice(NOISE))
+
+    return '\n'.join(lines)
+
+def GenerateCorpus(size: int, seed: int) -> list:
+    """Generates a reproducible corpus of signals.
+
+    Arguments:
+        size: number of signals
+        seed: seed of the random number generator
+
+    Returns:
+        a list of signal texts
+    """
+
+    rng = random.Random(seed)
+
+    return [GenerateSignal(rng) for _ in range(size)]
+
+def Percentile(samples: list, percentile: float) -> float:
+    """Returns the given percentile of a list of samples.
+
+    Arguments:
+        samples: measured values
+        percentile: percentile between 0 and 100
+
+    Returns:
+        the value at the percentile
+    """
+
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(percentile / 100 * (len(ordered) - 1))))
+
+    return ordered[index]
+
+def BenchmarkParser(size: int, rounds: int, seed: int) -> dict:
+    """Measures the throughput and per signal latency of ParseSignal.
+
+    Arguments:
+        size: number of signals in the corpus
+        rounds: number of passes over the corpus
+        seed: seed of the corpus generator
+
+    Returns:
+        a dictionary with the benchmark results
+    """
+
+    corpus = GenerateCorpus(size, seed)
+    parsed = sum(1 for signal in corpus if run.ParseSignal(signal, run.DEFAULT_RISK_FACTOR))
+
+    latencies = []
+    start = time.perf_counter()
+
+    for _ in range(rounds):
+        for signal in corpus:
+            begin = time.perf_counter()
+            run.ParseSignal(signal, run.DEFAULT_RISK_FACTOR)
+            latencies.append(time.perf_counter() - begin)
+
+    elapsed = time.perf_counter() - start
+
+    return {
+        'benchmark': 'parser',
+        'signals': size * rounds,
+        'parsed_ratio': parsed / size,
+        'signals_per_second': size * rounds / elapsed,
+        'latency_us': {
+            'mean': statistics.mean(latencies) * 1e6,
+            'p50': Percentile(latencies, 50) * 1e6,
+            'p95': Percentile(latencies, 95) * 1e6,
+            'p99': Percentile(latencies, 99) * 1e6,
+        },
+    }
+
+
+# Local Stand-ins
+class FakeLatency:
+    """Latencies and failure rate injected into the MetaApi and Telegram stand-ins."""
+
+    def __init__(self, rpc: float, order: float, sync: float, telegram: float, failureRate: float, seed: int, cpu: float = 0):
+        """Stores the injected latencies.
+
+        Arguments:
+            rpc: seconds per informational MetaApi request
+            order: seconds per order request
+            sync: seconds to deploy, connect and synchronize an account
+            telegram: seconds per Telegram request
+            failureRate: share of order requests that are rejected
+            seed: seed of the failure generator
+            cpu: seconds of CPU work per order request, standing in for the SDK's own processing
+        """
+
+        self.rpc = rpc
+        self.order = order
+        self.sync = sync
+        self.telegram = telegram
+        self.failureRate = failureRate
+        self.cpu = cpu
+        self.rng = random.Random(seed)
+
+class FakeTradeError(Exception):
+    """Order rejection raised by the MetaApi stand-in, shaped like the SDK's TradeException."""
+
+    def __init__(self, message: str, stringCode: str):
+        super().__init__(message)
+        self.stringCode = stringCode
+
+class FakeConnection:
+    """Stand-in for a synchronized MetaApi RPC connection."""
+
+    orderIds = itertools.count(1)
+
+    # orders per second accepted per account like a rate limited broker, 0 accepts all, and the refusals
+    rateLimit = 0
+    rateLimited = 0
+
+    def __init__(self, latency: FakeLatency):
+        self.latency = latency
+        self.bucket = run.TokenBucket(self.rateLimit) if self.rateLimit else None
+
+    async def connect(self):
+        await asyncio.sleep(self.latency.sync / 2)
+
+    async def wait_synchronized(self, timeout_in_seconds: float = 300):
+        await asyncio.sleep(self.latency.sync / 2)
+
+    async def close(self):
+        return
+
+    async def get_server_time(self):
+        await asyncio.sleep(self.latency.rpc)
+        return {'time': time.time()}
+
+    async def get_account_information(self):
+        await asyncio.sleep(self.latency.rpc)
+        return {'balance': 10000.0, 'equity': 10000.0, 'margin': 0.0, 'freeMargin': 10000.0, 'currency': 'USD'}
+
+    async def get_symbols(self):
+        await asyncio.sleep(self.latency.rpc)
+        return list(BENCHMARK_SYMBOLS)
+
+    async def get_symbol_specification(self, symbol: str):
+        await asyncio.sleep(self.latency.rpc)
+        digits = BENCHMARK_SYMBOLS[symbol]
+        return {'symbol': symbol, 'tickSize': 10 ** -digits, 'point': 10 ** -digits, 'digits': digits, 'minVolume': 0.01, 'maxVolume': 100, 'volumeStep': 0.01, 'contractSize': 100 if symbol == 'XAUUSD' else 100000, 'baseCurrency': symbol[:3], 'profitCurrency': symbol[3:]}
+
+    async def get_symbol_price(self, symbol: str, keep_subscription: bool = False):
+        await asyncio.sleep(self.latency.rpc)
+        price = 1800.0 if symbol == 'XAUUSD' else 150.0 if BENCHMARK_SYMBOLS[symbol] == 3 else 1.1
+        return {'symbol': symbol, 'bid': price, 'ask': price * 1.0001, 'lossTickValue': 1.0, 'profitTickValue': 1.0}
+
+    async def _order(self, *arguments):
+        if self.bucket is not None:
+            if self.bucket.delay(time.monotonic()) > 0:
+                FakeConnection.rateLimited += 1
+                raise FakeTradeError('Too many requests', 'TRADE_RETCODE_TOO_MANY_REQUESTS')
+
+            self.bucket.take()
+
+        # burns CPU like the serialization of a real request, which holds the GIL of the process
+        deadline = time.thread_time() + self.latency.cpu
+
+        while time.thread_time() < deadline:
+            pass
+
+        await asyncio.sleep(self.latency.order)
+
+        if self.latency.rng.random() < self.latency.failureRate:
+            raise FakeTradeError('Request rejected', 'TRADE_RETCODE_REJECT')
+
+        return {'numericCode': 10009, 'stringCode': 'TRADE_RETCODE_DONE', 'message': 'Request completed', 'orderId': str(next(self.orderIds))}
+
+    create_market_buy_order = create_market_sell_order = _order
+    create_limit_buy_order = create_limit_sell_order = _order
+    create_stop_buy_order = create_stop_sell_order = _order
+
+class FakeAccount:
+    """Stand-in for a deployed MetaApi account."""
+
+    def __init__(self, latency: FakeLatency):
+        self.latency = latency
+        self.state = 'DEPLOYED'
+
+    async def deploy(self):
+        return
+
+    async def wait_connected(self, timeout_in_seconds: float = 300):
+        await asyncio.sleep(self.latency.rpc)
+
+    def get_rpc_connection(self):
+        return FakeConnection(self.latency)
+
+class FakeMetaApi:
+    """Stand-in for the MetaApi client, created by ConnectionManager in place of the real one."""
+
+    latency = None
+
+    def __init__(self, token: str, opts: dict = None):
+        self.metatrader_account_api = self
+
+    async def get_account(self, account_id: str):
+        await asyncio.sleep(self.latency.rpc)
+        return FakeAccount(self.latency)
+
+class FakeMessage:
+    """Stand-in for a Telegram message that records when every reply was sent."""
+
+    # every message comes from its own chat so that generated signals that happen to be equal are not duplicates
+    messageIds = itertools.count(1)
+
+    def __init__(self, text: str, latency: FakeLatency, done: tuple):
+        """Creates the message.
+
+        Arguments:
+            text: signal text
+            latency: injected latencies
+            done: texts of the replies that mark the end of the signal
+        """
+
+        self.text = text
+        self.latency = latency
+        self.done = done
+        self.chat = self
+        self.message_id = next(self.messageIds)
+        self.chat_id = self.id = self.message_id
+        self.username = 'benchmark'
+        self.caption = None
+        self.reply_to_message = None
+        self.replies = []
+        self.finished = threading.Event()
+
+    def reply_text(self, text: str, **kwargs):
+        self.replies.append((time.perf_counter(), text))
+        time.sleep(self.latency.telegram)
+
+        if any(marker in text for marker in self.done):
+            self.finished.set()
+
+        return self
+
+    # edited status messages are recorded like new replies
+    edit_text = reply_text
+
+class FakeUpdate:
+    """Stand-in for a Telegram update."""
+
+    def __init__(self, message: FakeMessage):
+        self.effective_message = message
+        self.effective_chat = message.chat
+        self.edited_message = self.edited_channel_post = None
+
+class FakeContext:
+    """Stand-in for the CallbackContext of a conversation."""
+
+    def __init__(self):
+        self.user_data = {'trade': None}
+
+
+def InstallMetaApiStandIns(latency: FakeLatency, accounts: int, brokerRateLimit: float) -> None:
+    """Points the bot at the MetaApi stand-in, in the front end or as the initializer of every worker.
+
+    Arguments:
+        latency: injected latencies
+        accounts: number of accounts every signal is copied to
+        brokerRateLimit: orders per second the stand-in accepts per account, 0 accepts all
+    """
+
+    FakeMetaApi.latency = latency
+    FakeConnection.rateLimit = brokerRateLimit
+
+    run.MetaApi = FakeMetaApi
+    run.SYMBOL_CACHE = run.SymbolSpecificationCache(path='')
+    run.ACCOUNTS = [{'AccountId': f'benchmark-{count}', 'Name': f'Benchmark {count + 1}', 'RiskFactor': run.DEFAULT_RISK_FACTOR} for count in range(accounts)]
+
+    # the stand-in has no streaming connection
+    run.STREAM_ACCOUNT_STATE = False
+
+    # the bot logs every signal, which would dominate the measurement
+    logging.disable(logging.CRITICAL)
+
+def InstallStandIns(latency: FakeLatency, accounts: int, concurrency: int, brokerRateLimit: float, workers: int = 0) -> None:
+    """Points the bot at the MetaApi stand-in and starts its event loop and workers.
+
+    Arguments:
+        latency: injected latencies
+        accounts: number of accounts every signal is copied to
+        concurrency: maximum number of signals processed at the same time
+        brokerRateLimit: orders per second the stand-in accepts per account, 0 accepts all
+        workers: number of worker processes the accounts are sharded over, 0 runs everything in this process
+    """
+
+    InstallMetaApiStandIns(latency, accounts, brokerRateLimit)
+    run.SIGNAL_SEMAPHORE = asyncio.Semaphore(concurrency)
+
+    # the Telegram stand-in has no flood limits, so replies are stamped as soon as the bot sends them
+    run.MESSAGE_QUEUE = run.MessageQueue(rate=math.inf, chat_rate=math.inf)
+
+    # journals into a throwaway database so its cost is part of the measurement
+    run.JOURNAL = run.SignalJournal(path=os.path.join(tempfile.mkdtemp(), 'journal.sqlite3'))
+    run.JOURNAL.open()
+    run.DEDUPLICATOR = run.SignalDeduplicator(run.JOURNAL)
+
+    run.CONNECTION_MANAGER.start()
+
+    # every worker installs the same stand-ins and prepares the accounts it owns
+    if workers:
+        run.WORKER_POOL = run.WorkerPool(workers, functools.partial(InstallMetaApiStandIns, latency, accounts, brokerRateLimit))
+        run.WORKER_POOL.start()
+
+        async def Prewarm() -> None:
+            await asyncio.gather(*[run.WORKER_POOL.call(account['AccountId'], 'prewarm', account) for account in run.ACCOUNTS])
+
+        run.CONNECTION_MANAGER.run(Prewarm())
+    else:
+        run.CONNECTION_MANAGER.run(run.PrepareAccounts())
+
+def BenchmarkEndToEnd(signals: int, mode: str, accounts: int, concurrency: int, latency: FakeLatency, seed: int, timeout: float, brokerRateLimit: float = 0, workers: int = 0) -> dict:
+    """Drives many signals through PlaceTrade, CalculateTrade or the channel copier at once and measures latency, throughput and memory.
+
+    Arguments:
+        signals: number of signals sent at the same time
+        mode: 'trade' for PlaceTrade, 'calculate' for CalculateTrade or 'copy' for messages of a source chat
+        accounts: number of accounts every signal is copied to
+        concurrency: maximum number of signals processed at the same time
+        latency: injected latencies
+        seed: seed of the corpus generator
+        timeout: seconds to wait for all signals to finish
+        brokerRateLimit: orders per second the stand-in accepts per account, 0 accepts all
+        workers: number of worker processes the accounts are sharded over, 0 runs everything in this process
+
+    Returns:
+        a dictionary with the benchmark results
+    """
+
+    InstallStandIns(latency, accounts, concurrency, brokerRateLimit, workers)
+
+    corpus = [signal for signal in GenerateCorpus(signals * 2, seed) if run.ParseSignal(signal, run.DEFAULT_RISK_FACTOR)][:signals]
+
+    # the reply that ends a signal and the replies that directly follow its orders or calculation
+    if mode == 'copy':
+        handler = None
+        done = ()
+        orderMarkers = ()
+    elif mode == 'trade':
+        handler = run.PlaceTrade
+        done = ('Order Report' if accounts == 1 else 'Account Report', 'There was an issue with the connection')
+        orderMarkers = ('Trade entered successfully', 'Trade partially entered', 'There was an issue', 'Account Report')
+    else:
+        handler = run.CalculateTrade
+        done = ('Would you like to enter',)
+        orderMarkers = ('Trade Information', 'Account Report', 'There was an issue')
+
+    messages = [FakeMessage(signal, latency, done) for signal in corpus]
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+
+    started = []
+    start = time.perf_counter()
+
+    # source chat messages go from the webhook straight to the copier on the event loop and send no replies
+    async def Copy() -> None:
+        for message in messages:
+            started.append(time.perf_counter())
+            run.COPIER.ingest(FakeUpdate(message), started[-1])
+
+        while run.COPIER.tasks:
+            await asyncio.gather(*list(run.COPIER.tasks))
+
+    if handler is None:
+        run.COPIER = run.ChannelCopier(sources=frozenset(str(message.chat_id) for message in messages), journal=run.JOURNAL)
+        run.CONNECTION_MANAGER.run(Copy(), timeout)
+
+    for message in messages if handler is not None else []:
+        started.append(time.perf_counter())
+        handler(FakeUpdate(message), FakeContext())
+
+    finished = handler is None or all(message.finished.wait(max(0, timeout - (time.perf_counter() - start))) for message in messages)
+    elapsed = time.perf_counter() - start
+
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    # signal to order is the time from the handler call until the reply that follows the orders
+    signalToOrder = []
+    endToEnd = []
+
+    for begin, message in zip(started, messages):
+        stamps = [stamp for stamp, text in message.replies if any(marker in text for marker in orderMarkers)]
+
+        if stamps:
+            signalToOrder.append(stamps[0] - begin)
+
+        if message.replies:
+            endToEnd.append(message.replies[-1][0] + latency.telegram - begin)
+
+    # copied signals have no replies, the copier measures from the webhook to the order results itself
+    if handler is None:
+        signalToOrder = endToEnd = list(run.METRICS.snapshot()[0].get('ingest_to_order', []))
+
+    def Summary(samples: list) -> dict:
+        if not samples:
+            return {}
+
+        return {'mean': statistics.mean(samples) * 1000, 'p50': Percentile(samples, 50) * 1000, 'p95': Percentile(samples, 95) * 1000, 'p99': Percentile(samples, 99) * 1000, 'max': max(samples) * 1000}
+
+    return {
+        'benchmark': 'e2e',
+        'mode': mode,
+        'signals': len(messages),
+        'accounts': accounts,
+        'workers': workers,
+        'concurrency': concurrency,
+        'finished': finished,
+        'injected_latency_ms': {'rpc': latency.rpc * 1000, 'order': latency.order * 1000, 'sync': latency.sync * 1000, 'telegram': latency.telegram * 1000, 'order_cpu': latency.cpu * 1000},
+        'failure_rate': latency.failureRate,
+        'broker_rate_limit': brokerRateLimit,
+        'rate_limited_orders': FakeConnection.rateLimited,
+        'signals_per_second': len(messages) / elapsed,
+        'signal_to_order_ms': Summary(signalToOrder),
+        'end_to_end_ms': Summary(endToEnd),
+        'memory_per_signal_bytes': (peak - baseline) / max(1, len(messages)),
+        'stages_ms': {stage: dict(zip(['p50', 'p95', 'p99'], [value * 1000 for value in run.LatencyMetrics.quantiles(samples)])) for stage, samples in run.METRICS.snapshot()[0].items()},
+    }
+
+def main() -> None:
+    """Runs the selected benchmark and prints its results as JSON."""
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    parserBenchmark = subparsers.add_parser('parser', help='throughput of ParseSignal')
+    parserBenchmark.add_argument('--size', type=int, default=5000, help='number of signals in the corpus')
+    parserBenchmark.add_argument('--rounds', type=int, default=5, help='number of passes over the corpus')
+    parserBenchmark.add_argument('--seed', type=int, default=42, help='seed of the corpus generator')
+
+    endToEndBenchmark = subparsers.add_parser('e2e', help='latency and throughput of PlaceTrade/CalculateTrade/channel copying against local stand-ins')
+    endToEndBenchmark.add_argument('--signals', type=int, default=100, help='number of signals sent at the same time')
+    endToEndBenchmark.add_argument('--mode', choices=['trade', 'calculate', 'copy'], default='trade', help='handler that receives the signals')
+    endToEndBenchmark.add_argument('--accounts', type=int, default=1, help='number of accounts every signal is copied to')
+    endToEndBenchmark.add_argument('--concurrency', type=int, default=run.MAX_CONCURRENT_SIGNALS, help='maximum number of signals processed at once')
+    endToEndBenchmark.add_argument('--rpc-latency', type=float, default=50, help='milliseconds per informational MetaApi request')
+    endToEndBenchmark.add_argument('--order-latency', type=float, default=150, help='milliseconds per order request')
+    endToEndBenchmark.add_argument('--sync-latency', type=float, default=2000, help='milliseconds to connect and synchronize an account')
+    endToEndBenchmark.add_argument('--telegram-latency', type=float, default=80, help='milliseconds per Telegram request')
+    endToEndBenchmark.add_argument('--order-cpu', type=float, default=0, help='milliseconds of CPU work per order request')
+    endToEndBenchmark.add_argument('--failure-rate', type=float, default=0.0, help='share of order requests that are rejected')
+    endToEndBenchmark.add_argument('--broker-rate-limit', type=float, default=0, help='orders per second the MetaApi stand-in accepts per account, 0 accepts all')
+    endToEndBenchmark.add_argument('--workers', type=int, default=0, help='number of worker processes the accounts are sharded over, 0 runs everything in one process')
+    endToEndBenchmark.add_argument('--timeout', type=float, default=300, help='seconds to wait for all signals to finish')
+    endToEndBenchmark.add_argument('--seed', type=int, default=42, help='seed of the corpus and failure generators')
+
+    arguments = parser.parse_args()
+
+    # the bot logs every signal, which would dominate the measurement
+    logging.disable(logging.CRITICAL)
+
+    if arguments.benchmark == 'parser':
+        results = BenchmarkParser(arguments.size, arguments.rounds, arguments.seed)
+
+    elif arguments.benchmark == 'e2e':
+        latency = FakeLatency(arguments.rpc_latency / 1000, arguments.order_latency / 1000, arguments.sync_latency / 1000, arguments.telegram_latency / 1000, arguments.failure_rate, arguments.seed, arguments.order_cpu / 1000)
+        results = BenchmarkEndToEnd(arguments.signals, arguments.mode, arguments.accounts, arguments.concurrency, latency, arguments.seed, arguments.timeout, arguments.broker_rate_limit, arguments.workers)
+
+    json.dump(results, sys.stdout, indent=2)
+    print()
+
+    return
+
+
+if __name__ == '__main__':
+    main()
@@ -1,18 +1,44 @@
 #!/usr/bin/env python3
 import asyncio
+import collections
+import concurrent.futures
+import contextlib
+import dataclasses
+import datetime
+import enum
+import functools
+import hashlib
+import heapq
+import io
+import itertools
+import json
 import logging
 import math
+import multiprocessing
 import os
+import queue
+import random
+import re
+import signal
+import sqlite3
+import statistics
+import threading
+import time
+
+from typing import Tuple, TypedDict
 
 try:
     from typing import Literal
 except ImportError:
     from typing_extensions import Literal
 
-from metaapi_cloud_sdk import MetaApi
+from aiohttp import web
+from metaapi_cloud_sdk import MetaApi, SynchronizationListener
+from metaapi_cloud_sdk.clients.errorHandler import TooManyRequestsException
 from prettytable import PrettyTable
 from telegram import ParseMode, Update
-from telegram.ext import CommandHandler, Filters, MessageHandler, Updater, ConversationHandler, CallbackContext
+from telegram.error import BadRequest, NetworkError, RetryAfter
+from telegram.ext import BasePersistence, CommandHandler, Filters, MessageHandler, Updater, ConversationHandler, CallbackContext
 
 # MetaAPI Credentials
 API_KEY = os.environ.get("API_KEY")
@@ -34,531 +60,5930 @@ logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s
 logger = logging.getLogger(__name__)
 
 # possibles states for conversation handler
-CALCULATE, TRADE, DECISION = range(3)
+CALCULATE, TRADE, DECISION, BATCH, BATCH_DECISION = range(5)
+
+# priorities of the MetaApi requests, lower values are sent first
+PRIORITY_MARKET, PRIORITY_PENDING, PRIORITY_INFORMATION = range(3)
 
 # allowed FX symbols
 SYMBOLS = ['AUDCAD', 'AUDCHF', 'AUDJPY', 'AUDNZD', 'AUDUSD', 'CADCHF', 'CADJPY', 'CHFJPY', 'EURAUD', 'EURCAD', 'EURCHF', 'EURGBP', 'EURJPY', 'EURNZD', 'EURUSD', 'GBPAUD', 'GBPCAD', 'GBPCHF', 'GBPJPY', 'GBPNZD', 'GBPUSD', 'NOW', 'NZDCAD', 'NZDCHF', 'NZDJPY', 'NZDUSD', 'USDCAD', 'USDCHF', 'USDJPY', 'XAGUSD', 'XAUUSD']
 
+# symbols accepted by the signal parser, hashed for constant time lookups ('NOW' is an entry keyword, not a symbol)
+SYMBOL_SET = frozenset(SYMBOLS) - {'NOW'}
+
+# common names that providers use instead of the symbol
+SYMBOL_ALIASES = {'GOLD': 'XAUUSD', 'SILVER': 'XAGUSD'}
+
+# maximum number of signals accepted in one batch
+MAX_BATCH_SIGNALS = int(os.environ.get("MAX_BATCH_SIGNALS", 50))
+
+# largest signal file accepted by /batch, in bytes
+MAX_BATCH_FILE_SIZE = int(os.environ.get("MAX_BATCH_FILE_SIZE", 1024 * 1024))
+
 # Default risk factor and lot size
 DEFAULT_RISK_FACTOR = float(os.environ.get("RISK_FACTOR", 0.01))
 
+# JSON file listing every MetaTrader account that signals are copied to, only ACCOUNT_ID is used without it
+ACCOUNTS_FILE = os.environ.get("ACCOUNTS_FILE")
 
-# Helper Functions
-def ParseSignal(signal: str, risk_factor: float) -> dict:
-    """Starts the process of parsing the signal and entering the trade on the MetaTrader account.
+# maximum number of accounts that execute the same signal at the same time
+MAX_CONCURRENT_ACCOUNTS = int(os.environ.get("MAX_CONCURRENT_ACCOUNTS", 10))
 
-    Arguments:
-        signal: trading signal
-        risk_factor: the risk factor for position sizing
+# maximum number of signals that are processed at the same time
+MAX_CONCURRENT_SIGNALS = int(os.environ.get("MAX_CONCURRENT_SIGNALS", 20))
 
-    Returns:
-        a dictionary that contains trade signal information
-    """
+# seconds between health checks of the open MetaTrader connections
+HEALTH_CHECK_INTERVAL = float(os.environ.get("HEALTH_CHECK_INTERVAL", 30))
 
-    # converts message to list of strings for parsing
-    signal = signal.splitlines()
-    signal = [line.rstrip() for line in signal]
+# upper bound in seconds for the exponential backoff between reconnection attempts
+MAX_RECONNECT_DELAY = float(os.environ.get("MAX_RECONNECT_DELAY", 60))
 
-    trade = {}
+# seconds without signals after which a connection is closed, 0 keeps connections open for the whole process
+CONNECTION_IDLE_TIMEOUT = float(os.environ.get("CONNECTION_IDLE_TIMEOUT", 3600))
 
-    # determines the order type of the trade
-    order_keywords = ['Buy Limit', 'Sell Limit', 'Buy Stop', 'Sell Stop', 'Buy', 'Sell']
-    for keyword in order_keywords:
-        if keyword.lower() in signal[0].lower():
-            trade['OrderType'] = keyword
-            break
-    else:
-        # Log the invalid order type
-        logger.error('Invalid order type: %s', signal[0])
-        return {}
+# seconds that an account snapshot pre-warmed by /trade or /calculate stays usable
+PREWARM_TTL = float(os.environ.get("PREWARM_TTL", 120))
 
-    # extracts symbol from trade signal
-    trade['Symbol'] = (signal[0].split())[-1].upper()
+# seconds before the cached broker symbol specifications are refreshed
+SYMBOL_CACHE_TTL = float(os.environ.get("SYMBOL_CACHE_TTL", 24 * 60 * 60))
 
-    # Log the parsed signal
-    logger.info('Parsed signal: %s', trade)
+# file that keeps the broker symbol specifications between restarts
+SYMBOL_CACHE_FILE = os.environ.get("SYMBOL_CACHE_FILE", "symbol_specifications.json")
 
-    # checks if the symbol is valid, if not, log and return an empty dictionary
-    if trade['Symbol'] not in SYMBOLS:
-        logger.error('Invalid symbol: %s', trade['Symbol'])
-        return {}
+# streams prices for every symbol in SYMBOLS instead of requesting the price of each market order
+STREAM_QUOTES = os.environ.get("STREAM_QUOTES", "false").lower() == "true"
 
-    # checks whether or not to convert entry to float because of market execution option ("NOW")
-    if trade['OrderType'] == 'Buy' or trade['OrderType'] == 'Sell':
-        trade['Entry'] = 'NOW'  # Set Entry to 'NOW' directly
-    else:
-        trade['Entry'] = float(signal[1].split()[-1])
+# seconds after which a streamed quote is too old to trade on and the price is requested instead
+QUOTE_MAX_AGE = float(os.environ.get("QUOTE_MAX_AGE", 2))
 
-    trade['StopLoss'] = float(signal[2].split()[-1])
-    trade['TP'] = [float(signal[3].split()[-1])]
+# refuses market entries while the spread is above this multiple of its recent median, 0 disables the check
+MAX_SPREAD_FACTOR = float(os.environ.get("MAX_SPREAD_FACTOR", 3))
 
-    # checks if there's a fourth line and parses it for TP2
-    if len(signal) > 4:
-        trade['TP'].append(float(signal[4].split()[-1]))
+# keeps the balance, positions and pending orders of every account in memory from a streaming connection
+STREAM_ACCOUNT_STATE = os.environ.get("STREAM_ACCOUNT_STATE", "true").lower() == "true"
 
-    # adds risk factor to trade
-    trade['RiskFactor'] = risk_factor
+# share of the free margin that the margin of a new trade may take up, 0 disables the check
+FREE_MARGIN_USAGE = float(os.environ.get("FREE_MARGIN_USAGE", 0.9))
 
-    return trade
+# most lots of open positions and pending orders per symbol and account, 0 disables the check
+MAX_SYMBOL_EXPOSURE = float(os.environ.get("MAX_SYMBOL_EXPOSURE", 0))
 
-    # determines the order type of the trade
-    order_keywords = ['Buy Limit', 'Sell Limit', 'Buy Stop', 'Sell Stop', 'Buy', 'Sell']
-    for keyword in order_keywords:
-        if keyword.lower() in signal[0].lower():
-            trade['OrderType'] = keyword
-            break
-    else:
-        # returns an empty dictionary if an invalid order type was given
-        return {}
+# share of the balance that the open trades of an account may lose at their stop losses together, 0 disables the check
+MAX_ACCOUNT_RISK = float(os.environ.get("MAX_ACCOUNT_RISK", 0.1))
 
-    # extracts symbol from trade signal
-    trade['Symbol'] = (signal[0].split())[-1].upper()
+# share of the balance that may be at risk in one direction of a currency, so correlated pairs such as several JPY crosses count together, 0 disables the check
+MAX_CURRENCY_RISK = float(os.environ.get("MAX_CURRENCY_RISK", 0.05))
 
-    # checks if the symbol is valid, if not, returns an empty dictionary
-    if trade['Symbol'] not in SYMBOLS:
-        return {}
+# share of the balance that the open trades of one signal provider may lose at their stop losses, 0 disables the check
+MAX_PROVIDER_RISK = float(os.environ.get("MAX_PROVIDER_RISK", 0))
 
-    # checks whether or not to convert entry to float because of market execution option ("NOW")
-    if trade['OrderType'] == 'Buy' or trade['OrderType'] == 'Sell':
-        trade['Entry'] = float(signal[1].split()[-1]) if signal[1].strip() != 'NOW' else 'NOW'
-    else:
-        trade['Entry'] = float(signal[1].split()[-1])
+# share of the day's starting balance that closed trades may lose before new trades are refused until the next UTC day, 0 disables the check
+MAX_DAILY_LOSS = float(os.environ.get("MAX_DAILY_LOSS", 0.05))
 
-    trade['StopLoss'] = float(signal[2].split()[-1])
-    trade['TP'] = [float(signal[3].split()[-1])]
+# most open positions and pending orders per account, every take profit leg counts, 0 disables the check
+MAX_OPEN_TRADES = int(os.environ.get("MAX_OPEN_TRADES", 0))
 
-    # checks if there's a fourth line and parses it for TP2
-    if len(signal) > 4:
-        trade['TP'].append(float(signal[4].split()[-1]))
+# what happens to the remaining legs of a trade once its first take profit is hit: breakeven, trail, close or off
+POSITION_MANAGEMENT = os.environ.get("POSITION_MANAGEMENT", "breakeven").lower()
 
-    # adds risk factor to trade
-    trade['RiskFactor'] = risk_factor
+# distance in pips that the stop loss trails the price at, 0 trails at the distance of the first take profit
+TRAILING_STOP_PIPS = float(os.environ.get("TRAILING_STOP_PIPS", 0))
 
-    return trade
+# pips the price has to move before a trailing stop loss is modified again
+TRAILING_STEP_PIPS = float(os.environ.get("TRAILING_STEP_PIPS", 1))
 
-# Helper Functions
-def GetTradeInformation(update: Update, trade: dict, balance: float) -> None:
-    """Calculates information from given trade including stop loss and take profit in pips, position size, and potential loss/profit.
+# chats whose signals are copied without /trade, comma separated chat ids or @usernames
+SOURCE_CHATS = frozenset(chat.strip() for chat in os.environ.get("SOURCE_CHATS", "").split(',') if chat.strip())
 
-    Arguments:
-        update: update from Telegram
-        trade: dictionary that stores trade information
-        balance: current balance of the MetaTrader account
-    """
+# number of copied signals kept in memory for replies and edits, older ones are read from the journal
+COPY_CACHE_SIZE = int(os.environ.get("COPY_CACHE_SIZE", 1000))
 
-    # ...
+# number of worker processes that the accounts are sharded over, 0 runs everything in the webhook process
+WORKERS = int(os.environ.get("WORKERS", 0))
 
-    # calculates the stop loss in pips
-    if(trade['Symbol'] == 'XAUUSD'):
-        multiplier = 0.1
-    elif(trade['Symbol'] == 'XAGUSD'):
-        multiplier = 0.001
-    elif(str(trade['Entry']).index('.') >= 2):
-        multiplier = 0.01
-    else:
-        multiplier = 0.0001
+# seconds between the checks that restart worker processes that died
+WORKER_CHECK_INTERVAL = float(os.environ.get("WORKER_CHECK_INTERVAL", 1))
 
-    # calculates the stop loss in pips
-    stopLossPips = abs(round((trade['StopLoss'] - trade['Entry']) / multiplier))
+# messages per second sent to Telegram over all chats, Telegram refuses bursts of more than about 30
+TELEGRAM_RATE_LIMIT = float(os.environ.get("TELEGRAM_RATE_LIMIT", 30))
 
-    # sets the default risk factor for 0.01 lot size
-    default_risk_factor = 0.01
+# messages per second sent to one chat once its burst of MAX_MESSAGE_BURST messages is used up
+TELEGRAM_CHAT_RATE_LIMIT = float(os.environ.get("TELEGRAM_CHAT_RATE_LIMIT", 1))
 
-    # calculates the position size using the default risk factor for 0.01 lot size
-    trade['PositionSize'] = 0.01
+# messages that one chat can receive at once before TELEGRAM_CHAT_RATE_LIMIT applies
+MAX_MESSAGE_BURST = int(os.environ.get("MAX_MESSAGE_BURST", 3))
 
-    # calculates the take profit(s) in pips
-    takeProfitPips = []
-    for takeProfit in trade['TP']:
-        takeProfitPips.append(abs(round((takeProfit - trade['Entry']) / multiplier)))
+# attempts of a Telegram message that fails with network errors before it is dropped
+MAX_SEND_RETRIES = int(os.environ.get("MAX_SEND_RETRIES", 3))
 
-    # creates table with trade information
-    table = CreateTable(trade, balance, stopLossPips, takeProfitPips)
+# number of recent samples per stage that the latency percentiles are computed from
+METRICS_WINDOW = int(os.environ.get("METRICS_WINDOW", 1000))
 
-    # sends user trade information and calculated risk
-    update.effective_message.reply_text(f'<pre>{table}</pre>', parse_mode=ParseMode.HTML)
+# SQLite database that journals every signal and order result and keeps the conversation state between restarts
+JOURNAL_FILE = os.environ.get("JOURNAL_FILE", "journal.sqlite3")
 
-    return
+# seconds that journal writes are collected before they are committed to disk together
+JOURNAL_FLUSH_INTERVAL = float(os.environ.get("JOURNAL_FLUSH_INTERVAL", 0.5))
 
-def CreateTable(trade: dict, balance: float, stopLossPips: int, takeProfitPips: int) -> PrettyTable:
-    """Creates PrettyTable object to display trade information to user.
+# seconds during which the same signal or message is not entered a second time, 0 disables the check
+DEDUP_WINDOW = float(os.environ.get("DEDUP_WINDOW", 300))
 
-    Arguments:
-        trade: dictionary that stores trade information
-        balance: current balance of the MetaTrader account
-        stopLossPips: the difference in pips from stop loss price to entry price
+# maximum number of recent signals remembered for the duplicate check
+DEDUP_CACHE_SIZE = int(os.environ.get("DEDUP_CACHE_SIZE", 10000))
 
-    Returns:
-        a Pretty Table object that contains trade information
-    """
+# MetaApi requests per second allowed per account over all endpoints
+ACCOUNT_RATE_LIMIT = float(os.environ.get("ACCOUNT_RATE_LIMIT", 40))
 
-    # creates prettytable object
-    table = PrettyTable()
-    
-    table.title = "Trade Information"
-    table.field_names = ["Key", "Value"]
-    table.align["Key"] = "l"  
-    table.align["Value"] = "l" 
+# MetaApi requests per second allowed per account for orders and for informational requests
+RATE_LIMITS = {'trade': float(os.environ.get("TRADE_RATE_LIMIT", 20)), 'information': float(os.environ.get("INFORMATION_RATE_LIMIT", 20))}
 
-    table.add_row([trade["OrderType"] , trade["Symbol"]])
-    table.add_row(['Entry\n', trade['Entry']])
+# rate limited attempts of a MetaApi request before its error is reported
+MAX_RATE_LIMIT_RETRIES = int(os.environ.get("MAX_RATE_LIMIT_RETRIES", 5))
 
-    table.add_row(['Stop Loss', '{} pips'.format(stopLossPips)])
+# seconds that each stage may take: deploying an account until it is connected to the broker, synchronizing its connection, an informational request and an order
+STAGE_TIMEOUTS = {'connect': float(os.environ.get("CONNECT_TIMEOUT", 300)), 'synchronize': float(os.environ.get("SYNCHRONIZE_TIMEOUT", 300)), 'information': float(os.environ.get("READ_TIMEOUT", 10)), 'trade': float(os.environ.get("ORDER_TIMEOUT", 30))}
 
-    for count, takeProfit in enumerate(takeProfitPips):
-        table.add_row([f'TP {count + 1}', f'{takeProfit} pips'])
+# retries of an informational MetaApi request that timed out or failed with a transient error, orders are never retried
+MAX_READ_RETRIES = int(os.environ.get("MAX_READ_RETRIES", 2))
 
-    table.add_row(['\nRisk Factor', '\n{:,.0f} %'.format(trade['RiskFactor'] * 100)])
-    table.add_row(['Position Size', trade['PositionSize']])
-    
-    table.add_row(['\nCurrent Balance', '\n$ {:,.2f}'.format(balance)])
-    table.add_row(['Potential Loss', '$ {:,.2f}'.format(round((trade['PositionSize'] * 10) * stopLossPips, 2))])
+# seconds after which a slow informational request is sent a second time, on the account's replica if it has one, 0 never hedges
+HEDGE_DELAY = float(os.environ.get("HEDGE_DELAY", 1))
 
-    # total potential profit from trade
-    totalProfit = 0
+# consecutive transient failures of an account after which its requests fail right away
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get("CIRCUIT_FAILURE_THRESHOLD", 5))
 
-    for count, takeProfit in enumerate(takeProfitPips):
-        profit = round((trade['PositionSize'] * 10 * (1 / len(takeProfitPips))) * takeProfit, 2)
-        table.add_row([f'TP {count + 1} Profit', '$ {:,.2f}'.format(profit)])
-        
-        # sums potential profit from each take profit target
-        totalProfit += profit
+# seconds that the requests of an account fail right away before a trial request is let through
+CIRCUIT_RESET_TIMEOUT = float(os.environ.get("CIRCUIT_RESET_TIMEOUT", 30))
 
-    table.add_row(['\nTotal Profit', '\n$ {:,.2f}'.format(totalProfit)])
+# pip sizes that differ from the usual convention of ten points per pip
+PIP_SIZE_OVERRIDES = {'XAUUSD': 0.1, 'XAGUSD': 0.001}
 
-    return table
+# symbols quoted above 1,000, a comma before three digits in their prices separates thousands rather than decimals
+THOUSANDS_SYMBOLS = frozenset(['XAUUSD'])
 
-async def ConnectMetaTrader(update: Update, trade: dict, enterTrade: bool):
-    """Attempts connection to MetaAPI and MetaTrader to place trade.
 
-    Arguments:
-        update: update from Telegram
-        trade: dictionary that stores trade information
+# Signal Grammar
+class Side(enum.Enum):
+    """Direction of a trade, the value is the sign of its profit when the price rises."""
 
-    Returns:
-        A coroutine that confirms that the connection to MetaAPI/MetaTrader and trade placement were successful
+    BUY = 1
+    SELL = -1
+
+
+class OrderType(enum.Enum):
+    """Order types that a signal can ask for, the value is the spelling shown to the user."""
+
+    BUY = 'Buy'
+    SELL = 'Sell'
+    BUY_LIMIT = 'Buy Limit'
+    SELL_LIMIT = 'Sell Limit'
+    BUY_STOP = 'Buy Stop'
+    SELL_STOP = 'Sell Stop'
+
+    def __str__(self) -> str:
+        return self.value
+
+    @property
+    def side(self) -> Side:
+        """Direction of the order."""
+
+        return ORDER_SIDES[self]
+
+    @property
+    def market(self) -> bool:
+        """Whether the order is executed at the current price instead of being placed as a pending order."""
+
+        return self in MARKET_ORDER_TYPES
+
+
+# direction of every order type and the order types executed at market, looked up instead of compared as strings
+ORDER_SIDES = {OrderType.BUY: Side.BUY, OrderType.BUY_LIMIT: Side.BUY, OrderType.BUY_STOP: Side.BUY, OrderType.SELL: Side.SELL, OrderType.SELL_LIMIT: Side.SELL, OrderType.SELL_STOP: Side.SELL}
+MARKET_ORDER_TYPES = frozenset([OrderType.BUY, OrderType.SELL])
+
+# MetaApi connection method that places each order type
+ORDER_METHODS = {OrderType.BUY: 'create_market_buy_order', OrderType.BUY_LIMIT: 'create_limit_buy_order', OrderType.BUY_STOP: 'create_stop_buy_order', OrderType.SELL: 'create_market_sell_order', OrderType.SELL_LIMIT: 'create_limit_sell_order', OrderType.SELL_STOP: 'create_stop_sell_order'}
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class Trade:
+    """Trade signal information produced by ParseSignal.
+
+    Trades are immutable. Sizing a trade for an account returns a copy with the broker symbol, entry price,
+    pip values and lot sizes filled in, so a signal shared by several accounts is never changed underneath
+    them and can be hashed and journaled as it is.
     """
 
-    # creates connection to MetaAPI
-    api = MetaApi(API_KEY)
-    
-    try:
-        account = await api.metatrader_account_api.get_account(ACCOUNT_ID)
-        initial_state = account.state
-        deployed_states = ['DEPLOYING', 'DEPLOYED']
+    order_type: OrderType
+    symbol: str
+    stop_loss: float
+    take_profits: Tuple[float, ...]
+    risk_factor: float
 
-        if initial_state not in deployed_states:
-            #  wait until account is deployed and connected to broker
-            logger.info('Deploying account')
-            await account.deploy()
+    # None for market executions until the current price is known
+    entry: float = None
+    entry_range: Tuple[float, float] = None
 
-        logger.info('Waiting for API server to connect to broker ...')
-        await account.wait_connected()
+    # filled in when the trade is sized for an account
+    broker_symbol: str = None
+    pip_size: float = None
+    pip_value: float = None
+    position_size: float = None
+    leg_volume: float = None
+    stop_loss_pips: int = None
 
-        # connect to MetaApi API
-        connection = account.get_rpc_connection()
-        await connection.connect()
+    # chat the signal came from, the risk engine limits the open risk per provider
+    provider: str = None
 
-        # wait until terminal state synchronized to the local state
-        logger.info('Waiting for SDK to synchronize to terminal state ...')
-        await connection.wait_synchronized()
+    @property
+    def side(self) -> Side:
+        """Direction of the trade."""
 
-        # obtains account information from MetaTrader server
-        account_information = await connection.get_account_information()
+        return ORDER_SIDES[self.order_type]
 
-        update.effective_message.reply_text("Successfully connected to MetaTrader!\nCalculating trade risk ... 🤔")
+    @property
+    def market(self) -> bool:
+        """Whether the trade is executed at the current price."""
 
-        # checks if the order is a market execution to get the current price of symbol
-        if(trade['Entry'] == 'NOW'):
-            price = await connection.get_symbol_price(symbol=trade['Symbol'])
+        return self.order_type in MARKET_ORDER_TYPES
 
-            # uses bid price if the order type is a buy
-            if(trade['OrderType'] == 'Buy'):
-                trade['Entry'] = float(price['bid'])
+    @property
+    def sized(self) -> bool:
+        """Whether the trade was sized for an account."""
 
-            # uses ask price if the order type is a sell
-            if(trade['OrderType'] == 'Sell'):
-                trade['Entry'] = float(price['ask'])
+        return self.position_size is not None
 
-        # produces a table with trade information
-        GetTradeInformation(update, trade, account_information['balance'])
-            
-        # checks if the user has indicated to enter trade
-        if(enterTrade == True):
+    @property
+    def take_profit_pips(self) -> list:
+        """Distance in pips from the entry to every take profit of a sized trade."""
 
-            # enters trade on to MetaTrader account
-            update.effective_message.reply_text("Entering trade on MetaTrader Account ... 👨🏾‍💻")
+        return [abs(round((takeProfit - self.entry) / self.pip_size)) for takeProfit in self.take_profits]
 
-            try:
-                # executes buy market execution order
-                if(trade['OrderType'] == 'Buy'):
-                    for takeProfit in trade['TP']:
-                        result = await connection.create_market_buy_order(trade['Symbol'], trade['PositionSize'] / len(trade['TP']), trade['StopLoss'], takeProfit)
-
-                # executes buy limit order
-                elif(trade['OrderType'] == 'Buy Limit'):
-                    for takeProfit in trade['TP']:
-                        result = await connection.create_limit_buy_order(trade['Symbol'], trade['PositionSize'] / len(trade['TP']), trade['Entry'], trade['StopLoss'], takeProfit)
-
-                # executes buy stop order
-                elif(trade['OrderType'] == 'Buy Stop'):
-                    for takeProfit in trade['TP']:
-                        result = await connection.create_stop_buy_order(trade['Symbol'], trade['PositionSize'] / len(trade['TP']), trade['Entry'], trade['StopLoss'], takeProfit)
-
-                # executes sell market execution order
-                elif(trade['OrderType'] == 'Sell'):
-                    for takeProfit in trade['TP']:
-                        result = await connection.create_market_sell_order(trade['Symbol'], trade['PositionSize'] / len(trade['TP']), trade['StopLoss'], takeProfit)
-
-                # executes sell limit order
-                elif(trade['OrderType'] == 'Sell Limit'):
-                    for takeProfit in trade['TP']:
-                        result = await connection.create_limit_sell_order(trade['Symbol'], trade['PositionSize'] / len(trade['TP']), trade['Entry'], trade['StopLoss'], takeProfit)
-
-                # executes sell stop order
-                elif(trade['OrderType'] == 'Sell Stop'):
-                    for takeProfit in trade['TP']:
-                        result = await connection.create_stop_sell_order(trade['Symbol'], trade['PositionSize'] / len(trade['TP']), trade['Entry'], trade['StopLoss'], takeProfit)
-                
-                # sends success message to user
-                update.effective_message.reply_text("Trade entered successfully! 💰")
-                
-                # prints success message to console
-                logger.info('\nTrade entered successfully!')
-                logger.info('Result Code: {}\n'.format(result['stringCode']))
-            
-            except Exception as error:
-                logger.info(f"\nTrade failed with error: {error}\n")
-                update.effective_message.reply_text(f"There was an issue 😕\n\nError Message:\n{error}")
-    
-    except Exception as error:
-        logger.error(f'Error: {error}')
-        update.effective_message.reply_text(f"There was an issue with the connection 😕\n\nError Message:\n{error}")
-    
-    return
+    @property
+    def key(self) -> tuple:
+        """Fields that identify the signal, independent of the risk factor and the sizing."""
 
+        return (self.order_type.value, self.symbol, 'NOW' if self.entry is None else self.entry, self.entry_range, self.stop_loss, self.take_profits)
 
-# Handler Functions
-def PlaceTrade(update: Update, context: CallbackContext) -> int:
-    """Parses trade and places on MetaTrader account.   
-    
-    Arguments:
-        update: update from Telegram
-        context: CallbackContext object that stores commonly used objects in handler callbacks
-    """
+    def validate(self) -> str:
+        """Checks that the stop loss and every take profit lie on the right side of the entry.
 
-    # checks if the trade has already been parsed or not
-    if(context.user_data['trade'] == None):
+        Returns:
+            the reason the trade is invalid, or None if it is valid or its entry is not known yet
+        """
 
-        try: 
-            # parses signal from Telegram message
-            trade = ParseSignal(update.effective_message.text, DEFAULT_RISK_FACTOR)
-            
-            # checks if there was an issue with parsing the trade
-            if(not(trade)):
-                raise Exception('Invalid Trade')
+        if self.entry is None:
+            return None
 
-            # sets the user context trade equal to the parsed trade
-            context.user_data['trade'] = trade
-            update.effective_message.reply_text("Trade Successfully Parsed! 🥳\nConnecting to MetaTrader ... \n(May take a while) ⏰")
-        
-        except Exception as error:
-            logger.error(f'Error: {error}')
-            errorMessage = f"There was an error parsing this trade 😕\n\nError: {error}\n\nPlease re-enter trade with this format:\n\nBUY/SELL SYMBOL\nEntry \nSL \nTP \n\nOr use the /cancel to command to cancel this action."
-            update.effective_message.reply_text(errorMessage)
+        direction = self.side.value
 
-            # returns to TRADE state to reattempt trade parsing
-            return TRADE
-    
-    # attempts connection to MetaTrader and places trade
-    asyncio.run(ConnectMetaTrader(update, context.user_data['trade'], True))
-    
-    # removes trade from user context data
-    context.user_data['trade'] = None
+        if (self.entry - self.stop_loss) * direction <= 0:
+            return f'The stop loss {self.stop_loss} is on the wrong side of the entry {self.entry}'
 
-    return ConversationHandler.END
+        for takeProfit in self.take_profits:
+            if (takeProfit - self.entry) * direction <= 0:
+                return f'The take profit {takeProfit} is on the wrong side of the entry {self.entry}'
 
-def CalculateTrade(update: Update, context: CallbackContext) -> int:
-    """Parses trade and places on MetaTrader account.   
-    
-    Arguments:
-        update: update from Telegram
-        context: CallbackContext object that stores commonly used objects in handler callbacks
-    """
+        return None
 
-    # checks if the trade has already been parsed or not
-    if(context.user_data['trade'] == None):
+    def to_dict(self) -> dict:
+        """Serializes the trade for the journal, leaving out the fields that are not set.
 
-        try: 
-            # parses signal from Telegram message
-            trade = ParseSignal(update.effective_message.text, DEFAULT_RISK_FACTOR)
-            
-            # checks if there was an issue with parsing the trade
-            if(not(trade)):
-                raise Exception('Invalid Trade')
+        Returns:
+            a JSON serializable dictionary with the keys that signals were always journaled with
+        """
 
-            # sets the user context trade equal to the parsed trade
-            context.user_data['trade'] = trade
-            update.effective_message.reply_text("Trade Successfully Parsed! 🥳\nConnecting to MetaTrader ... (May take a while) ⏰")
-        
-        except Exception as error:
-            logger.error(f'Error: {error}')
-            errorMessage = f"There was an error parsing this trade 😕\n\nError: {error}\n\nPlease re-enter trade with this format:\n\nBUY/SELL SYMBOL\nEntry \nSL \nTP \n\nOr use the /cancel to command to cancel this action."
-            update.effective_message.reply_text(errorMessage)
+        data = {'OrderType': self.order_type.value, 'Symbol': self.symbol, 'Entry': 'NOW' if self.entry is None else self.entry, 'StopLoss': self.stop_loss, 'TP': list(self.take_profits), 'RiskFactor': self.risk_factor}
 
-            # returns to CALCULATE to reattempt trade parsing
-            return CALCULATE
-    
-    # attempts connection to MetaTrader and calculates trade information
-    asyncio.run(ConnectMetaTrader(update, context.user_data['trade'], False))
+        for key, value in [('EntryRange', self.entry_range), ('BrokerSymbol', self.broker_symbol), ('PipSize', self.pip_size), ('PipValue', self.pip_value), ('PositionSize', self.position_size), ('LegVolume', self.leg_volume), ('StopLossPips', self.stop_loss_pips), ('Provider', self.provider)]:
+            if value is not None:
+                data[key] = value
 
-    # asks if user if they would like to enter or decline trade
-    update.effective_message.reply_text("Would you like to enter this trade?\nTo enter, select: /yes\nTo decline, select: /no")
+        return data
 
-    return DECISION
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Trade':
+        """Restores a trade serialized by to_dict.
 
-def unknown_command(update: Update, context: CallbackContext) -> None:
-    """Checks if the user is authorized to use this bot or shares to use /help command for instructions.
+        Arguments:
+            data: dictionary returned by to_dict
 
-    Arguments:
-        update: update from Telegram
-        context: CallbackContext object that stores commonly used objects in handler callbacks
-    """
-    if(not(update.effective_message.chat.username == TELEGRAM_USER)):
-        update.effective_message.reply_text("You are not authorized to use this bot! 🙅🏽‍♂️")
-        return
+        Returns:
+            the trade
+        """
 
-    update.effective_message.reply_text("Unknown command. Use /trade to place a trade or /calculate to find information for a trade. You can also use the /help command to view instructions for this bot.")
+        return cls(
+            order_type=OrderType(data['OrderType']),
+            symbol=data['Symbol'],
+            stop_loss=data['StopLoss'],
+            take_profits=tuple(data['TP']),
+            risk_factor=data['RiskFactor'],
+            entry=None if data.get('Entry', 'NOW') == 'NOW' else data['Entry'],
+            entry_range=tuple(data['EntryRange']) if data.get('EntryRange') else None,
+            broker_symbol=data.get('BrokerSymbol'),
+            pip_size=data.get('PipSize'),
+            pip_value=data.get('PipValue'),
+            position_size=data.get('PositionSize'),
+            leg_volume=data.get('LegVolume'),
+            stop_loss_pips=data.get('StopLossPips'),
+            provider=data.get('Provider'),
+        )
 
-    return
 
+class AccountSettings(TypedDict, total=False):
+    """Settings of a MetaTrader account that signals are copied to."""
 
-# Command Handlers
-def welcome(update: Update, context: CallbackContext) -> None:
-    """Sends welcome message to user.
+    AccountId: str
+    Name: str
+    RiskFactor: float
+    Symbols: dict
+    MinLot: float
+    MaxLot: float
+    MaxSymbolExposure: float
+    Replica: str
 
-    Arguments:
-        update: update from Telegram
-        context: CallbackContext object that stores commonly used objects in handler callbacks
-    """
 
-    welcome_message = "Welcome to the FX Signal Copier Telegram Bot! 💻💸\n\nYou can use this bot to enter trades directly from Telegram and get a detailed look at your risk to reward ratio with profit, loss, and calculated lot size. You are able to change specific settings such as allowed symbols, risk factor, and more from your personalized Python script and environment variables.\n\nUse the /help command to view instructions and example trades."
-    
-    # sends messages to user
-    update.effective_message.reply_text(welcome_message)
+# tokens of the signal grammar, every message is scanned once with this expression
+SIGNAL_TOKENS = re.compile(r"""
+    (?P<order>\b(?:buy|sell)(?:[ \t]+(?:limit|stop))?\b)
+  | (?P<stoploss>\b(?:s/l|sl|stop[ \t]*loss)\b)
+  | (?P<takeprofit>(?:\b(?:t/p|tp|take[ \t]*profit))(?:[ \t]*\d(?=[ \t]*[:=)\-])|\d(?![\d.]|,\d))?)
+  | (?P<entry>\b(?:entry|enter|price)\b|@)
+  | (?P<now>\b(?:now|market)\b)
+  | (?P<distance>\d+(?:[.,]\d+)?[ \t]*(?:(?:pips?|points?|pts)\b|%))
+  | (?P<price>\d{1,3}(?:,\d{3})+(?![\d,])(?:\.\d+)?|\d+(?:[.,]\d+)?)
+  | (?P<word>\#?[a-z]{3}/?[a-z]{3,}(?:\.[a-z0-9]+)?\b|\b[a-z]{4,}\b)
+  | (?P<newline>\n)
+""", re.IGNORECASE | re.VERBOSE)
 
-    return
+# canonical spelling of every order type keyword
+ORDER_TYPES = {'buy': OrderType.BUY, 'sell': OrderType.SELL, 'buy limit': OrderType.BUY_LIMIT, 'sell limit': OrderType.SELL_LIMIT, 'buy stop': OrderType.BUY_STOP, 'sell stop': OrderType.SELL_STOP}
 
-def help(update: Update, context: CallbackContext) -> None:
-    """Sends a help message when the command /help is issued
+
+def LookupSymbol(word: str) -> str:
+    """Normalizes a word from a signal and returns the symbol it names.
 
     Arguments:
-        update: update from Telegram
-        context: CallbackContext object that stores commonly used objects in handler callbacks
+        word: candidate word such as 'EURUSD', '#eur/usd' or 'GOLD'
+
+    Returns:
+        the symbol from SYMBOLS, or None if the word is not a symbol
     """
 
-    help_message = "This bot is used to automatically enter trades onto your MetaTrader account directly from Telegram. To begin, ensure that you are authorized to use this bot by adjusting your Python script or environment variables.\n\nThis bot supports all trade order types (Market Execution, Limit, and Stop)\n\nAfter an extended period away from the bot, please be sure to re-enter the start command to restart the connection to your MetaTrader account."
-    commands = "List of commands:\n/start : displays welcome message\n/help : displays list of commands and example trades\n/trade : takes in user inputted trade for parsing and placement\n/calculate : calculates trade information for a user inputted trade"
-    trade_example = "Example Trades 💴:\n\n"
-    market_execution_example = "Market Execution:\nBUY GBPUSD\nEntry NOW\nSL 1.14336\nTP 1.28930\nTP 1.29845\n\n"
-    limit_example = "Limit Execution:\nBUY LIMIT GBPUSD\nEntry 1.14480\nSL 1.14336\nTP 1.28930\n\n"
-    note = "You are able to enter up to two take profits. If two are entered, both trades will use half of the position size, and one will use TP1 while the other uses TP2.\n\nNote: Use 'NOW' as the entry to enter a market execution trade."
+    # drops hashtags, slashes and broker suffixes such as '.m'
+    candidate = word.lstrip('#').split('.')[0].replace('/', '').upper()
 
-    # sends messages to user
-    update.effective_message.reply_text(help_message)
-    update.effective_message.reply_text(commands)
-    update.effective_message.reply_text(trade_example + market_execution_example + limit_example + note)
+    if candidate in SYMBOL_SET:
+        return candidate
 
-    return
+    return SYMBOL_ALIASES.get(candidate)
+
+# prices such as '1,085' or '1,920' whose comma may separate thousands or decimals
+THOUSANDS_GROUPS = re.compile(r'\d{1,3}(?:,\d{3})+')
+
+
+def ParsePrice(text: str, thousands: bool = True) -> float:
+    """Converts a price token to a float, accepting thousands separators ('1,920.50') and decimal commas ('1,0850').
 
-def cancel(update: Update, context: CallbackContext) -> int:
-    """Cancels and ends the conversation.   
-    
     Arguments:
-        update: update from Telegram
-        context: CallbackContext object that stores commonly used objects in handler callbacks
+        text: price token matched by SIGNAL_TOKENS
+        thousands: whether a comma followed by groups of three digits separates thousands, see ThousandsSeparated
+
+    Returns:
+        the price as a float
     """
 
-    update.effective_message.reply_text("Command has been canceled.")
+    if '.' in text:
+        return float(text.replace(',', ''))
 
-    # removes trade from user context data
-    context.user_data['trade'] = None
+    if thousands and THOUSANDS_GROUPS.fullmatch(text):
+        return float(text.replace(',', ''))
 
-    return ConversationHandler.END
+    return float(text.replace(',', '.'))
 
-def error(update: Update, context: CallbackContext) -> None:
-    """Logs Errors caused by updates.
+def ThousandsSeparated(prices: list, symbol: str) -> bool:
+    """Decides whether the commas in prices like '1,085' of one signal separate thousands or decimals.
+
+    The other prices of the signal decide when there are any, '1,085' next to '1.0880' is 1.085 and next to
+    '1915.5' it is 1085. Otherwise only symbols quoted above 1,000 use thousands separators.
 
     Arguments:
-        update: update from Telegram
-        context: CallbackContext object that stores commonly used objects in handler callbacks
+        prices: price tokens of the signal
+        symbol: symbol of the signal
+
+    Returns:
+        True if a comma before three digits separates thousands
     """
 
-    logger.warning('Update "%s" caused error "%s"', update, context.error)
+    ambiguous = next((price for price in prices if THOUSANDS_GROUPS.fullmatch(price)), None)
 
-    return
+    if ambiguous is None:
+        return True
 
-def Trade_Command(update: Update, context: CallbackContext) -> int:
-    """Asks user to enter the trade they would like to place.
+    references = [price for price in (ParsePrice(price) for price in prices if not THOUSANDS_GROUPS.fullmatch(price)) if price > 0]
 
-    Arguments:
-        update: update from Telegram
-        context: CallbackContext object that stores commonly used objects in handler callbacks
-    """
-    if(not(update.effective_message.chat.username == TELEGRAM_USER)):
-        update.effective_message.reply_text("You are not authorized to use this bot! 🙅🏽‍♂️")
-        return ConversationHandler.END
-    
-    # initializes the user's trade as empty prior to input and parsing
-    context.user_data['trade'] = None
-    
-    # asks user to enter the trade
-    update.effective_message.reply_text("Please enter the trade that you would like to place.")
+    if not references:
+        return symbol in THOUSANDS_SYMBOLS
 
-    return TRADE
+    # picks the reading that is closer to the other prices on a logarithmic scale
+    scale = statistics.median(references)
+    distance = lambda value: abs(math.log(max(value, 1e-12) / scale))
 
-def Calculation_Command(update: Update, context: CallbackContext) -> int:
-    """Asks user to enter the trade they would like to calculate trade information for.
+    return distance(ParsePrice(ambiguous, True)) <= distance(ParsePrice(ambiguous, False))
+
+def ParseSignal(signal: str, risk_factor: float) -> Trade:
+    """Parses a trading signal in a single pass over the message.
+
+    The order type, symbol, entry, stop loss and take profits may appear in any order and on any line. Labels
+    such as 'SL:', 'S/L', 'TP1' and 'T/P' are recognized, any number of take profits is accepted and the entry
+    can be given as a price range. Prices without labels fall back to the classic layout of entry, stop loss
+    and take profits.
 
     Arguments:
-        update: update from Telegram
-        context: CallbackContext object that stores commonly used objects in handler callbacks
+        signal: trading signal
+        risk_factor: the risk factor for position sizing
+
+    Returns:
+        a Trade that contains trade signal information, None if the signal is invalid
     """
-    if(not(update.effective_message.chat.username == TELEGRAM_USER)):
-        update.effective_message.reply_text("You are not authorized to use this bot! 🙅🏽‍♂️")
-        return ConversationHandler.END
 
-    # initializes the user's trade as empty prior to input and parsing
-    context.user_data['trade'] = None
+    orderType = None
+    symbol = None
+    entry = []
+    stopLoss = []
+    takeProfits = []
+    unlabeled = []
 
-    # asks user to enter the trade
-    update.effective_message.reply_text("Please enter the trade that you would like to calculate.")
+    # list that receives the prices that follow the current label
+    target = unlabeled
 
-    return CALCULATE
+    # whether a line of bare prices continues the take profit list of the previous line
+    continuation = False
 
+    # a numbered take profit label such as 'TP1' has a single price, a bare 'TP' may start a list
+    numbered = False
 
-def main() -> None:
-    """Runs the Telegram bot."""
+    for token in SIGNAL_TOKENS.finditer(signal):
+        kind = token.lastgroup
 
-    updater = Updater(TOKEN, use_context=True)
+        if kind == 'price':
+            if continuation:
+                target = takeProfits
 
-    # get the dispatcher to register handlers
-    dp = updater.dispatcher
+            target.append(token.group())
 
-    # message handler
-    dp.add_handler(CommandHandler("start", welcome))
+            # a stop loss and a numbered take profit have a single price, anything after it is unlabeled
+            if target is stopLoss or (target is takeProfits and numbered):
+                target = unlabeled
+
+        elif kind == 'distance':
+            # distances such as '(40 pips)' or '2%' annotate the price before them
+            pass
+
+        elif kind == 'takeprofit':
+            target = takeProfits
+            numbered = token.group()[-1].isdigit()
+
+        elif kind == 'stoploss':
+            target = stopLoss if not stopLoss else unlabeled
+
+        elif kind == 'entry' or kind == 'now':
+            target = entry
+
+        elif kind == 'order':
+            if orderType is None:
+                orderType = ORDER_TYPES[' '.join(token.group().lower().split())]
+
+                # prices on the same line as the order type are the entry
+                target = entry
+
+        elif kind == 'word':
+            if symbol is None:
+                symbol = LookupSymbol(token.group())
+
+        elif kind == 'newline':
+            # labels only reach until the end of their line, take profit lists may continue on the next one
+            continuation = target is takeProfits
+            target = unlabeled
+            continue
+
+        continuation = False
+
+    if orderType is None:
+        # Log the invalid order type
+        logger.error('Invalid order type: %s', signal.splitlines()[0] if signal else signal)
+        return None
+
+    # checks if the symbol is valid, if not, log and return None
+    if symbol is None:
+        logger.error('Invalid symbol: %s', signal.splitlines()[0])
+        return None
+
+    marketExecution = orderType.market
+
+    # falls back to the classic layout for prices without labels: entry (pending orders only), SL, TP ...
+    if unlabeled:
+        if not entry and not marketExecution:
+            entry.append(unlabeled.pop(0))
+
+        if not stopLoss and unlabeled:
+            stopLoss.append(unlabeled.pop(0))
+
+        if not takeProfits:
+            takeProfits.extend(unlabeled)
+
+    if not stopLoss or not takeProfits or (not marketExecution and not entry):
+        logger.error('Incomplete signal for %s %s', orderType, symbol)
+        return None
+
+    # converts the prices once the symbol and all prices are known, they decide what a comma means
+    thousands = ThousandsSeparated(entry + stopLoss + takeProfits, symbol)
+    entry, stopLoss, takeProfits = ([ParsePrice(price, thousands) for price in prices] for prices in (entry, stopLoss, takeProfits))
+
+    # market executions are always entered at the current price ("NOW"), their entry is set once it is known
+    trade = Trade(orderType, symbol, stopLoss[0], tuple(takeProfits), risk_factor, None if marketExecution else entry[0], (min(entry), max(entry)) if len(entry) > 1 and not marketExecution else None)
+
+    # checks that the stop loss and take profits of pending orders are on the right side of the entry
+    invalid = trade.validate()
+
+    if invalid:
+        logger.error('Invalid signal for %s %s: %s', orderType, symbol, invalid)
+        return None
+
+    # Log the parsed signal
+    logger.info('Parsed signal: %s', trade)
+
+    return trade
+
+# lines that open a new signal in a message with several signals
+ORDER_LINE = re.compile(r'\b(?:buy|sell)\b', re.IGNORECASE)
+
+def SplitSignals(lines):
+    """Splits a stream of lines with several signals into one text per signal.
+
+    A signal ends at a blank line or where the next order type starts. Lines before the first order type,
+    such as a channel header, stay with the signal that follows them.
+
+    Arguments:
+        lines: iterable of lines, e.g. an open file
+
+    Returns:
+        a generator of signal texts
+    """
+
+    block = []
+    hasOrder = False
+
+    for line in lines:
+        line = line.rstrip('\r\n')
+        startsOrder = ORDER_LINE.search(line) is not None
+
+        if hasOrder and (not line.strip() or startsOrder):
+            yield '\n'.join(block)
+
+            block = []
+            hasOrder = False
+
+        if line.strip():
+            block.append(line)
+            hasOrder = hasOrder or startsOrder
+
+    if hasOrder:
+        yield '\n'.join(block)
+
+def ParseBatch(lines, risk_factor: float) -> tuple:
+    """Parses every signal of a message or file with several signals.
+
+    Arguments:
+        lines: iterable of lines, e.g. an open file
+        risk_factor: the risk factor for position sizing
+
+    Returns:
+        the parsed trades and the first line of every signal that could not be parsed
+    """
+
+    trades = []
+    invalid = []
+
+    for text in SplitSignals(lines):
+        trade = ParseSignal(text, risk_factor)
+
+        if trade:
+            trades.append(trade)
+        else:
+            invalid.append(text.splitlines()[0])
+
+        if len(trades) + len(invalid) >= MAX_BATCH_SIGNALS:
+            break
+
+    return trades, invalid
+
+# Symbol Specifications
+class SymbolSpecificationCache:
+    """Caches the broker's symbol specifications per account so sizing needs no RPC round-trip per signal.
+
+    The specifications of every symbol in SYMBOLS are fetched in bulk once, refreshed in the background after
+    the TTL expires and written to disk so a restart can start from the previous copy.
+    """
+
+    # fields of a MetaTrader symbol specification that the bot uses
+    FIELDS = ['symbol', 'tickSize', 'minVolume', 'maxVolume', 'volumeStep', 'contractSize', 'digits', 'point', 'pipSize', 'baseCurrency', 'profitCurrency', 'marginCurrency']
+
+    def __init__(self, path: str = SYMBOL_CACHE_FILE, ttl: float = SYMBOL_CACHE_TTL):
+        """Creates the cache and loads the copy persisted on disk if there is one.
+
+        Arguments:
+            path: file the specifications are persisted to, nothing is persisted when empty
+            ttl: seconds before the specifications of an account are refreshed
+        """
+
+        self.path = path
+        self.ttl = ttl
+
+        # specifications keyed by account id and then by symbol from SYMBOLS
+        self.specifications = {}
+        self.loaded_at = {}
+
+        self._locks = {}
+        self._refreshing = set()
+
+        self.restore()
+
+    def get(self, account_id: str, symbol: str) -> dict:
+        """Returns the cached specification of a symbol.
+
+        Arguments:
+            account_id: MetaApi account id
+            symbol: symbol from SYMBOLS
+
+        Returns:
+            the symbol specification, or None if it is not cached
+        """
+
+        return self.specifications.get(account_id, {}).get(symbol)
+
+    async def ensure(self, account_id: str, connection, aliases: dict = None) -> dict:
+        """Returns the specifications of an account, fetching them only if none are cached yet.
+
+        Stale specifications are returned as they are while a refresh runs in the background.
+
+        Arguments:
+            account_id: MetaApi account id
+            connection: synchronized RPC connection to the account
+            aliases: explicit broker symbols of the account, see MapBrokerSymbols
+
+        Returns:
+            the specifications keyed by symbol
+        """
+
+        if account_id not in self.specifications:
+            await self.load(account_id, connection, aliases)
+
+        elif time.time() - self.loaded_at[account_id] > self.ttl and account_id not in self._refreshing:
+            asyncio.get_running_loop().create_task(self._refresh(account_id, connection, aliases))
+
+        return self.specifications[account_id]
+
+    async def _refresh(self, account_id: str, connection, aliases: dict = None) -> None:
+        """Reloads the specifications of an account in the background.
+
+        Arguments:
+            account_id: MetaApi account id
+            connection: synchronized RPC connection to the account
+            aliases: explicit broker symbols of the account, see MapBrokerSymbols
+        """
+
+        self._refreshing.add(account_id)
+
+        try:
+            await self.load(account_id, connection, aliases)
+        except Exception as error:
+            logger.warning('Refreshing symbol specifications of account %s failed: %s', account_id, error)
+        finally:
+            self._refreshing.discard(account_id)
+
+    async def load(self, account_id: str, connection, aliases: dict = None) -> None:
+        """Fetches the specifications of every symbol in SYMBOLS at once and persists them.
+
+        Arguments:
+            account_id: MetaApi account id
+            connection: synchronized RPC connection to the account
+            aliases: explicit broker symbols of the account, see MapBrokerSymbols
+        """
+
+        lock = self._locks.setdefault(account_id, asyncio.Lock())
+
+        async with lock:
+            brokerSymbols = MapBrokerSymbols(await REQUEST_GUARD.read(account_id, connection, 'get_symbols'), aliases)
+            specifications = await asyncio.gather(*[REQUEST_GUARD.read(account_id, connection, 'get_symbol_specification', brokerSymbol) for brokerSymbol in brokerSymbols.values()], return_exceptions=True)
+
+            cached = {}
+
+            for symbol, specification in zip(brokerSymbols, specifications):
+                if isinstance(specification, Exception):
+                    logger.warning('No symbol specification for %s: %s', symbol, specification)
+                    continue
+
+                cached[symbol] = {field: specification.get(field) for field in self.FIELDS}
+
+            self.specifications[account_id] = cached
+            self.loaded_at[account_id] = time.time()
+
+            logger.info('Loaded %d symbol specifications for account %s', len(cached), account_id)
+
+        await asyncio.get_running_loop().run_in_executor(None, self.save)
+
+    def save(self) -> None:
+        """Writes the cached specifications to disk."""
+
+        if not self.path:
+            return
+
+        data = {account_id: {'LoadedAt': self.loaded_at[account_id], 'Specifications': specifications} for account_id, specifications in self.specifications.items()}
+
+        # writes to a temporary file first so a crash never leaves a truncated cache behind
+        temporary = self.path + '.tmp'
+
+        with open(temporary, 'w') as file:
+            json.dump(data, file)
+
+        os.replace(temporary, self.path)
+
+    def restore(self) -> None:
+        """Loads the specifications persisted by a previous run."""
+
+        if not self.path or not os.path.exists(self.path):
+            return
+
+        try:
+            with open(self.path) as file:
+                data = json.load(file)
+
+        except (OSError, ValueError) as error:
+            logger.warning('Ignoring unreadable symbol specification cache %s: %s', self.path, error)
+            return
+
+        for account_id, entry in data.items():
+            self.specifications[account_id] = entry['Specifications']
+            self.loaded_at[account_id] = entry['LoadedAt']
+
+
+# symbol specifications shared by every handler in this process
+SYMBOL_CACHE = SymbolSpecificationCache()
+
+
+# Quote Streaming
+class QuoteStream(SynchronizationListener):
+    """Streaming connection of one account that hands its quotes to the QuoteCache."""
+
+    def __init__(self, account_id: str, cache: 'QuoteCache'):
+        """Creates the listener.
+
+        Arguments:
+            account_id: MetaApi account id
+            cache: cache that stores the quotes
+        """
+
+        super().__init__()
+
+        self.account_id = account_id
+        self.cache = cache
+        self.connection = None
+
+    async def on_symbol_prices_updated(self, instance_index: str, prices: list, equity: float = None, margin: float = None, free_margin: float = None, margin_level: float = None, account_currency_exchange_rate: float = None):
+        """Stores the streamed prices.
+
+        Arguments:
+            instance_index: index of the account instance that sent the prices
+            prices: updated MetaTrader symbol prices
+        """
+
+        self.cache.record(self.account_id, prices)
+
+
+class QuoteCache:
+    """Keeps the last bid/ask of every streamed symbol in memory, together with recent spread statistics.
+
+    Every account streams its own quotes, since accounts on different brokers have their own symbol names,
+    feeds and spreads. Quotes are keyed by account id and the broker's symbol name and stamped with the time
+    they were received.
+    """
+
+    def __init__(self, max_age: float = QUOTE_MAX_AGE, spread_window: int = 500):
+        """Creates an empty cache.
+
+        Arguments:
+            max_age: seconds after which a quote is considered stale
+            spread_window: number of recent spreads kept per symbol for the statistics
+        """
+
+        self.max_age = max_age
+        self.spread_window = spread_window
+
+        # last price, the monotonic time it was received and recent spreads, keyed by account id and broker symbol
+        self.quotes = {}
+        self.received_at = {}
+        self.spreads = {}
+
+        # streaming connection keyed by account id
+        self.streams = {}
+
+    def record(self, account_id: str, prices: list) -> None:
+        """Stores prices streamed by an account.
+
+        Arguments:
+            account_id: MetaApi account id
+            prices: updated MetaTrader symbol prices
+        """
+
+        now = time.monotonic()
+
+        for price in prices:
+            key = (account_id, price['symbol'])
+
+            self.quotes[key] = price
+            self.received_at[key] = now
+
+            if key not in self.spreads:
+                self.spreads[key] = collections.deque(maxlen=self.spread_window)
+
+            self.spreads[key].append(price['ask'] - price['bid'])
+
+    def get(self, account_id: str, symbol: str, max_age: float = None) -> dict:
+        """Returns the last price of a symbol on an account if it is fresh enough.
+
+        Arguments:
+            account_id: MetaApi account id
+            symbol: broker symbol
+            max_age: seconds after which the quote is stale, defaults to the cache's max age
+
+        Returns:
+            the last MetaTrader symbol price, or None if there is no fresh quote
+        """
+
+        price = self.quotes.get((account_id, symbol))
+
+        if price is None:
+            return None
+
+        if time.monotonic() - self.received_at[(account_id, symbol)] > (self.max_age if max_age is None else max_age):
+            return None
+
+        return price
+
+    def spread_statistics(self, account_id: str, symbol: str) -> dict:
+        """Summarizes the recent spreads of a symbol on an account.
+
+        Arguments:
+            account_id: MetaApi account id
+            symbol: broker symbol
+
+        Returns:
+            the current, median, mean and maximum spread and the number of samples, or None without quotes
+        """
+
+        spreads = self.spreads.get((account_id, symbol))
+
+        if not spreads:
+            return None
+
+        return {'Current': spreads[-1], 'Median': statistics.median(spreads), 'Mean': statistics.fmean(spreads), 'Max': max(spreads), 'Samples': len(spreads)}
+
+    def is_spread_spiking(self, account_id: str, symbol: str, factor: float = MAX_SPREAD_FACTOR, min_samples: int = 20, spread: float = None) -> bool:
+        """Checks whether the current spread of a symbol on an account is far above its recent median.
+
+        Arguments:
+            account_id: MetaApi account id
+            symbol: broker symbol
+            factor: multiple of the median spread that counts as a spike, 0 disables the check
+            min_samples: number of spreads needed before the median is trusted
+            spread: spread of the quote an order is priced at, the last streamed spread when not given
+
+        Returns:
+            True if the spread is spiking
+        """
+
+        spreadStatistics = self.spread_statistics(account_id, symbol)
+
+        if not factor or spreadStatistics is None or spreadStatistics['Samples'] < min_samples:
+            return False
+
+        return (spreadStatistics['Current'] if spread is None else spread) > factor * spreadStatistics['Median']
+
+    async def start(self, account_id: str, account, symbols: list) -> None:
+        """Opens a streaming connection to an account and subscribes to the quotes of the given symbols.
+
+        Arguments:
+            account_id: MetaApi account id
+            account: MetaApi account
+            symbols: broker symbols of the account to stream
+        """
+
+        if account_id in self.streams:
+            return
+
+        stream = self.streams[account_id] = QuoteStream(account_id, self)
+
+        stream.connection = account.get_streaming_connection()
+        stream.connection.add_synchronization_listener(stream)
+
+        await stream.connection.connect()
+        await stream.connection.wait_synchronized()
+
+        results = await asyncio.gather(*[stream.connection.subscribe_to_market_data(symbol, [{'type': 'quotes'}], wait_for_quote=False) for symbol in symbols], return_exceptions=True)
+
+        for symbol, result in zip(symbols, results):
+            if isinstance(result, Exception):
+                logger.warning('Subscribing to quotes of %s on account %s failed: %s', symbol, account_id, result)
+
+        logger.info('Streaming quotes for %d symbols of account %s', len(symbols), account_id)
+
+
+# streamed quotes shared by every handler in this process
+QUOTE_CACHE = QuoteCache()
+
+
+async def GetSymbolPrice(connection, symbol: str, account_id: str) -> dict:
+    """Returns the current price of a symbol, from the quote stream when its last quote is fresh.
+
+    Arguments:
+        connection: synchronized RPC connection to the MetaTrader account
+        symbol: broker symbol
+        account_id: MetaApi account id, whose own quotes are used
+
+    Returns:
+        the current MetaTrader symbol price
+    """
+
+    price = QUOTE_CACHE.get(account_id, symbol)
+
+    # falls back to a price request when streaming is off or the quote is stale
+    if price is None:
+        with METRICS.measure('price', symbol):
+            price = await REQUEST_GUARD.read(account_id, connection, 'get_symbol_price', symbol, priority=PRIORITY_MARKET)
+
+    return price
+
+
+# Account State
+class AccountState(SynchronizationListener):
+    """Mirror of one account's terminal state, kept up to date by the events of a streaming connection.
+
+    MetaApi pushes the account information, every position and pending order change and the equity and margin
+    that come with each price update, so reading the balance or the open volume of a symbol never waits for a
+    request. The state is only trusted while the stream is connected and has synchronized once.
+    """
+
+    def __init__(self, account_id: str):
+        """Creates an empty state.
+
+        Arguments:
+            account_id: MetaApi account id
+        """
+
+        super().__init__()
+
+        self.account_id = account_id
+        self.information = None
+        self.connection = None
+
+        # open positions and pending orders keyed by their MetaTrader id
+        self.positions = {}
+        self.orders = {}
+
+        # instances of the account that are connected, and the synchronizations that completed
+        self.instances = set()
+        self.positions_synchronized = False
+        self.orders_synchronized = False
+
+    @property
+    def live(self) -> bool:
+        """Whether the state is synchronized and still receives events."""
+
+        return self.information is not None and bool(self.instances) and self.positions_synchronized and self.orders_synchronized
+
+    def exposure(self, symbol: str) -> float:
+        """Returns the lots of the open positions and pending orders of a symbol.
+
+        Arguments:
+            symbol: broker symbol
+
+        Returns:
+            the summed volume, pending orders count since they can be filled at any time
+        """
+
+        return sum(item['volume'] for item in itertools.chain(self.positions.values(), self.orders.values()) if item['symbol'] == symbol)
+
+    async def on_connected(self, instance_index: str, replicas: int):
+        """Marks an instance of the account as connected."""
+
+        self.instances.add(instance_index)
+
+    async def on_disconnected(self, instance_index: str):
+        """Marks an instance of the account as disconnected."""
+
+        self.instances.discard(instance_index)
+
+        # the next synchronization replaces the positions and orders, until then they may be outdated
+        if not self.instances:
+            self.positions_synchronized = False
+            self.orders_synchronized = False
+
+    async def on_stream_closed(self, instance_index: str):
+        """Treats a closed stream like a disconnected instance."""
+
+        await self.on_disconnected(instance_index)
+
+    async def on_account_information_updated(self, instance_index: str, account_information: dict):
+        """Stores the account information."""
+
+        self.information = dict(account_information)
+
+    async def on_positions_replaced(self, instance_index: str, positions: list):
+        """Replaces every position with the ones of a new synchronization."""
+
+        self.positions = {position['id']: position for position in positions}
+        RISK_ENGINE.replace(self.account_id, 'position', positions)
+
+    async def on_positions_synchronized(self, instance_index: str, synchronization_id: str):
+        """Marks the positions as synchronized."""
+
+        self.positions_synchronized = True
+        self._prune()
+
+    async def on_positions_updated(self, instance_index: str, positions: list, removed_positions_ids: list):
+        """Applies a batch of changed and removed positions."""
+
+        for position in positions:
+            self.positions[position['id']] = position
+            RISK_ENGINE.update(self.account_id, 'position', position)
+
+        for position_id in removed_positions_ids:
+            self.positions.pop(position_id, None)
+            RISK_ENGINE.remove(self.account_id, 'position', position_id)
+
+    async def on_position_updated(self, instance_index: str, position: dict):
+        """Stores an opened or changed position."""
+
+        self.positions[position['id']] = position
+        RISK_ENGINE.update(self.account_id, 'position', position)
+
+    async def on_position_removed(self, instance_index: str, position_id: str):
+        """Forgets a closed position."""
+
+        self.positions.pop(position_id, None)
+        RISK_ENGINE.remove(self.account_id, 'position', position_id)
+
+    async def on_pending_orders_replaced(self, instance_index: str, orders: list):
+        """Replaces every pending order with the ones of a new synchronization."""
+
+        self.orders = {order['id']: order for order in orders}
+        RISK_ENGINE.replace(self.account_id, 'order', orders)
+
+    async def on_pending_orders_synchronized(self, instance_index: str, synchronization_id: str):
+        """Marks the pending orders as synchronized."""
+
+        self.orders_synchronized = True
+        self._prune()
+
+    def _prune(self) -> None:
+        """Lets the position manager forget the legs that closed while the stream was not synchronized."""
+
+        if self.positions_synchronized and self.orders_synchronized:
+            POSITION_MANAGER.prune(self.account_id, self.positions.keys() | self.orders.keys())
+
+    async def on_pending_orders_updated(self, instance_index: str, orders: list, completed_orders_ids: list):
+        """Applies a batch of changed and completed pending orders."""
+
+        for order in orders:
+            self.orders[order['id']] = order
+            RISK_ENGINE.update(self.account_id, 'order', order)
+
+        for order_id in completed_orders_ids:
+            self.orders.pop(order_id, None)
+            RISK_ENGINE.remove(self.account_id, 'order', order_id)
+
+    async def on_pending_order_updated(self, instance_index: str, order: dict):
+        """Stores a placed or changed pending order."""
+
+        self.orders[order['id']] = order
+        RISK_ENGINE.update(self.account_id, 'order', order)
+
+    async def on_pending_order_completed(self, instance_index: str, order_id: str):
+        """Forgets a filled or cancelled pending order."""
+
+        self.orders.pop(order_id, None)
+        RISK_ENGINE.remove(self.account_id, 'order', order_id)
+
+    async def on_deal_added(self, instance_index: str, deal: dict):
+        """Hands a new deal to the position manager, which reacts to take profits, and to the daily loss of the risk engine."""
+
+        POSITION_MANAGER.on_deal(self.account_id, deal)
+        RISK_ENGINE.on_deal(self.account_id, deal)
+
+    async def on_symbol_prices_updated(self, instance_index: str, prices: list, equity: float = None, margin: float = None, free_margin: float = None, margin_level: float = None, account_currency_exchange_rate: float = None):
+        """Updates the equity and margin that come with the streamed prices and hands the prices to the position manager.
+
+        Arguments:
+            instance_index: index of the account instance that sent the prices
+            prices: updated MetaTrader symbol prices
+            equity: current equity of the account
+            margin: current used margin of the account
+            free_margin: current free margin of the account
+            margin_level: current margin level of the account
+        """
+
+        POSITION_MANAGER.on_prices(self.account_id, prices)
+
+        # every price update carries the equity and margin of the account, the balance only changes with deals
+        if self.information is None:
+            return
+
+        for key, value in [('equity', equity), ('margin', margin), ('freeMargin', free_margin), ('marginLevel', margin_level)]:
+            if value is not None:
+                self.information[key] = value
+
+
+class AccountStateCache:
+    """Streams the terminal state of every account into an AccountState.
+
+    ExecuteOnAccount and the prewarmer read the account information from here and only ask the account when
+    its state is not live, and the pre-trade checks read the free margin and the open volume of a symbol
+    without a request.
+    """
+
+    def __init__(self):
+        """Creates an empty cache."""
+
+        # state keyed by account id
+        self.states = {}
+
+    async def start(self, account_id: str, account) -> None:
+        """Opens a streaming connection to an account and waits until its state is synchronized.
+
+        Arguments:
+            account_id: MetaApi account id
+            account: MetaApi account
+        """
+
+        if account_id in self.states:
+            return
+
+        state = self.states[account_id] = AccountState(account_id)
+
+        state.connection = account.get_streaming_connection()
+        state.connection.add_synchronization_listener(state)
+
+        await state.connection.connect()
+        await state.connection.wait_synchronized()
+
+        logger.info('Streaming the state of account %s: %d positions, %d pending orders', account_id, len(state.positions), len(state.orders))
+
+    def get(self, account_id: str) -> AccountState:
+        """Returns the state of an account if it is live.
+
+        Arguments:
+            account_id: MetaApi account id
+
+        Returns:
+            the account state, or None if the account is not streamed or its stream is down
+        """
+
+        state = self.states.get(account_id)
+
+        return state if state is not None and state.live else None
+
+    def account_information(self, account_id: str) -> dict:
+        """Returns the streamed account information of an account.
+
+        Arguments:
+            account_id: MetaApi account id
+
+        Returns:
+            a copy of the account information, or None if the state of the account is not live
+        """
+
+        state = self.get(account_id)
+
+        return dict(state.information) if state is not None else None
+
+    def check(self, account: AccountSettings, trade: Trade) -> str:
+        """Checks a sized trade against the free margin and the exposure limit of an account.
+
+        Arguments:
+            account: settings of the account
+            trade: trade sized for the account
+
+        Returns:
+            the reason the trade is refused, or None if it passes or the state of the account is not live
+        """
+
+        state = self.get(account['AccountId'])
+
+        if state is None:
+            return None
+
+        symbol = trade.broker_symbol or trade.symbol
+        maxExposure = account.get('MaxSymbolExposure', MAX_SYMBOL_EXPOSURE)
+
+        # refuses trades that would take the open volume of the symbol above the limit
+        if maxExposure:
+            exposure = state.exposure(symbol)
+
+            if exposure + trade.position_size > maxExposure:
+                return f'{trade.position_size} lots of {symbol} would take the exposure from {exposure:g} to {exposure + trade.position_size:g} lots, above the limit of {maxExposure:g}'
+
+        # refuses trades whose estimated margin does not fit into the usable free margin
+        margin = EstimateMargin(trade, state.information.get('leverage'))
+        freeMargin = state.information.get('freeMargin')
+
+        if FREE_MARGIN_USAGE and margin is not None and freeMargin is not None and margin > freeMargin * FREE_MARGIN_USAGE:
+            return f'The trade needs about {margin:,.2f} {state.information.get("currency", "")} of margin, but only {freeMargin * FREE_MARGIN_USAGE:,.2f} of the free margin may be used'
+
+        return None
+
+    async def close(self) -> None:
+        """Closes every streaming connection."""
+
+        for account_id, state in list(self.states.items()):
+            try:
+                await state.connection.close()
+            except Exception as error:
+                logger.warning('Closing the state stream of account %s failed: %s', account_id, error)
+
+        self.states.clear()
+
+
+def EstimateMargin(trade: Trade, leverage: float) -> float:
+    """Estimates the margin of a sized trade from its pip value, without asking the broker.
+
+    The value of a pip per lot divided by the pip size is the contract size in the account currency, so
+    multiplying it by the entry and the lots gives the notional of the trade.
+
+    Arguments:
+        trade: trade sized for an account
+        leverage: leverage of the account
+
+    Returns:
+        the margin in the account currency, or None if the leverage is not known
+    """
+
+    if not leverage:
+        return None
+
+    return trade.position_size * trade.pip_value / trade.pip_size * trade.entry / leverage
+
+
+# streamed account states shared by every handler in this process
+ACCOUNT_STATES = AccountStateCache()
+
+
+# Risk Engine
+@dataclasses.dataclass(frozen=True, slots=True)
+class Exposure:
+    """Contribution of one position, pending order or reserved trade to the risk aggregates of its account."""
+
+    base: str
+    quote: str
+    # value of Side, the base currency is bought for 1 and sold for -1
+    direction: int
+    # money lost at the stop loss in the account currency, 0 without a stop loss or once it is at or beyond the entry
+    risk: float
+    provider: str = None
+    legs: int = 1
+
+
+class RiskEngine:
+    """Checks a sized trade against the risk limits of its account before any order is sent.
+
+    Every open position and pending order contributes its risk at the stop loss to running totals per account,
+    per currency and per provider. The events of AccountState replace the contribution of the one item that
+    changed, so a check only reads a handful of totals and never walks the positions. Currencies keep a signed
+    total, a buy adds its risk to the base currency and takes it from the quote currency, so several trades
+    against the same currency add up while hedged ones cancel out.
+    """
+
+    def __init__(self, account_risk: float = MAX_ACCOUNT_RISK, currency_risk: float = MAX_CURRENCY_RISK, provider_risk: float = MAX_PROVIDER_RISK, daily_loss: float = MAX_DAILY_LOSS, open_trades: int = MAX_OPEN_TRADES):
+        """Creates an engine without any exposure.
+
+        Arguments:
+            account_risk: share of the balance all open trades of an account may risk, 0 disables the check
+            currency_risk: share of the balance that may be at risk in one direction of a currency, 0 disables the check
+            provider_risk: share of the balance the open trades of one provider may risk, 0 disables the check
+            daily_loss: share of the day's starting balance that closed trades may lose, 0 disables the check
+            open_trades: most open positions and pending orders per account, 0 disables the check
+        """
+
+        self.account_risk = account_risk
+        self.currency_risk = currency_risk
+        self.provider_risk = provider_risk
+        self.daily_loss = daily_loss
+        self.open_trades = open_trades
+
+        # contributions keyed by account id, then by kind ('position', 'order' or 'reserved') and id
+        self.exposures = collections.defaultdict(dict)
+
+        # running totals keyed by account id, by account id and currency, and by account id and provider
+        self.account_totals = collections.defaultdict(float)
+        self.leg_counts = collections.defaultdict(int)
+        self.currency_totals = collections.defaultdict(float)
+        self.provider_totals = collections.defaultdict(float)
+
+        # UTC day, realized profit and counted deal ids of that day keyed by account id
+        self.days = {}
+
+        # provider of the legs the bot entered keyed by account id and leg id
+        self.providers = {}
+
+        # currencies and value of a price change of 1 per lot in the account currency keyed by account id and broker symbol
+        self.currencies = {}
+        self.values = {}
+
+        self._reservations = itertools.count()
+
+    def check(self, account: AccountSettings, trade: Trade, balance: float) -> str:
+        """Checks a sized trade against the risk factor of the account and the limits of the risk engine.
+
+        The check only reads the totals, a trade that passes changes them once it is reserved.
+
+        Arguments:
+            account: settings of the account
+            trade: trade sized for the account
+            balance: current balance of the account
+
+        Returns:
+            the reason the trade is refused, or None if it passes
+        """
+
+        account_id = account['AccountId']
+        symbol = trade.broker_symbol or trade.symbol
+        risk = trade.position_size * trade.pip_value * trade.stop_loss_pips
+
+        # the lot size is rounded down to the volume step, so only the minimum lot size can risk more than the risk factor
+        if risk > balance * trade.risk_factor * (1 + 1e-9):
+            return f'{trade.position_size} lots risk {risk:,.2f} at the stop loss, more than the risk factor of {trade.risk_factor:.1%} of the balance'
+
+        # the totals are only complete while the streamed state of the account is live
+        if ACCOUNT_STATES.get(account_id) is None:
+            return None
+
+        day, realized, _ = self.days.get(account_id, (None, 0, None))
+
+        if self.daily_loss and day == datetime.datetime.now(datetime.timezone.utc).date() and -realized >= self.daily_loss * (balance - realized):
+            return f'Closed trades lost {-realized:,.2f} today, the daily loss limit of {self.daily_loss:.1%} of the balance is reached'
+
+        legs = self.leg_counts.get(account_id, 0)
+
+        if self.open_trades and legs + len(trade.take_profits) > self.open_trades:
+            return f'The account has {legs} open positions and pending orders, {len(trade.take_profits)} more would exceed the limit of {self.open_trades}'
+
+        accountTotal = self.account_totals.get(account_id, 0)
+
+        if self.account_risk and accountTotal + risk > self.account_risk * balance:
+            return f'The open trades already risk {accountTotal:,.2f}, {risk:,.2f} more would exceed {self.account_risk:.1%} of the balance'
+
+        base, quote = self._currencies(account_id, symbol)
+
+        for currency, signedRisk in [(base, trade.side.value * risk), (quote, -trade.side.value * risk)]:
+            total = self.currency_totals.get((account_id, currency), 0)
+
+            # trades that reduce the exposure to a currency always pass
+            if self.currency_risk and abs(total + signedRisk) > max(abs(total), self.currency_risk * balance):
+                return f'The open trades already risk {abs(total):,.2f} on {currency}, {risk:,.2f} more in the same direction would exceed {self.currency_risk:.1%} of the balance'
+
+        providerTotal = self.provider_totals.get((account_id, trade.provider), 0)
+
+        if self.provider_risk and trade.provider is not None and providerTotal + risk > self.provider_risk * balance:
+            return f'The open trades of this provider already risk {providerTotal:,.2f}, {risk:,.2f} more would exceed {self.provider_risk:.1%} of the balance'
+
+        return None
+
+    def reserve(self, account_id: str, trade: Trade) -> tuple:
+        """Counts a checked trade against the limits while its orders are on their way, so concurrent signals see it.
+
+        Arguments:
+            account_id: MetaApi account id
+            trade: trade sized for the account
+
+        Returns:
+            the key of the reservation, to hand to release
+        """
+
+        key = ('reserved', next(self._reservations))
+        symbol = trade.broker_symbol or trade.symbol
+        base, quote = self._currencies(account_id, symbol)
+
+        # open positions of the symbol are valued with the pip value the trade was sized with
+        if trade.pip_size:
+            self.values[(account_id, symbol)] = trade.pip_value / trade.pip_size
+
+        self._apply(account_id, key, Exposure(base, quote, trade.side.value, trade.position_size * trade.pip_value * trade.stop_loss_pips, trade.provider, len(trade.take_profits)))
+
+        return key
+
+    def release(self, account_id: str, key: tuple, trade: Trade, report: dict = None) -> None:
+        """Replaces the reservation of a trade with its accepted legs, unless the stream reported them already.
+
+        Arguments:
+            account_id: MetaApi account id
+            key: key returned by reserve
+            trade: trade sized for the account
+            report: report returned by SubmitOrders, None if no order was sent
+        """
+
+        self._apply(account_id, key, None)
+
+        # without a live stream the closes of the legs would never be seen
+        if report is None or ACCOUNT_STATES.get(account_id) is None:
+            return
+
+        base, quote = self._currencies(account_id, trade.broker_symbol or trade.symbol)
+        kind = 'position' if trade.market else 'order'
+
+        for leg in report['Legs']:
+            legId = leg['PositionId'] if trade.market else leg['OrderId']
+
+            if legId is None:
+                continue
+
+            # a leg that failed after it got an id never opens
+            if leg['Error']:
+                self.providers.pop((account_id, legId), None)
+                continue
+
+            self.providers[(account_id, legId)] = trade.provider
+            exposure = self.exposures[account_id].get((kind, legId))
+
+            if exposure is not None:
+                self._apply(account_id, (kind, legId), dataclasses.replace(exposure, provider=trade.provider))
+            else:
+                self._apply(account_id, (kind, legId), Exposure(base, quote, trade.side.value, leg['Volume'] * trade.pip_value * trade.stop_loss_pips, trade.provider))
+
+    def replace(self, account_id: str, kind: str, items: list) -> None:
+        """Replaces every position or every pending order of an account after a synchronization.
+
+        Arguments:
+            account_id: MetaApi account id
+            kind: 'position' or 'order'
+            items: MetaApi positions or pending orders
+        """
+
+        for key in [key for key in self.exposures[account_id] if key[0] == kind]:
+            self._apply(account_id, key, None)
+
+        for item in items:
+            self.update(account_id, kind, item)
+
+        # forgets the providers of legs that closed while the stream was down
+        if kind == 'position':
+            exposures = self.exposures[account_id]
+
+            for key in [key for key in self.providers if key[0] == account_id and ('position', key[1]) not in exposures and ('order', key[1]) not in exposures]:
+                del self.providers[key]
+
+    def update(self, account_id: str, kind: str, item: dict) -> None:
+        """Replaces the contribution of an opened or changed position or pending order.
+
+        Arguments:
+            account_id: MetaApi account id
+            kind: 'position' or 'order'
+            item: MetaApi position or pending order
+        """
+
+        symbol = item['symbol']
+        base, quote = self._currencies(account_id, symbol)
+        direction = Side.BUY.value if 'BUY' in item['type'] else Side.SELL.value
+        value = self.values.get((account_id, symbol))
+
+        # positions come with the value of a tick, pending orders of symbols the bot never sized count without risk
+        if value is None and item.get('currentTickValue'):
+            specification = self._specification(account_id, symbol)
+
+            if specification and specification.get('tickSize'):
+                value = self.values[(account_id, symbol)] = item['currentTickValue'] / specification['tickSize']
+
+        stopLoss = item.get('stopLoss')
+        volume = item.get('currentVolume') or item['volume']
+        risk = max(0, (item['openPrice'] - stopLoss) * direction) * volume * value if stopLoss and value else 0
+
+        self._apply(account_id, (kind, item['id']), Exposure(base, quote, direction, risk, self.providers.get((account_id, item['id']))))
+
+    def remove(self, account_id: str, kind: str, itemId: str) -> None:
+        """Takes a closed position or a filled or cancelled pending order out of the totals.
+
+        Arguments:
+            account_id: MetaApi account id
+            kind: 'position' or 'order'
+            itemId: MetaTrader id of the position or order
+        """
+
+        self._apply(account_id, (kind, itemId), None)
+
+        # keeps the provider of a filled pending order that continues as the open position with the same id, a cancelled one never opens
+        if kind == 'position' or ('position', itemId) not in self.exposures[account_id]:
+            self.providers.pop((account_id, itemId), None)
+
+    def on_deal(self, account_id: str, deal: dict) -> None:
+        """Adds the profit of a closing deal of the current UTC day to the realized profit of the account.
+
+        Arguments:
+            account_id: MetaApi account id
+            deal: MetaApi deal
+        """
+
+        if deal.get('entryType') not in ('DEAL_ENTRY_OUT', 'DEAL_ENTRY_OUT_BY', 'DEAL_ENTRY_INOUT'):
+            return
+
+        today = datetime.datetime.now(datetime.timezone.utc).date()
+        dealTime = deal.get('time')
+
+        # synchronizations replay the deal history, only the deals of today count once each
+        if isinstance(dealTime, datetime.datetime) and dealTime.astimezone(datetime.timezone.utc).date() != today:
+            return
+
+        day, realized, dealIds = self.days.get(account_id, (None, 0, None))
+
+        if day != today:
+            realized, dealIds = 0, set()
+
+        if deal['id'] in dealIds:
+            return
+
+        dealIds.add(deal['id'])
+        self.days[account_id] = (today, realized + deal.get('profit', 0) + deal.get('swap', 0) + deal.get('commission', 0), dealIds)
+
+    def _apply(self, account_id: str, key: tuple, exposure: Exposure = None) -> None:
+        """Replaces the contribution of one item and moves the totals by the difference.
+
+        Arguments:
+            account_id: MetaApi account id
+            key: kind and id of the item
+            exposure: new contribution, None removes the item
+        """
+
+        exposures = self.exposures[account_id]
+        previous = exposures.pop(key, None)
+
+        if previous is not None:
+            self._add(account_id, previous, -1)
+
+        if exposure is not None:
+            exposures[key] = exposure
+            self._add(account_id, exposure, 1)
+
+    def _add(self, account_id: str, exposure: Exposure, sign: int) -> None:
+        """Adds a contribution to the totals of its account, or takes it out for a sign of -1.
+
+        Arguments:
+            account_id: MetaApi account id
+            exposure: contribution of the item
+            sign: 1 to add, -1 to take out
+        """
+
+        risk = sign * exposure.risk
+
+        self.account_totals[account_id] += risk
+        self.leg_counts[account_id] += sign * exposure.legs
+        self.currency_totals[(account_id, exposure.base)] += exposure.direction * risk
+        self.currency_totals[(account_id, exposure.quote)] -= exposure.direction * risk
+
+        if exposure.provider is not None:
+            self.provider_totals[(account_id, exposure.provider)] += risk
+
+    def _currencies(self, account_id: str, symbol: str) -> tuple:
+        """Returns the base and quote currency of a broker symbol.
+
+        Arguments:
+            account_id: MetaApi account id
+            symbol: broker symbol
+
+        Returns:
+            the base and quote currency, from the broker's specification or else from the name of the symbol
+        """
+
+        currencies = self.currencies.get((account_id, symbol))
+
+        if currencies is None:
+            specification = self._specification(account_id, symbol)
+
+            if specification and specification.get('baseCurrency') and specification.get('profitCurrency'):
+                currencies = (specification['baseCurrency'], specification['profitCurrency'])
+            else:
+                currencies = (symbol[:3].upper(), symbol[3:6].upper())
+
+            self.currencies[(account_id, symbol)] = currencies
+
+        return currencies
+
+    @staticmethod
+    def _specification(account_id: str, symbol: str) -> dict:
+        """Finds the cached specification of a broker symbol.
+
+        Arguments:
+            account_id: MetaApi account id
+            symbol: broker symbol
+
+        Returns:
+            the specification, or None if the symbol is not in SYMBOLS or not loaded yet
+        """
+
+        return next((specification for specification in SYMBOL_CACHE.specifications.get(account_id, {}).values() if specification['symbol'] == symbol), None)
+
+
+# pre-trade risk limits shared by every handler in this process
+RISK_ENGINE = RiskEngine()
+
+
+# Latency Metrics
+class LatencyMetrics:
+    """Records how long every stage of a signal's path takes, overall and per symbol.
+
+    Percentiles are computed from a rolling window of recent samples, while counts and sums cover the whole
+    lifetime of the process as in a Prometheus summary.
+    """
+
+    # quantiles reported for every stage
+    QUANTILES = [0.5, 0.95, 0.99]
+
+    def __init__(self, window: int = METRICS_WINDOW):
+        """Creates empty histograms.
+
+        Arguments:
+            window: number of recent samples kept per stage and per symbol
+        """
+
+        self.window = window
+
+        # recent samples keyed by stage and by (symbol, stage)
+        self.samples = {}
+        self.symbol_samples = {}
+
+        self.counts = collections.Counter()
+        self.sums = collections.Counter()
+
+        # samples arrive from the dispatcher thread and from the event loop
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float, symbol: str = None) -> None:
+        """Records the duration of a stage.
+
+        Arguments:
+            stage: name of the stage, e.g. 'parse' or 'order_leg'
+            seconds: duration of the stage
+            symbol: traded symbol, if the stage belongs to a trade
+        """
+
+        with self._lock:
+            if stage not in self.samples:
+                self.samples[stage] = collections.deque(maxlen=self.window)
+
+            self.samples[stage].append(seconds)
+            self.counts[stage] += 1
+            self.sums[stage] += seconds
+
+            if symbol:
+                key = (symbol, stage)
+
+                if key not in self.symbol_samples:
+                    self.symbol_samples[key] = collections.deque(maxlen=self.window)
+
+                self.symbol_samples[key].append(seconds)
+
+    @contextlib.contextmanager
+    def measure(self, stage: str, symbol: str = None):
+        """Context manager that records the duration of the enclosed block, also around awaits.
+
+        Arguments:
+            stage: name of the stage
+            symbol: traded symbol, if the stage belongs to a trade
+        """
+
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start, symbol)
+
+    @staticmethod
+    def quantiles(samples) -> list:
+        """Returns the reported quantiles of a list of samples.
+
+        Arguments:
+            samples: recorded durations
+
+        Returns:
+            the value at every quantile in QUANTILES
+        """
+
+        ordered = sorted(samples)
+
+        return [ordered[min(len(ordered) - 1, int(quantile * len(ordered)))] for quantile in LatencyMetrics.QUANTILES]
+
+    def snapshot(self) -> tuple:
+        """Copies the samples so that they can be summarized without holding the lock.
+
+        Returns:
+            the samples per stage, the samples per symbol and stage, the counts and the sums
+        """
+
+        with self._lock:
+            return ({stage: list(samples) for stage, samples in self.samples.items()}, {key: list(samples) for key, samples in self.symbol_samples.items()}, dict(self.counts), dict(self.sums))
+
+    def render_table(self) -> PrettyTable:
+        """Creates PrettyTable object with the latency percentiles of every stage and the total per symbol.
+
+        Returns:
+            a Pretty Table object with p50/p95/p99 in milliseconds
+        """
+
+        samples, symbolSamples, counts, sums = self.snapshot()
+
+        table = PrettyTable()
+
+        table.title = "Latency (ms)"
+        table.field_names = ["Stage", "p50", "p95", "p99", "Count"]
+        table.align["Stage"] = "l"
+
+        for stage in sorted(samples):
+            table.add_row([stage] + ['{:,.1f}'.format(value * 1000) for value in self.quantiles(samples[stage])] + [counts[stage]])
+
+        # the rolling breakdown of the whole signal per symbol
+        for (symbol, stage) in sorted(symbolSamples):
+            if stage == 'signal':
+                table.add_row([f'signal {symbol}'] + ['{:,.1f}'.format(value * 1000) for value in self.quantiles(symbolSamples[(symbol, stage)])] + [len(symbolSamples[(symbol, stage)])])
+
+        return table
+
+    def render_prometheus(self) -> str:
+        """Renders the metrics in the Prometheus text exposition format.
+
+        Returns:
+            the metrics page
+        """
+
+        samples, symbolSamples, counts, sums = self.snapshot()
+
+        lines = ['# HELP signal_stage_latency_seconds Duration of each stage of a signal.', '# TYPE signal_stage_latency_seconds summary']
+
+        for stage in sorted(samples):
+            for quantile, value in zip(self.QUANTILES, self.quantiles(samples[stage])):
+                lines.append(f'signal_stage_latency_seconds{{stage="{stage}",quantile="{quantile}"}} {value}')
+
+            lines.append(f'signal_stage_latency_seconds_sum{{stage="{stage}"}} {sums[stage]}')
+            lines.append(f'signal_stage_latency_seconds_count{{stage="{stage}"}} {counts[stage]}')
+
+        lines += ['# HELP signal_symbol_latency_seconds Duration of each stage of a signal per symbol over the recent window.', '# TYPE signal_symbol_latency_seconds gauge']
+
+        for (symbol, stage) in sorted(symbolSamples):
+            for quantile, value in zip(self.QUANTILES, self.quantiles(symbolSamples[(symbol, stage)])):
+                lines.append(f'signal_symbol_latency_seconds{{symbol="{symbol}",stage="{stage}",quantile="{quantile}"}} {value}')
+
+        return '\n'.join(lines) + '\n'
+
+
+# latency histograms shared by every handler in this process
+METRICS = LatencyMetrics()
+
+
+# Signal Journal
+class SignalJournal(BasePersistence):
+    """Append-only journal of every parsed signal and order result, which also keeps the conversation state.
+
+    The journal is a SQLite database in WAL mode. Handlers only put their writes on a queue, and a writer
+    thread commits everything that arrived within the flush interval in one transaction, so the disk is
+    synchronized once per batch instead of once per write and never on the signal path. As the persistence
+    of the Telegram updater it restores the conversations and pending trades after a restart.
+    """
+
+    SCHEMA = [
+        'CREATE TABLE IF NOT EXISTS signals (id INTEGER PRIMARY KEY, received_at REAL NOT NULL, chat_id INTEGER, symbol TEXT NOT NULL, order_type TEXT NOT NULL, enter INTEGER NOT NULL, message TEXT, trade TEXT NOT NULL)',
+        'CREATE TABLE IF NOT EXISTS orders (id INTEGER PRIMARY KEY, signal_id INTEGER NOT NULL, recorded_at REAL NOT NULL, account TEXT NOT NULL, symbol TEXT NOT NULL, position_size REAL, accepted INTEGER, rejected INTEGER, error TEXT, latency REAL, legs TEXT)',
+        'CREATE TABLE IF NOT EXISTS state (kind TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, PRIMARY KEY (kind, key))',
+        'CREATE INDEX IF NOT EXISTS signals_symbol_time ON signals (symbol, received_at)',
+        'CREATE INDEX IF NOT EXISTS orders_symbol_time ON orders (symbol, recorded_at)',
+        'CREATE INDEX IF NOT EXISTS orders_signal ON orders (signal_id)',
+        'CREATE TABLE IF NOT EXISTS dedup (key TEXT PRIMARY KEY, expires_at REAL NOT NULL)',
+        'CREATE TABLE IF NOT EXISTS copies (chat_id INTEGER NOT NULL, message_id INTEGER NOT NULL, symbol TEXT NOT NULL, copied_at REAL NOT NULL, trade TEXT NOT NULL, positions TEXT NOT NULL, PRIMARY KEY (chat_id, message_id))',
+        'CREATE INDEX IF NOT EXISTS copies_symbol_time ON copies (chat_id, symbol, copied_at)',
+    ]
+
+    def __init__(self, path: str = JOURNAL_FILE, flush_interval: float = JOURNAL_FLUSH_INTERVAL):
+        """Creates the journal without touching the disk yet.
+
+        Arguments:
+            path: SQLite database of the journal, nothing is persisted when empty
+            flush_interval: seconds that writes are collected before they are committed together
+        """
+
+        super().__init__(store_user_data=True, store_chat_data=False, store_bot_data=False)
+
+        self.path = path
+        self.flush_interval = flush_interval
+
+        # state restored from the previous run, keyed like the dispatcher keys it
+        self.user_data = collections.defaultdict(dict)
+        self.conversations = {}
+
+        # last value written per state row, so unchanged user data is not written again
+        self._written = {}
+
+        # duplicate check keys of entered signals that were still within their window at startup
+        self.deduplication_keys = []
+
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._signal_ids = itertools.count(1)
+
+    def open(self) -> None:
+        """Creates the database if needed, replays the persisted state and starts the writer thread."""
+
+        if not self.path or self._thread is not None:
+            return
+
+        database = self._connect()
+
+        try:
+            for statement in self.SCHEMA:
+                database.execute(statement)
+
+            # continues the signal ids of the previous run so that orders keep pointing at their signal
+            lastSignal = database.execute('SELECT MAX(id) FROM signals').fetchone()[0] or 0
+            self._signal_ids = itertools.count(lastSignal + 1)
+
+            rows = database.execute('SELECT kind, key, value FROM state').fetchall()
+
+            # forgets the duplicate check keys whose window is over
+            with database:
+                database.execute('DELETE FROM dedup WHERE expires_at <= ?', (time.time(),))
+
+            self.deduplication_keys = database.execute('SELECT key, expires_at FROM dedup ORDER BY expires_at').fetchall()
+
+        finally:
+            database.close()
+
+        for kind, key, value in rows:
+            self._written[(kind, key)] = value
+
+            if kind == 'user_data':
+                self.user_data[int(key)] = json.loads(value, object_hook=self._decode)
+
+            elif kind.startswith('conversation:'):
+                self.conversations.setdefault(kind.split(':', 1)[1], {})[tuple(json.loads(key))] = json.loads(value)
+
+        logger.info('Replayed %d state entries from the journal, next signal id is %d', len(rows), lastSignal + 1)
+
+        self._thread = threading.Thread(target=self._write_loop, name='journal-writer', daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def _decode(data: dict):
+        """Turns the serialized trades in the replayed user data back into Trade objects.
+
+        Arguments:
+            data: JSON object from the state table
+
+        Returns:
+            a Trade for objects written by Trade.to_dict, the object itself otherwise
+        """
+
+        if 'OrderType' in data and 'StopLoss' in data and 'TP' in data:
+            return Trade.from_dict(data)
+
+        return data
+
+    def _connect(self) -> sqlite3.Connection:
+        """Opens a connection to the journal database in WAL mode.
+
+        Returns:
+            a SQLite connection
+        """
+
+        database = sqlite3.connect(self.path, timeout=30)
+
+        # readers never block the writer, and commits are only synchronized to disk at checkpoints
+        database.execute('PRAGMA journal_mode=WAL')
+        database.execute('PRAGMA synchronous=NORMAL')
+
+        return database
+
+    def _write(self, statement: str, parameters: tuple) -> None:
+        """Queues a write for the writer thread, dropping it when the journal is not open.
+
+        Arguments:
+            statement: SQL statement
+            parameters: parameters of the statement
+        """
+
+        if self._thread is not None:
+            self._queue.put((statement, parameters))
+
+    def _write_loop(self) -> None:
+        """Commits the queued writes in batches until close() is called."""
+
+        database = self._connect()
+        running = True
+
+        while running:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+
+            # collects writes until the flush interval is over or somebody waits for them
+            while isinstance(batch[-1], tuple):
+                timeout = deadline - time.monotonic()
+
+                if timeout <= 0:
+                    break
+
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+
+            waiting = []
+
+            try:
+                with database:
+                    for item in batch:
+                        if isinstance(item, tuple):
+                            database.execute(*item)
+                        elif item is None:
+                            running = False
+                        else:
+                            waiting.append(item)
+
+            except sqlite3.Error as error:
+                logger.error('Writing %d journal entries failed: %s', len(batch), error)
+
+            for event in waiting:
+                event.set()
+
+        database.close()
+
+    def flush(self, timeout: float = 10) -> None:
+        """Waits until every queued write is committed.
+
+        Arguments:
+            timeout: seconds to wait at most
+        """
+
+        if self._thread is None:
+            return
+
+        event = threading.Event()
+        self._queue.put(event)
+        event.wait(timeout)
+
+    def close(self) -> None:
+        """Commits the queued writes and stops the writer thread."""
+
+        if self._thread is None:
+            return
+
+        self._queue.put(None)
+        self._thread.join(10)
+        self._thread = None
+
+    def record_signal(self, trade: Trade, enterTrade: bool, update: Update = None) -> int:
+        """Appends a parsed signal to the journal.
+
+        Arguments:
+            trade: trade signal information
+            enterTrade: whether the trade is entered or only calculated
+            update: update from Telegram that carried the signal
+
+        Returns:
+            the id of the signal, used to record its order results
+        """
+
+        signalId = next(self._signal_ids)
+        message = update.effective_message if update is not None else None
+
+        self._write('INSERT INTO signals (id, received_at, chat_id, symbol, order_type, enter, message, trade) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', (signalId, time.time(), message.chat_id if message else None, trade.symbol, trade.order_type.value, int(enterTrade), message.text if message else None, json.dumps(trade.to_dict())))
+
+        return signalId
+
+    def record_results(self, signalId: int, results: list) -> None:
+        """Appends the outcome of a signal on every account to the journal.
+
+        Arguments:
+            signalId: id returned by record_signal
+            results: results returned by ExecuteOnAccounts
+        """
+
+        now = time.time()
+
+        for result in results:
+            report = result['Report'] or {}
+            self._write('INSERT INTO orders (signal_id, recorded_at, account, symbol, position_size, accepted, rejected, error, latency, legs) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', (signalId, now, result['Account']['Name'], result['Trade'].symbol, result['Trade'].position_size, report.get('Accepted'), report.get('Rejected'), result['Error'], result['Latency'], json.dumps(report.get('Legs', []))))
+
+    def record_deduplication_key(self, key: str, expiresAt: float) -> None:
+        """Persists a key of the duplicate check so that it outlives a restart.
+
+        Arguments:
+            key: key built by SignalDeduplicator
+            expiresAt: Unix time at which the key's window is over
+        """
+
+        self._write('INSERT OR REPLACE INTO dedup (key, expires_at) VALUES (?, ?)', (key, expiresAt))
+
+    def record_copy(self, copy: dict) -> None:
+        """Persists a signal copied from a source chat so that replies and edits can find it after a restart.
+
+        Arguments:
+            copy: copy built by ChannelCopier, with the chat and message id, the trade and the positions per account
+        """
+
+        self._write('INSERT OR REPLACE INTO copies (chat_id, message_id, symbol, copied_at, trade, positions) VALUES (?, ?, ?, ?, ?, ?)', (copy['ChatId'], copy['MessageId'], copy['Trade'].symbol, copy['CopiedAt'], json.dumps(copy['Trade'].to_dict()), json.dumps(copy['Positions'])))
+
+    def find_copy(self, chatId: int, messageId: int = None, symbol: str = None) -> dict:
+        """Returns a copied signal by its message, or the newest copied signal of a symbol in a chat.
+
+        Arguments:
+            chatId: id of the source chat
+            messageId: id of the message that carried the signal
+            symbol: symbol from SYMBOLS, used when no message id is given
+
+        Returns:
+            the copy as record_copy received it, or None if there is none
+        """
+
+        if not self.path or not os.path.exists(self.path):
+            return None
+
+        database = self._connect()
+
+        try:
+            if messageId is not None:
+                row = database.execute('SELECT chat_id, message_id, copied_at, trade, positions FROM copies WHERE chat_id = ? AND message_id = ?', (chatId, messageId)).fetchone()
+            else:
+                row = database.execute('SELECT chat_id, message_id, copied_at, trade, positions FROM copies WHERE chat_id = ? AND symbol = ? ORDER BY copied_at DESC LIMIT 1', (chatId, symbol)).fetchone()
+
+        finally:
+            database.close()
+
+        if row is None:
+            return None
+
+        return {'ChatId': row[0], 'MessageId': row[1], 'CopiedAt': row[2], 'Trade': Trade.from_dict(json.loads(row[3])), 'Positions': json.loads(row[4])}
+
+    def lookup(self, symbol: str, since: float = 0, until: float = None, limit: int = 20) -> list:
+        """Returns the journaled signals of a symbol within a time range, newest first, using the symbol and time index.
+
+        Arguments:
+            symbol: symbol from SYMBOLS
+            since: earliest Unix time of a signal
+            until: latest Unix time of a signal, defaults to now
+            limit: maximum number of signals
+
+        Returns:
+            a list of signals, each with its trade and the results on every account
+        """
+
+        if not self.path or not os.path.exists(self.path):
+            return []
+
+        database = self._connect()
+
+        try:
+            signals = database.execute('SELECT id, received_at, order_type, enter, trade FROM signals WHERE symbol = ? AND received_at BETWEEN ? AND ? ORDER BY received_at DESC LIMIT ?', (symbol, since, until or time.time(), limit)).fetchall()
+            orders = collections.defaultdict(list)
+
+            if signals:
+                placeholders = ','.join('?' * len(signals))
+
+                for signalId, account, positionSize, accepted, rejected, error, latency in database.execute(f'SELECT signal_id, account, position_size, accepted, rejected, error, latency FROM orders WHERE signal_id IN ({placeholders})', [row[0] for row in signals]):
+                    orders[signalId].append({'Account': account, 'PositionSize': positionSize, 'Accepted': accepted, 'Rejected': rejected, 'Error': error, 'Latency': latency})
+
+        finally:
+            database.close()
+
+        return [{'Id': signalId, 'ReceivedAt': receivedAt, 'OrderType': orderType, 'Entered': bool(enter), 'Trade': json.loads(trade), 'Results': orders[signalId]} for signalId, receivedAt, orderType, enter, trade in signals]
+
+    def _update_state(self, kind: str, key: str, value) -> None:
+        """Queues a state row, skipping it when the value did not change.
+
+        Arguments:
+            kind: 'user_data' or 'conversation:' followed by the conversation name
+            key: key of the row
+            value: JSON serializable value, None deletes the row
+        """
+
+        encoded = None if value is None else json.dumps(value, default=Trade.to_dict)
+
+        if self._written.get((kind, key)) == encoded:
+            return
+
+        self._written[(kind, key)] = encoded
+
+        if encoded is None:
+            self._write('DELETE FROM state WHERE kind = ? AND key = ?', (kind, key))
+        else:
+            self._write('INSERT OR REPLACE INTO state (kind, key, value) VALUES (?, ?, ?)', (kind, key, encoded))
+
+    def get_user_data(self) -> collections.defaultdict:
+        """Returns the user data replayed from the journal, with the pending trade of every user."""
+
+        return self.user_data
+
+    def get_chat_data(self) -> collections.defaultdict:
+        """Chat data is not used by the bot and never persisted."""
+
+        return collections.defaultdict(dict)
+
+    def get_bot_data(self) -> dict:
+        """Bot data is not used by the bot and never persisted."""
+
+        return {}
+
+    def get_conversations(self, name: str) -> dict:
+        """Returns the conversation states replayed from the journal.
+
+        Arguments:
+            name: name of the conversation handler
+        """
+
+        return self.conversations.get(name, {})
+
+    def update_conversation(self, name: str, key: tuple, new_state) -> None:
+        """Journals the new state of a conversation.
+
+        Arguments:
+            name: name of the conversation handler
+            key: chat and user id of the conversation
+            new_state: new state, None when the conversation ended
+        """
+
+        self.conversations.setdefault(name, {})[key] = new_state
+        self._update_state(f'conversation:{name}', json.dumps(key), new_state)
+
+    def update_user_data(self, user_id: int, data: dict) -> None:
+        """Journals the user data after every update that changed it.
+
+        Arguments:
+            user_id: Telegram user id
+            data: user data of the user
+        """
+
+        self.user_data[user_id] = data
+        self._update_state('user_data', str(user_id), data)
+
+    def update_chat_data(self, chat_id: int, data: dict) -> None:
+        """Chat data is not used by the bot and never persisted."""
+
+        return
+
+    def update_bot_data(self, data: dict) -> None:
+        """Bot data is not used by the bot and never persisted."""
+
+        return
+
+    @classmethod
+    def replace_bot(cls, obj):
+        """No Bot is ever persisted, so the user data with its frozen trades is journaled as it is."""
+
+        return obj
+
+    def insert_bot(self, obj):
+        """No Bot is ever persisted, so the user data with its frozen trades is restored as it is."""
+
+        return obj
+
+
+# signal journal and conversation state shared by every handler in this process
+JOURNAL = SignalJournal()
+
+
+# Signal Deduplication
+class SignalDeduplicator:
+    """Refuses to enter the same signal twice within a window, e.g. after a webhook retry or a double paste.
+
+    A signal is a duplicate when its message was already entered or when the same chat entered a trade with
+    the same canonical hash of Trade.key. The keys live in an LRU dictionary bounded in size, so a check is a couple of
+    hash lookups. A check only reserves the keys of a new signal: they are confirmed and persisted in the journal
+    once an order of the signal was accepted, so that a restart does not forget them, and released when no order
+    was accepted, so that the signal can be sent again.
+    """
+
+    def __init__(self, journal: SignalJournal, window: float = DEDUP_WINDOW, size: int = DEDUP_CACHE_SIZE):
+        """Creates an empty duplicate check.
+
+        Arguments:
+            journal: journal the keys are persisted to
+            window: seconds during which a repeated signal is a duplicate, 0 disables the check
+            size: maximum number of keys kept in memory
+        """
+
+        self.journal = journal
+        self.window = window
+        self.size = size
+
+        # Unix time at which each key's window is over, oldest first
+        self.keys = collections.OrderedDict()
+
+        # the dispatcher may run handlers on several worker threads
+        self._lock = threading.Lock()
+
+    @classmethod
+    def fingerprint(cls, trade: Trade) -> str:
+        """Returns the canonical hash of a trade, independent of how the signal was written.
+
+        Arguments:
+            trade: trade signal information
+
+        Returns:
+            a hexadecimal digest that stays the same between restarts, unlike hash()
+        """
+
+        canonical = json.dumps(trade.key, separators=(',', ':'))
+
+        return hashlib.blake2b(canonical.encode(), digest_size=16).hexdigest()
+
+    def restore(self) -> None:
+        """Loads the keys that the journal replayed from the previous run."""
+
+        for key, expiresAt in self.journal.deduplication_keys[-self.size:]:
+            self.keys[key] = expiresAt
+
+    @classmethod
+    def _keys(cls, trade: Trade, update: Update, index: int) -> list:
+        """Returns the message key and the trade key of a signal.
+
+        Arguments:
+            trade: trade signal information
+            update: update from Telegram that asks to enter the trade
+            index: position of the trade among the trades that the same message enters
+        """
+
+        message = update.effective_message
+
+        return [f'message:{message.chat_id}:{message.message_id}:{index}', f'trade:{message.chat_id}:{cls.fingerprint(trade)}']
+
+    def check(self, trade: Trade, update: Update, index: int = 0) -> bool:
+        """Checks whether a signal was already entered or is being entered, and reserves its keys if not.
+
+        Arguments:
+            trade: trade signal information
+            update: update from Telegram that asks to enter the trade
+            index: position of the trade among the trades that the same message enters
+
+        Returns:
+            True if the signal is a duplicate and must not be entered
+        """
+
+        if not self.window:
+            return False
+
+        keys = self._keys(trade, update, index)
+        now = time.time()
+
+        with self._lock:
+            # every key has the same window, so the expired ones are always at the front
+            while self.keys and next(iter(self.keys.values())) <= now:
+                self.keys.popitem(last=False)
+
+            if any(key in self.keys for key in keys):
+                return True
+
+            for key in keys:
+                self.keys[key] = now + self.window
+
+            while len(self.keys) > self.size:
+                self.keys.popitem(last=False)
+
+        return False
+
+    def settle(self, trade: Trade, update: Update, results: list, index: int = 0) -> None:
+        """Confirms the reserved keys of a signal if an order of it was accepted, and releases them otherwise.
+
+        Arguments:
+            trade: trade signal information passed to check
+            update: update from Telegram passed to check
+            results: results of ExecuteOnAccount for every account, empty when the signal failed before
+            index: position of the trade passed to check
+        """
+
+        if not self.window:
+            return
+
+        keys = self._keys(trade, update, index)
+        entered = any(result['Report'] is not None and result['Report']['Accepted'] > 0 for result in results)
+
+        with self._lock:
+            for key in keys:
+                if entered:
+                    self.journal.record_deduplication_key(key, self.keys.get(key, time.time() + self.window))
+                else:
+                    self.keys.pop(key, None)
+
+
+# duplicate check shared by every handler in this process
+DEDUPLICATOR = SignalDeduplicator(JOURNAL)
+
+
+# Order Scheduling
+class TokenBucket:
+    """Token bucket that allows a steady rate of requests with short bursts.
+
+    The rate adapts to the server: it is halved whenever a request is refused for rate limiting and grows back
+    towards the configured limit with every accepted request.
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        """Creates a full bucket.
+
+        Arguments:
+            rate: tokens added per second
+            capacity: maximum number of tokens, defaults to one second worth of tokens
+        """
+
+        self.limit = rate
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def delay(self, now: float) -> float:
+        """Returns how long to wait until a token is available, without taking it.
+
+        Arguments:
+            now: current monotonic time
+
+        Returns:
+            seconds until the next token, 0 if one is available now
+        """
+
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        """Takes a token, call delay() first to make sure one is available."""
+
+        self.tokens -= 1
+
+    def slow_down(self) -> None:
+        """Halves the rate and empties the bucket after the server refused a request."""
+
+        self.rate = max(self.rate / 2, self.limit / 100)
+        self.tokens = min(self.tokens, 0)
+
+    def speed_up(self) -> None:
+        """Raises the rate a little after the server accepted a request."""
+
+        self.rate = min(self.limit, self.rate + self.limit / 50)
+
+
+class OrderScheduler:
+    """Sends the MetaApi requests of every account through token buckets and a priority queue.
+
+    Every account has one bucket for all its requests and one per endpoint. Waiting requests leave in priority
+    order, so market orders go before pending orders and both before informational requests. A request that
+    is refused for rate limiting pauses the account for the recommended time and is queued again.
+    """
+
+    def __init__(self, rates: dict = RATE_LIMITS, account_rate: float = ACCOUNT_RATE_LIMIT, max_retries: int = MAX_RATE_LIMIT_RETRIES):
+        """Creates the scheduler without starting anything yet.
+
+        Arguments:
+            rates: requests per second allowed per endpoint and account
+            account_rate: requests per second allowed per account over all endpoints
+            max_retries: rate limited attempts of a request before its error is returned
+        """
+
+        self.rates = rates
+        self.account_rate = account_rate
+        self.max_retries = max_retries
+
+        # waiting requests, buckets, pauses and workers keyed by account id
+        self.queues = {}
+        self.buckets = {}
+        self.paused_until = {}
+        self.wakeups = {}
+        self.workers = {}
+
+        self._sequence = itertools.count()
+
+    async def call(self, account_id: str, endpoint: str, priority: int, function, *arguments):
+        """Queues a MetaApi request and waits for its result.
+
+        Arguments:
+            account_id: MetaApi account id
+            endpoint: 'trade' or 'information', selects the endpoint bucket
+            priority: PRIORITY_MARKET, PRIORITY_PENDING or PRIORITY_INFORMATION
+            function: coroutine function of the connection that sends the request
+            arguments: positional arguments of the function
+
+        Returns:
+            the result of the request
+        """
+
+        if account_id not in self.workers:
+            self.queues[account_id] = []
+            self.buckets[account_id] = {endpoint: TokenBucket(rate) for endpoint, rate in self.rates.items()}
+            self.buckets[account_id][None] = TokenBucket(self.account_rate)
+            self.paused_until[account_id] = 0
+            self.wakeups[account_id] = asyncio.Event()
+            self.workers[account_id] = asyncio.get_running_loop().create_task(self._run(account_id))
+
+        request = {'Endpoint': endpoint, 'Priority': priority, 'Function': function, 'Arguments': arguments, 'Attempt': 0, 'Future': asyncio.get_running_loop().create_future()}
+        self._enqueue(account_id, request)
+
+        return await request['Future']
+
+    def _enqueue(self, account_id: str, request: dict) -> None:
+        """Puts a request in the priority queue of an account and wakes up its worker.
+
+        Arguments:
+            account_id: MetaApi account id
+            request: queued request
+        """
+
+        # the sequence number keeps requests of the same priority in arrival order
+        heapq.heappush(self.queues[account_id], (request['Priority'], next(self._sequence), request))
+        self.wakeups[account_id].set()
+
+    async def _run(self, account_id: str) -> None:
+        """Starts the queued requests of an account as fast as its buckets allow.
+
+        Arguments:
+            account_id: MetaApi account id
+        """
+
+        waiting = self.queues[account_id]
+        buckets = self.buckets[account_id]
+        wakeup = self.wakeups[account_id]
+
+        while True:
+            # drops requests whose caller stopped waiting
+            while waiting and waiting[0][2]['Future'].done():
+                heapq.heappop(waiting)
+
+            if not waiting:
+                wakeup.clear()
+                await wakeup.wait()
+                continue
+
+            request = waiting[0][2]
+            now = time.monotonic()
+            endpointBucket = buckets.get(request['Endpoint'], buckets[None])
+            delay = max(self.paused_until[account_id] - now, buckets[None].delay(now), endpointBucket.delay(now))
+
+            # waits for a token, unless a request with a higher priority arrives in the meantime
+            if delay > 0:
+                wakeup.clear()
+
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(wakeup.wait(), delay)
+
+                continue
+
+            heapq.heappop(waiting)
+            buckets[None].take()
+
+            if endpointBucket is not buckets[None]:
+                endpointBucket.take()
+
+            asyncio.get_running_loop().create_task(self._execute(account_id, request))
+
+    async def _execute(self, account_id: str, request: dict) -> None:
+        """Sends a request and resolves its future, queueing it again when it was rate limited.
+
+        Arguments:
+            account_id: MetaApi account id
+            request: queued request
+        """
+
+        future = request['Future']
+        bucket = self.buckets[account_id].get(request['Endpoint'], self.buckets[account_id][None])
+
+        try:
+            result = await request['Function'](*request['Arguments'])
+            bucket.speed_up()
+
+        except Exception as error:
+            if IsRateLimited(error):
+                bucket.slow_down()
+
+            if future.done():
+                return
+
+            if not IsRateLimited(error) or request['Attempt'] >= self.max_retries:
+                future.set_exception(error)
+                return
+
+            request['Attempt'] += 1
+            delay = RetryDelay(error, request['Attempt'])
+
+            logger.warning('Rate limited on account %s, retrying %s request in %.1f seconds', account_id, request['Endpoint'], delay)
+
+            # pauses the whole account, the other waiting requests would be refused as well
+            self.paused_until[account_id] = max(self.paused_until[account_id], time.monotonic() + delay)
+            self._enqueue(account_id, request)
+
+            return
+
+        if not future.done():
+            future.set_result(result)
+
+
+def IsRateLimited(error: Exception) -> bool:
+    """Checks whether MetaApi or the broker refused a request because too many requests were sent.
+
+    Arguments:
+        error: error raised by a MetaApi request
+
+    Returns:
+        True if the request should be retried later
+    """
+
+    return isinstance(error, TooManyRequestsException) or getattr(error, 'stringCode', None) == 'TRADE_RETCODE_TOO_MANY_REQUESTS'
+
+def RetryDelay(error: Exception, attempt: int) -> float:
+    """Returns how long to wait before retrying a rate limited request, with jitter so retries do not line up.
+
+    Arguments:
+        error: rate limit error raised by the request
+        attempt: number of the retry, starting at 1
+
+    Returns:
+        the delay in seconds
+    """
+
+    delay = min(0.1 * 2 ** (attempt - 1), MAX_RECONNECT_DELAY)
+
+    # MetaApi tells when the limit is lifted
+    recommended = getattr(error, 'metadata', None) or {}
+    recommended = recommended.get('recommendedRetryTime') if isinstance(recommended, dict) else None
+
+    if isinstance(recommended, str):
+        with contextlib.suppress(ValueError):
+            recommended = datetime.datetime.fromisoformat(recommended.replace('Z', '+00:00'))
+
+    if isinstance(recommended, datetime.datetime):
+        delay = max(0, (recommended - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+    return delay + random.uniform(0, delay * 0.5)
+
+
+# rate limited MetaApi requests shared by every handler in this process
+ORDER_SCHEDULER = OrderScheduler()
+
+
+# MetaApi errors that say nothing about the request itself, only that the server or the broker link did not answer
+TRANSIENT_ERRORS = frozenset(['TimeoutException', 'NotConnectedException', 'NotSynchronizedException', 'InternalException'])
+
+# MetaTrader return codes of a broker that cannot be reached
+TRANSIENT_CODES = frozenset(['TRADE_RETCODE_CONNECTION', 'TRADE_RETCODE_TIMEOUT'])
+
+
+def IsTransient(error: Exception) -> bool:
+    """Checks whether a request failed because MetaApi or the broker did not answer rather than refusing it.
+
+    Arguments:
+        error: error raised by a MetaApi request
+
+    Returns:
+        True if the same request may succeed later
+    """
+
+    return isinstance(error, (asyncio.TimeoutError, ConnectionError)) or type(error).__name__ in TRANSIENT_ERRORS or getattr(error, 'stringCode', None) in TRANSIENT_CODES
+
+async def WaitFor(awaitable, timeout: float, stage: str):
+    """Waits for a MetaApi call with a timeout whose error tells which stage took too long.
+
+    Arguments:
+        awaitable: coroutine or future of the call
+        timeout: seconds to wait, waits forever when 0
+        stage: description of the call for the error message
+
+    Returns:
+        the result of the call
+    """
+
+    try:
+        return await asyncio.wait_for(awaitable, timeout or None)
+    except asyncio.TimeoutError:
+        raise asyncio.TimeoutError(f'{stage} took longer than {timeout:g} seconds') from None
+
+
+class CircuitOpenError(ConnectionError):
+    """Raised instead of sending a request while the circuit breaker of its account is open."""
+
+
+class CircuitBreaker:
+    """Fails the requests of an account right away while MetaApi or the broker link is down.
+
+    After `threshold` transient failures in a row the breaker opens and every request fails immediately. Once
+    `reset_timeout` seconds have passed, one trial request is let through: if it succeeds the breaker closes,
+    if it fails the breaker stays open for another `reset_timeout` seconds.
+    """
+
+    def __init__(self, threshold: int = CIRCUIT_FAILURE_THRESHOLD, reset_timeout: float = CIRCUIT_RESET_TIMEOUT):
+        """Creates a closed breaker.
+
+        Arguments:
+            threshold: transient failures in a row that open the breaker
+            reset_timeout: seconds the breaker stays open before a trial request
+        """
+
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+
+        # monotonic time the breaker opened or the last trial request started, None while closed
+        self.opened_at = None
+
+    def check(self, account_id: str) -> None:
+        """Raises while the breaker is open, lets the request through otherwise.
+
+        Arguments:
+            account_id: MetaApi account id, named in the error
+        """
+
+        if self.opened_at is None:
+            return
+
+        remaining = self.opened_at + self.reset_timeout - time.monotonic()
+
+        if remaining > 0:
+            raise CircuitOpenError(f'MetaApi is not reachable for account {account_id}, requests fail right away for another {remaining:.0f} seconds')
+
+        # lets this request through as the trial, the others keep failing until it returns
+        self.opened_at = time.monotonic()
+
+    def succeeded(self) -> None:
+        """Closes the breaker after MetaApi answered."""
+
+        if self.opened_at is not None:
+            logger.info('MetaApi answers again, closing the circuit breaker')
+
+        self.failures = 0
+        self.opened_at = None
+
+    def failed(self, account_id: str) -> None:
+        """Counts a transient failure and opens the breaker once there were too many in a row.
+
+        Arguments:
+            account_id: MetaApi account id, named in the log
+        """
+
+        self.failures += 1
+
+        if self.failures >= self.threshold:
+            if self.opened_at is None:
+                logger.warning('%s transient failures in a row on account %s, opening the circuit breaker', self.failures, account_id)
+
+            self.opened_at = time.monotonic()
+
+
+class RequestGuard:
+    """Puts stage timeouts, a circuit breaker per account, retries and hedging around MetaApi requests.
+
+    Requests still go through ORDER_SCHEDULER for rate limiting. Informational requests are idempotent, so one
+    that fails with a transient error is retried with backoff, and one that takes longer than `hedge_delay` is
+    sent a second time, on the connection of the account's replica when it has one, and the first answer wins.
+    Orders are sent exactly once. Every transient failure counts against the circuit breaker of the account.
+    """
+
+    def __init__(self, timeouts: dict = STAGE_TIMEOUTS, max_retries: int = MAX_READ_RETRIES, hedge_delay: float = HEDGE_DELAY):
+        """Creates the guard.
+
+        Arguments:
+            timeouts: seconds an informational request and an order may take, keyed by endpoint
+            max_retries: retries of an informational request after transient failures
+            hedge_delay: seconds after which a slow informational request is hedged, 0 never hedges
+        """
+
+        self.timeouts = timeouts
+        self.max_retries = max_retries
+        self.hedge_delay = hedge_delay
+
+        # circuit breakers and replica account ids keyed by account id
+        self.breakers = {}
+        self.replicas = {}
+
+    def breaker(self, account_id: str) -> CircuitBreaker:
+        """Returns the circuit breaker of an account.
+
+        Arguments:
+            account_id: MetaApi account id
+
+        Returns:
+            the circuit breaker
+        """
+
+        breaker = self.breakers.get(account_id)
+
+        if breaker is None:
+            breaker = self.breakers[account_id] = CircuitBreaker()
+
+        return breaker
+
+    async def read(self, account_id: str, connection, method: str, *arguments, priority: int = PRIORITY_INFORMATION):
+        """Sends an informational request, retrying transient failures and hedging slow attempts.
+
+        Arguments:
+            account_id: MetaApi account id
+            connection: synchronized RPC connection to the account
+            method: name of the connection method, e.g. 'get_account_information'
+            arguments: positional arguments of the method
+            priority: priority of the request in ORDER_SCHEDULER
+
+        Returns:
+            the result of the request
+        """
+
+        breaker = self.breaker(account_id)
+        attempt = 0
+
+        while True:
+            breaker.check(account_id)
+
+            try:
+                result = await self._hedge(account_id, connection, method, arguments, priority)
+
+            except Exception as error:
+                if not IsTransient(error):
+                    breaker.succeeded()
+                    raise
+
+                breaker.failed(account_id)
+                attempt += 1
+
+                if attempt > self.max_retries:
+                    raise
+
+                delay = RetryDelay(error, attempt)
+                logger.warning('%s on account %s failed: %s, retrying in %.1f seconds', method, account_id, error or type(error).__name__, delay)
+                await asyncio.sleep(delay)
+
+                continue
+
+            breaker.succeeded()
+
+            return result
+
+    async def write(self, account_id: str, connection, method: str, *arguments, priority: int = PRIORITY_MARKET):
+        """Sends an order or a modification once, failing fast while the account's circuit breaker is open.
+
+        Arguments:
+            account_id: MetaApi account id
+            connection: synchronized RPC connection to the account
+            method: name of the connection method, e.g. 'create_market_buy_order'
+            arguments: positional arguments of the method
+            priority: priority of the request in ORDER_SCHEDULER
+
+        Returns:
+            the result of the request
+        """
+
+        breaker = self.breaker(account_id)
+        breaker.check(account_id)
+
+        try:
+            # a request that is still queued when the timeout expires is dropped and never reaches the broker
+            result = await asyncio.wait_for(ORDER_SCHEDULER.call(account_id, 'trade', priority, getattr(connection, method), *arguments), self.timeouts['trade'] or None)
+
+        except asyncio.TimeoutError:
+            breaker.failed(account_id)
+            raise asyncio.TimeoutError(f"{method} got no answer within {self.timeouts['trade']:g} seconds, check the terminal before sending it again") from None
+
+        except Exception as error:
+            if IsTransient(error):
+                breaker.failed(account_id)
+            else:
+                breaker.succeeded()
+
+            raise
+
+        breaker.succeeded()
+
+        return result
+
+    async def _attempt(self, account_id: str, connection, method: str, arguments: tuple, priority: int):
+        """Sends one attempt of an informational request with the stage timeout.
+
+        Arguments:
+            account_id: MetaApi account id that the request counts against
+            connection: synchronized RPC connection to the account
+            method: name of the connection method
+            arguments: positional arguments of the method
+            priority: priority of the request in ORDER_SCHEDULER
+
+        Returns:
+            the result of the request
+        """
+
+        return await WaitFor(ORDER_SCHEDULER.call(account_id, 'information', priority, getattr(connection, method), *arguments), self.timeouts['information'], method)
+
+    async def _hedge(self, account_id: str, connection, method: str, arguments: tuple, priority: int):
+        """Sends an informational request and a second one if the first is slow, returning the first answer.
+
+        Arguments:
+            account_id: MetaApi account id
+            connection: synchronized RPC connection to the account
+            method: name of the connection method
+            arguments: positional arguments of the method
+            priority: priority of the request in ORDER_SCHEDULER
+
+        Returns:
+            the result of the attempt that answered first
+        """
+
+        loop = asyncio.get_running_loop()
+        attempts = {loop.create_task(self._attempt(account_id, connection, method, arguments, priority))}
+
+        try:
+            done, _ = await asyncio.wait(attempts, timeout=self.hedge_delay or None)
+
+            # hedges on the replica when it is connected, on another request of the same connection otherwise
+            if not done:
+                replicaId = self.replicas.get(account_id)
+                replica = CONNECTION_MANAGER.connections.get(replicaId)
+
+                if replica is not None:
+                    attempts.add(loop.create_task(self._attempt(replicaId, replica, method, arguments, priority)))
+                else:
+                    attempts.add(loop.create_task(self._attempt(account_id, connection, method, arguments, priority)))
+
+                logger.debug('%s on account %s is slow, hedging it', method, account_id)
+
+            errors = []
+
+            while attempts:
+                done, attempts = await asyncio.wait(attempts, return_when=asyncio.FIRST_COMPLETED)
+
+                for attempt in done:
+                    if attempt.exception() is None:
+                        return attempt.result()
+
+                    errors.append(attempt.exception())
+
+            raise errors[0]
+
+        finally:
+            for attempt in attempts:
+                attempt.cancel()
+
+
+# timeouts, circuit breakers, retries and hedging of MetaApi requests shared by every handler in this process
+REQUEST_GUARD = RequestGuard()
+
+
+# Helper Functions
+def LoadAccounts(path: str) -> list:
+    """Loads the registry of MetaTrader accounts that signals are copied to.
+
+    The file holds a JSON list of objects with the keys of AccountSettings, for example
+    [{"AccountId": "...", "Name": "Main", "RiskFactor": 0.02, "Symbols": {"XAUUSD": "GOLD"}, "MinLot": 0.01, "MaxLot": 5}].
+    "Replica" is the MetaApi id of a replica of the account in another region, slow reads are hedged on it.
+
+    Arguments:
+        path: JSON file with the account registry, None to use ACCOUNT_ID alone
+
+    Returns:
+        a list of account settings
+    """
+
+    if not path:
+        return [{'AccountId': ACCOUNT_ID, 'Name': 'Default', 'RiskFactor': DEFAULT_RISK_FACTOR}]
+
+    with open(path) as file:
+        accounts = json.load(file)
+
+    for count, account in enumerate(accounts):
+        account.setdefault('Name', f'Account {count + 1}')
+        account.setdefault('RiskFactor', DEFAULT_RISK_FACTOR)
+
+    return accounts
+
+def MapBrokerSymbols(brokerSymbols: list, aliases: dict = None) -> dict:
+    """Matches every symbol in SYMBOLS with the name the broker uses for it, e.g. 'EURUSD.m' or 'EURUSDpro'.
+
+    Arguments:
+        brokerSymbols: symbols offered by the broker
+        aliases: explicit broker symbols for symbols whose name cannot be guessed, e.g. {'XAUUSD': 'GOLD'}
+
+    Returns:
+        a dictionary from symbols in SYMBOLS to broker symbols
+    """
+
+    mapping = dict(aliases or {})
+
+    for brokerSymbol in sorted(brokerSymbols, key=len):
+        symbol = brokerSymbol[:6].upper()
+
+        # keeps the shortest broker name, which is the exact match when the broker has one
+        if symbol in SYMBOL_SET and symbol not in mapping:
+            mapping[symbol] = brokerSymbol
+
+    return mapping
+
+def GetPipSize(symbol: str, specification: dict, entry: float) -> float:
+    """Returns the size of one pip for a symbol.
+
+    Arguments:
+        symbol: symbol from SYMBOLS
+        specification: broker symbol specification, may be None
+        entry: entry price, used only when there is no specification
+
+    Returns:
+        the price difference of one pip
+    """
+
+    if symbol in PIP_SIZE_OVERRIDES:
+        return PIP_SIZE_OVERRIDES[symbol]
+
+    if specification:
+        if specification.get('pipSize'):
+            return specification['pipSize']
+
+        # brokers quoting an extra fractional digit have ten points per pip
+        if specification.get('point'):
+            return specification['point'] * 10 if specification.get('digits') in (3, 5) else specification['point']
+
+    # guesses from the price when the broker specification is not available
+    return 0.01 if entry >= 10 else 0.0001
+
+def GetPipValue(specification: dict, pipSize: float, entry: float, currency: str, price: dict = None) -> float:
+    """Returns the value of one pip for one lot in the account currency.
+
+    Arguments:
+        specification: broker symbol specification, may be None
+        pipSize: size of one pip
+        entry: entry price of the trade
+        currency: account currency
+        price: current symbol price from MetaApi, used for symbols quoted in a third currency
+
+    Returns:
+        the value of one pip for one lot
+    """
+
+    if not specification:
+        return 10
+
+    pipValue = specification['contractSize'] * pipSize
+
+    # converts the pip value from the profit currency of the symbol to the account currency
+    if specification.get('profitCurrency') == currency:
+        return pipValue
+
+    if specification.get('baseCurrency') == currency:
+        return pipValue / entry
+
+    if price and price.get('lossTickValue') and specification.get('tickSize'):
+        return price['lossTickValue'] * pipSize / specification['tickSize']
+
+    logger.warning('No conversion rate from %s to %s, using the pip value in %s', specification.get('profitCurrency'), currency, specification.get('profitCurrency'))
+
+    return pipValue
+
+def GetPositionSize(specification: dict, balance: float, riskFactor: float, stopLossPips: int, pipValue: float, legs: int = 1, minLot: float = None, maxLot: float = None) -> float:
+    """Calculates the lot size that risks the risk factor of the balance at the stop loss.
+
+    Arguments:
+        specification: broker symbol specification, may be None
+        balance: current balance of the MetaTrader account
+        riskFactor: share of the balance to risk
+        stopLossPips: the difference in pips from stop loss price to entry price
+        pipValue: value of one pip for one lot
+        legs: number of take profit legs the position is split into
+        minLot: smallest lot size of a leg allowed by the account settings
+        maxLot: largest lot size of a leg allowed by the account settings
+
+    Returns:
+        the position size in lots, a multiple of the broker's volume step for every leg
+    """
+
+    minVolume = specification['minVolume'] if specification else 0.01
+    maxVolume = specification['maxVolume'] if specification else math.inf
+    volumeStep = specification['volumeStep'] if specification else 0.01
+
+    # narrows the broker's limits to the limits of the account
+    minVolume = max(minVolume, minLot or 0)
+    maxVolume = min(maxVolume, maxLot or math.inf)
+
+    if stopLossPips <= 0 or pipValue <= 0:
+        return round(minVolume * legs, 8)
+
+    # rounds every leg down to the volume step so that the legs stay within the risk
+    legVolume = balance * riskFactor / (stopLossPips * pipValue) / legs
+    legVolume = math.floor(legVolume / volumeStep + 1e-9) * volumeStep
+    legVolume = min(max(legVolume, minVolume), maxVolume)
+
+    return round(legVolume * legs, 8)
+
+def SizeTrade(trade: Trade, balance: float, specification: dict = None, currency: str = None, price: dict = None, account: AccountSettings = None) -> Trade:
+    """Calculates the pip distances, pip value and position size of a trade whose entry is known.
+
+    Arguments:
+        trade: trade signal information
+        balance: current balance of the MetaTrader account
+        specification: broker symbol specification of the traded symbol
+        currency: account currency
+        price: current symbol price from MetaApi, if it was fetched
+        account: settings of the account the trade is sized for
+
+    Returns:
+        a copy of the trade with pip size, pip value, stop loss in pips, position size and lots per leg
+    """
+
+    account = account or {}
+
+    # calculates the stop loss in pips
+    multiplier = GetPipSize(trade.symbol, specification, trade.entry)
+    stopLossPips = abs(round((trade.stop_loss - trade.entry) / multiplier))
+
+    # calculates the position size from the risk factor and the value of a pip
+    pipValue = GetPipValue(specification, multiplier, trade.entry, currency, price)
+    positionSize = GetPositionSize(specification, balance, trade.risk_factor, stopLossPips, pipValue, len(trade.take_profits), account.get('MinLot'), account.get('MaxLot'))
+
+    return dataclasses.replace(trade, pip_size=multiplier, pip_value=pipValue, position_size=positionSize, leg_volume=round(positionSize / len(trade.take_profits), 8), stop_loss_pips=stopLossPips)
+
+def GetTradeInformation(trade: Trade, balance: float, specification: dict = None, currency: str = None, price: dict = None, account: AccountSettings = None) -> Tuple[Trade, PrettyTable]:
+    """Calculates information from given trade including stop loss and take profit in pips, position size, and potential loss/profit.
+
+    Arguments:
+        trade: trade signal information
+        balance: current balance of the MetaTrader account
+        specification: broker symbol specification of the traded symbol
+        currency: account currency
+        price: current symbol price from MetaApi, if it was fetched
+        account: settings of the account the trade is sized for
+
+    Returns:
+        the sized trade and a Pretty Table object that contains trade information
+    """
+
+    trade = SizeTrade(trade, balance, specification, currency, price, account)
+
+    # creates table with trade information
+    return trade, CreateTable(trade, balance, trade.stop_loss_pips, trade.take_profit_pips)
+
+def CreateTable(trade: Trade, balance: float, stopLossPips: int, takeProfitPips: int) -> PrettyTable:
+    """Creates PrettyTable object to display trade information to user.
+
+    Arguments:
+        trade: sized trade signal information
+        balance: current balance of the MetaTrader account
+        stopLossPips: the difference in pips from stop loss price to entry price
+
+    Returns:
+        a Pretty Table object that contains trade information
+    """
+
+    # creates prettytable object
+    table = PrettyTable()
+    
+    table.title = "Trade Information"
+    table.field_names = ["Key", "Value"]
+    table.align["Key"] = "l"  
+    table.align["Value"] = "l" 
+
+    table.add_row([trade.order_type.value, trade.symbol])
+    table.add_row(['Entry\n', trade.entry])
+
+    table.add_row(['Stop Loss', '{} pips'.format(stopLossPips)])
+
+    for count, takeProfit in enumerate(takeProfitPips):
+        table.add_row([f'TP {count + 1}', f'{takeProfit} pips'])
+
+    table.add_row(['\nRisk Factor', '\n{:,.0f} %'.format(trade.risk_factor * 100)])
+    table.add_row(['Position Size', trade.position_size])
+    
+    table.add_row(['\nCurrent Balance', '\n$ {:,.2f}'.format(balance)])
+    table.add_row(['Potential Loss', '$ {:,.2f}'.format(round(trade.position_size * trade.pip_value * stopLossPips, 2))])
+
+    # total potential profit from trade
+    totalProfit = 0
+
+    for count, takeProfit in enumerate(takeProfitPips):
+        profit = round((trade.position_size * trade.pip_value * (1 / len(takeProfitPips))) * takeProfit, 2)
+        table.add_row([f'TP {count + 1} Profit', '$ {:,.2f}'.format(profit)])
+        
+        # sums potential profit from each take profit target
+        totalProfit += profit
+
+    table.add_row(['\nTotal Profit', '\n$ {:,.2f}'.format(totalProfit)])
+
+    return table
+
+async def SubmitOrderLeg(createOrder, arguments: tuple, takeProfit: float, volume: float, marketExecution: bool) -> dict:
+    """Submits the order for a single take profit leg and records its outcome instead of raising.
+
+    Arguments:
+        createOrder: order method of the MetaApi connection
+        arguments: positional arguments for the order method
+        takeProfit: take profit price of this leg
+        volume: lot size of this leg
+        marketExecution: whether the order is executed at market or placed as a pending order
+
+    Returns:
+        a dictionary that describes the outcome and latency of the leg
+    """
+
+    leg = {'TP': takeProfit, 'Volume': volume, 'Status': 'Rejected', 'Code': None, 'OrderId': None, 'PositionId': None, 'Error': None}
+    start = time.perf_counter()
+
+    try:
+        result = await createOrder(*arguments)
+
+        leg['Status'] = 'Filled' if marketExecution else 'Placed'
+        leg['Code'] = result.get('stringCode')
+        leg['OrderId'] = result.get('orderId')
+        leg['PositionId'] = result.get('positionId')
+
+    except Exception as error:
+        leg['Code'] = getattr(error, 'stringCode', None)
+        leg['Error'] = str(error)
+
+    leg['Latency'] = time.perf_counter() - start
+    METRICS.observe('order_leg', leg['Latency'], arguments[0])
+
+    return leg
+
+async def SubmitOrders(connection, trade: Trade, account_id: str) -> dict:
+    """Submits the orders for all take profit levels of a trade at the same time through ORDER_SCHEDULER.
+
+    Arguments:
+        connection: synchronized RPC connection to the MetaTrader account
+        trade: sized trade signal information
+        account_id: MetaApi account id, selects the rate limits the orders count against
+
+    Returns:
+        a report with the outcome of every leg and the number of accepted and rejected legs
+    """
+
+    volume = trade.leg_volume
+    symbol = trade.broker_symbol or trade.symbol
+    marketExecution = trade.market
+
+    # market orders jump the queue of the account ahead of pending orders and informational requests
+    createOrder = functools.partial(REQUEST_GUARD.write, account_id, connection, ORDER_METHODS[trade.order_type], priority=PRIORITY_MARKET if marketExecution else PRIORITY_PENDING)
+
+    legs = []
+
+    for takeProfit in trade.take_profits:
+        # market executions have no open price argument
+        if(marketExecution):
+            arguments = (symbol, volume, trade.stop_loss, takeProfit)
+        else:
+            arguments = (symbol, volume, trade.entry, trade.stop_loss, takeProfit)
+
+        legs.append(SubmitOrderLeg(createOrder, arguments, takeProfit, volume, marketExecution))
+
+    results = await asyncio.gather(*legs)
+    rejected = sum(1 for leg in results if leg['Status'] == 'Rejected')
+
+    return {'Legs': list(results), 'Accepted': len(results) - rejected, 'Rejected': rejected}
+
+def CreateOrderReport(report: dict) -> PrettyTable:
+    """Creates PrettyTable object to display the outcome of every order leg to user.
+
+    Arguments:
+        report: report returned by SubmitOrders
+
+    Returns:
+        a Pretty Table object that contains the status and latency of each leg
+    """
+
+    table = PrettyTable()
+
+    table.title = "Order Report"
+    table.field_names = ["Leg", "Status", "Latency"]
+    table.align["Leg"] = "l"
+    table.align["Status"] = "l"
+    table.align["Latency"] = "r"
+
+    for count, leg in enumerate(report['Legs']):
+        table.add_row([f'TP {count + 1}', leg['Status'], '{:,.0f} ms'.format(leg['Latency'] * 1000)])
+
+    return table
+
+# Connection Management
+class ConnectionManager:
+    """Keeps one synchronized MetaApi RPC connection per account alive for the whole process.
+
+    The connections live on a single background event loop. Telegram handlers run on the dispatcher's worker
+    threads, so they hand their coroutines to that loop with submit() or run() instead of starting a new one.
+    """
+
+    def __init__(self, token: str, health_check_interval: float = HEALTH_CHECK_INTERVAL, max_reconnect_delay: float = MAX_RECONNECT_DELAY, idle_timeout: float = CONNECTION_IDLE_TIMEOUT):
+        """Creates the manager without connecting to anything yet.
+
+        Arguments:
+            token: MetaApi API token
+            health_check_interval: seconds between health checks of the open connections
+            max_reconnect_delay: upper bound in seconds for the backoff between reconnection attempts
+            idle_timeout: seconds without use after which a connection is closed, 0 never closes them
+        """
+
+        self.token = token
+        self.health_check_interval = health_check_interval
+        self.max_reconnect_delay = max_reconnect_delay
+        self.idle_timeout = idle_timeout
+
+        self.loop = asyncio.new_event_loop()
+        self.api = None
+
+        # MetaTrader accounts and their synchronized RPC connections keyed by account id
+        self.accounts = {}
+        self.connections = {}
+
+        # monotonic time each account's connection was last asked for
+        self.last_used = {}
+
+        self._locks = {}
+        self._reconnecting = set()
+        self._thread = None
+
+    def start(self) -> None:
+        """Starts the background event loop and the periodic health check."""
+
+        if self._thread is not None:
+            return
+
+        self._thread = threading.Thread(target=self._run_loop, name='metaapi-loop', daemon=True)
+        self._thread.start()
+
+        self.submit(self._health_check())
+
+    def _run_loop(self) -> None:
+        """Runs the manager's event loop forever on the background thread."""
+
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coroutine) -> concurrent.futures.Future:
+        """Schedules a coroutine on the manager's event loop from any thread.
+
+        Arguments:
+            coroutine: coroutine to run on the event loop
+
+        Returns:
+            a future that resolves with the result of the coroutine
+        """
+
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def run(self, coroutine, timeout: float = None):
+        """Runs a coroutine on the manager's event loop and waits for its result on the calling thread.
+
+        Arguments:
+            coroutine: coroutine to run on the event loop
+            timeout: seconds to wait for the result, waits forever when None
+
+        Returns:
+            the result of the coroutine
+        """
+
+        return self.submit(coroutine).result(timeout)
+
+    async def get_connection(self, account_id: str):
+        """Returns the synchronized RPC connection of an account, connecting first if there is none yet.
+
+        Arguments:
+            account_id: MetaApi account id
+
+        Returns:
+            a synchronized RPC connection to the MetaTrader account
+        """
+
+        self.last_used[account_id] = time.monotonic()
+        connection = self.connections.get(account_id)
+
+        if connection is not None:
+            return connection
+
+        # only one coroutine connects a given account, the others wait and reuse its connection
+        lock = self._locks.setdefault(account_id, asyncio.Lock())
+
+        async with lock:
+            if account_id not in self.connections:
+                self.connections[account_id] = await self._connect(account_id)
+
+        return self.connections[account_id]
+
+    async def _connect(self, account_id: str):
+        """Deploys the account if needed, then opens and synchronizes an RPC connection to it.
+
+        Arguments:
+            account_id: MetaApi account id
+
+        Returns:
+            a synchronized RPC connection to the MetaTrader account
+        """
+
+        # creates connection to MetaAPI once for the whole process
+        if self.api is None:
+            self.api = MetaApi(self.token)
+
+        account = await WaitFor(self.api.metatrader_account_api.get_account(account_id), STAGE_TIMEOUTS['information'], f'Finding account {account_id}')
+
+        await WaitFor(self._deploy(account), STAGE_TIMEOUTS['connect'], f'Connecting account {account_id} to the broker')
+
+        # connect to MetaApi API
+        connection = account.get_rpc_connection()
+
+        try:
+            # wait until terminal state synchronized to the local state
+            await WaitFor(self._synchronize(connection), STAGE_TIMEOUTS['synchronize'], f'Synchronizing account {account_id}')
+
+        except Exception:
+            with contextlib.suppress(Exception):
+                await connection.close()
+
+            raise
+
+        logger.info('Connection to account %s is synchronized', account_id)
+        self.accounts[account_id] = account
+
+        return connection
+
+    @staticmethod
+    async def _deploy(account) -> None:
+        """Deploys the account if needed and waits until the API server is connected to the broker.
+
+        Arguments:
+            account: MetaApi account
+        """
+
+        initial_state = account.state
+        deployed_states = ['DEPLOYING', 'DEPLOYED']
+
+        if initial_state not in deployed_states:
+            #  wait until account is deployed and connected to broker
+            logger.info('Deploying account %s', account.id)
+            await account.deploy()
+
+        logger.info('Waiting for API server to connect to broker ...')
+        await account.wait_connected()
+
+    @staticmethod
+    async def _synchronize(connection) -> None:
+        """Opens an RPC connection and waits until the terminal state is synchronized.
+
+        Arguments:
+            connection: RPC connection of the account
+        """
+
+        await connection.connect()
+
+        logger.info('Waiting for SDK to synchronize to terminal state ...')
+        await connection.wait_synchronized()
+
+    async def reconnect(self, account_id: str):
+        """Drops the connection of an account and reconnects it, backing off exponentially between failures.
+
+        Arguments:
+            account_id: MetaApi account id
+
+        Returns:
+            the new synchronized RPC connection
+        """
+
+        await self.disconnect(account_id)
+
+        delay = 1
+
+        while True:
+            try:
+                return await self.get_connection(account_id)
+
+            except Exception as error:
+                logger.error('Reconnecting account %s failed: %s, retrying in %s seconds', account_id, error, delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+
+    async def _reconnect_in_background(self, account_id: str) -> None:
+        """Reconnects an account unless a reconnection for it is already running.
+
+        Arguments:
+            account_id: MetaApi account id
+        """
+
+        if account_id in self._reconnecting:
+            return
+
+        self._reconnecting.add(account_id)
+
+        try:
+            await self.reconnect(account_id)
+        finally:
+            self._reconnecting.discard(account_id)
+
+    async def _health_check(self) -> None:
+        """Periodically pings every open connection, reconnects the ones that do not answer and closes idle ones."""
+
+        while True:
+            await asyncio.sleep(self.health_check_interval)
+
+            for account_id, connection in list(self.connections.items()):
+                # closes connections nobody used for a while, the next signal or pre-warm opens them again
+                if self.idle_timeout and time.monotonic() - self.last_used.get(account_id, 0) > self.idle_timeout:
+                    logger.info('Closing idle connection to account %s', account_id)
+                    await self.disconnect(account_id)
+                    continue
+
+                try:
+                    await asyncio.wait_for(connection.get_server_time(), timeout=self.health_check_interval)
+
+                except Exception as error:
+                    logger.warning('Health check failed for account %s: %s', account_id, error)
+                    self.loop.create_task(self._reconnect_in_background(account_id))
+
+    async def disconnect(self, account_id: str) -> None:
+        """Closes the connection of an account if it is open.
+
+        Arguments:
+            account_id: MetaApi account id
+        """
+
+        connection = self.connections.pop(account_id, None)
+
+        if connection is None:
+            return
+
+        try:
+            await connection.close()
+        except Exception as error:
+            logger.warning('Closing connection to account %s failed: %s', account_id, error)
+
+    async def close(self) -> None:
+        """Closes every open connection."""
+
+        for account_id in list(self.connections):
+            await self.disconnect(account_id)
+
+
+# shared MetaApi connections for every handler in this process
+CONNECTION_MANAGER = ConnectionManager(API_KEY)
+
+# accounts that every signal is copied to
+ACCOUNTS = LoadAccounts(ACCOUNTS_FILE)
+
+
+async def PrepareAccount(account: AccountSettings, streamQuotes: bool = False) -> None:
+    """Connects to an account and loads its symbol specifications ahead of the first signal.
+
+    Arguments:
+        account: settings of the account
+        streamQuotes: whether to stream the account's own quotes into QUOTE_CACHE
+    """
+
+    account_id = account['AccountId']
+
+    try:
+        connection = await CONNECTION_MANAGER.get_connection(account_id)
+        specifications = await SYMBOL_CACHE.ensure(account_id, connection, account.get('Symbols'))
+
+        # mirrors the balance, positions and pending orders so signals read them from memory
+        if STREAM_ACCOUNT_STATE:
+            await ACCOUNT_STATES.start(account_id, CONNECTION_MANAGER.accounts[account_id])
+
+        # subscribes to the quotes of every symbol so market orders skip the price request
+        if streamQuotes:
+            await QUOTE_CACHE.start(account_id, CONNECTION_MANAGER.accounts[account_id], [specification['symbol'] for specification in specifications.values()])
+
+        # connects the replica in another region as well, slow reads of the account are hedged on it
+        if account.get('Replica'):
+            REQUEST_GUARD.replicas[account_id] = account['Replica']
+            await CONNECTION_MANAGER.get_connection(account['Replica'])
+
+    except Exception as error:
+        logger.error('Preparing account %s failed: %s', account['Name'], error)
+
+    return
+
+async def PrepareAccounts(accounts: list = None) -> None:
+    """Prepares accounts at the same time, each streaming its own quotes when STREAM_QUOTES is set.
+
+    Arguments:
+        accounts: settings of the accounts, every registered account when not given
+    """
+
+    await asyncio.gather(*[PrepareAccount(account, STREAM_QUOTES) for account in (ACCOUNTS if accounts is None else accounts)])
+
+    return
+
+
+class Prewarmer:
+    """Warms the connections and account snapshots of every account while the user is still typing a signal.
+
+    /trade and /calculate start the warm-up, and ExecuteOnAccount later attaches to the task that is already
+    running instead of asking for the account information again. Snapshots that nobody uses expire on a timer
+    of the event loop, which also cancels warm-ups that are still running.
+    """
+
+    def __init__(self, ttl: float = PREWARM_TTL):
+        """Creates the prewarmer.
+
+        Arguments:
+            ttl: seconds that a pre-warmed snapshot stays usable
+        """
+
+        self.ttl = ttl
+
+        # expiry time and account information task keyed by account id
+        self.snapshots = {}
+
+    def start(self, accounts: list) -> None:
+        """Starts warming the given accounts from any thread.
+
+        Arguments:
+            accounts: settings of the accounts to warm
+        """
+
+        # every worker warms the accounts it owns
+        if WORKER_POOL.active:
+            for account in accounts:
+                WORKER_POOL.send(account['AccountId'], 'prewarm', account)
+
+            return
+
+        CONNECTION_MANAGER.submit(self._start(accounts))
+
+    async def _start(self, accounts: list) -> None:
+        """Creates a warm-up task for every account that has no fresh one yet.
+
+        Arguments:
+            accounts: settings of the accounts to warm
+        """
+
+        loop = asyncio.get_running_loop()
+        now = time.monotonic()
+
+        for account in accounts:
+            if account['AccountId'] in self.snapshots:
+                continue
+
+            task = loop.create_task(self._warm(account))
+            self.snapshots[account['AccountId']] = (now + self.ttl, task)
+
+            loop.call_later(self.ttl, self._expire, account['AccountId'], task)
+
+    async def _warm(self, account: AccountSettings) -> dict:
+        """Connects to an account, loads its symbol specifications and fetches its account information.
+
+        Arguments:
+            account: settings of the account
+
+        Returns:
+            the account information
+        """
+
+        connection = await CONNECTION_MANAGER.get_connection(account['AccountId'])
+        await SYMBOL_CACHE.ensure(account['AccountId'], connection, account.get('Symbols'))
+
+        # the streamed state is newer than anything a request could return
+        information = ACCOUNT_STATES.account_information(account['AccountId'])
+
+        if information is not None:
+            return information
+
+        return await REQUEST_GUARD.read(account['AccountId'], connection, 'get_account_information')
+
+    def _expire(self, account_id: str, task: asyncio.Task) -> None:
+        """Drops a snapshot once its time to live is over, cancelling the warm-up if it is still running.
+
+        Arguments:
+            account_id: MetaApi account id
+            task: warm-up task the timer was set for, a newer snapshot of the account is kept
+        """
+
+        entry = self.snapshots.get(account_id)
+
+        # a snapshot that was already handed to a trade belongs to it
+        if entry is not None and entry[1] is task:
+            del self.snapshots[account_id]
+            task.cancel()
+
+    async def account_information(self, account_id: str, connection) -> dict:
+        """Returns the streamed account information, else the pre-warmed one once, else asks the account for it.
+
+        Arguments:
+            account_id: MetaApi account id
+            connection: synchronized RPC connection to the account
+
+        Returns:
+            the account information
+        """
+
+        information = ACCOUNT_STATES.account_information(account_id)
+
+        if information is not None:
+            return information
+
+        entry = self.snapshots.pop(account_id, None)
+
+        if entry is not None and entry[0] > time.monotonic():
+            try:
+                return await entry[1]
+            except Exception as error:
+                logger.warning('Pre-warm of account %s failed: %s', account_id, error)
+
+        elif entry is not None:
+            entry[1].cancel()
+
+        return await REQUEST_GUARD.read(account_id, connection, 'get_account_information')
+
+
+# pre-warmed account snapshots shared by every handler in this process
+PREWARMER = Prewarmer()
+
+
+# Position Management
+@dataclasses.dataclass(eq=False, slots=True)
+class PositionGroup:
+    """Legs of one trade on one account that are managed together once the first take profit is hit."""
+
+    account_id: str
+    symbol: str
+    side: Side
+    entry: float
+    stop_loss: float
+    pip_size: float
+    digits: int
+    first_take_profit: float
+
+    # take profit of every open leg keyed by its position id
+    legs: dict
+
+    # set once the first take profit was hit, trailing groups also get their distance and a new version per move
+    secured: bool = False
+    trail_distance: float = None
+    version: int = 0
+
+
+class PositionManager:
+    """Moves the stop loss of the remaining legs of a trade to breakeven, trails it or closes the legs once the
+    first take profit is hit.
+
+    Groups are indexed by account and position id for deals, and trailing groups by account and symbol in a
+    heap ordered by the price at which their stop loss moves next. A price update therefore only touches the
+    groups whose stop loss actually moves, no matter how many positions are open.
+    """
+
+    def __init__(self, mode: str = POSITION_MANAGEMENT, trailing_pips: float = TRAILING_STOP_PIPS, step_pips: float = TRAILING_STEP_PIPS):
+        """Creates a manager without groups.
+
+        Arguments:
+            mode: breakeven, trail, close or off
+            trailing_pips: distance in pips that the stop loss trails the price at, 0 for the first take profit's
+            step_pips: pips the price has to move before the stop loss is modified again
+        """
+
+        self.mode = mode
+        self.trailing_pips = trailing_pips
+        self.step_pips = step_pips
+
+        # group of every open leg keyed by account and position id
+        self.groups = {}
+
+        # trigger heaps of the trailing buy and sell groups keyed by account and broker symbol
+        self.triggers = {}
+        self.sequence = itertools.count()
+
+    def track(self, account_id: str, trade: Trade, report: dict) -> PositionGroup:
+        """Starts managing the legs of a trade that were entered on an account.
+
+        Arguments:
+            account_id: MetaApi account id
+            trade: trade sized for the account
+            report: report returned by SubmitOrders
+
+        Returns:
+            the group of the legs, or None if there is nothing to manage
+        """
+
+        # pending legs keep the order ticket as their position id once they are filled
+        legs = {leg['PositionId'] or leg['OrderId']: leg['TP'] for leg in report['Legs'] if leg['Status'] != 'Rejected' and (leg['PositionId'] or leg['OrderId'])}
+
+        if self.mode == 'off' or len(legs) < 2:
+            return None
+
+        specification = SYMBOL_CACHE.get(account_id, trade.symbol) or {}
+        firstTakeProfit = min(legs.values(), key=lambda takeProfit: abs(takeProfit - trade.entry))
+        group = PositionGroup(account_id, trade.broker_symbol or trade.symbol, trade.side, trade.entry, trade.stop_loss, trade.pip_size, specification.get('digits', 5), firstTakeProfit, legs)
+
+        for position_id in legs:
+            self.groups[(account_id, position_id)] = group
+
+        return group
+
+    def on_deal(self, account_id: str, deal: dict) -> None:
+        """Forgets closed legs and secures the rest of their group when a leg was closed by its take profit.
+
+        Arguments:
+            account_id: MetaApi account id
+            deal: MetaTrader deal streamed by the account
+        """
+
+        if deal.get('entryType') != 'DEAL_ENTRY_OUT':
+            return
+
+        group = self.groups.pop((account_id, deal.get('positionId')), None)
+
+        if group is None:
+            return
+
+        group.legs.pop(deal['positionId'], None)
+
+        # every other change of the group is pointless once all legs are closed
+        if not group.legs:
+            group.version += 1
+            return
+
+        if deal.get('reason') == 'DEAL_REASON_TP' and not group.secured:
+            self._secure(group)
+
+    def on_prices(self, account_id: str, prices: list) -> None:
+        """Trails the stop loss of the groups whose trigger price was reached.
+
+        Arguments:
+            account_id: MetaApi account id
+            prices: MetaTrader symbol prices streamed by the account
+        """
+
+        for price in prices:
+            heaps = self.triggers.get((account_id, price['symbol']))
+
+            if heaps is None:
+                continue
+
+            buys, sells = heaps
+
+            # buy positions close at the bid, their triggers are the lowest prices first
+            while buys and buys[0][0] <= price['bid']:
+                _, _, group, version = heapq.heappop(buys)
+
+                if version == group.version and group.legs:
+                    self._trail(group, price['bid'] - group.trail_distance)
+
+            # sell positions close at the ask, their triggers are negated so the highest price comes first
+            while sells and -sells[0][0] >= price['ask']:
+                _, _, group, version = heapq.heappop(sells)
+
+                if version == group.version and group.legs:
+                    self._trail(group, price['ask'] + group.trail_distance)
+
+            if not buys and not sells:
+                del self.triggers[(account_id, price['symbol'])]
+
+    def _secure(self, group: PositionGroup) -> None:
+        """Applies the management mode to the remaining legs of a group after its first take profit.
+
+        Arguments:
+            group: group whose first take profit was hit
+        """
+
+        group.secured = True
+
+        if self.mode == 'close':
+            self._close(group)
+            return
+
+        # market legs were filled at the broker's price, not at the price they were sized with
+        state = ACCOUNT_STATES.get(group.account_id)
+        positions = [state.positions.get(position_id) for position_id in group.legs] if state is not None else []
+        openPrices = [position['openPrice'] for position in positions if position and 'openPrice' in position]
+
+        if openPrices:
+            group.entry = statistics.fmean(openPrices)
+
+        asyncio.get_running_loop().create_task(self._breakeven(group, state))
+
+    async def _breakeven(self, group: PositionGroup, state: AccountState) -> None:
+        """Moves the stop loss of a secured group to its entry, or closes its legs if the price is already back there.
+
+        Arguments:
+            group: group whose first take profit was hit
+            state: streamed state of the account, None if it is not live
+        """
+
+        try:
+            connection = await CONNECTION_MANAGER.get_connection(group.account_id)
+            price = await GetSymbolPrice(connection, group.symbol, group.account_id)
+
+        except Exception as error:
+            logger.warning('Price of %s on account %s is not available for the breakeven check: %s', group.symbol, group.account_id, error)
+            price = None
+
+        if not group.legs:
+            return
+
+        # the broker refuses a stop loss on the wrong side of the price, and the legs would give back the first take profit
+        if price is not None and (price['bid'] <= group.entry if group.side is Side.BUY else price['ask'] >= group.entry):
+            logger.info('%s on account %s is back at its entry %s, closing the remaining legs', group.symbol, group.account_id, group.entry)
+            self._close(group)
+            return
+
+        self._move(group, group.entry)
+
+        if self.mode == 'trail':
+            group.trail_distance = self.trailing_pips * group.pip_size if self.trailing_pips else abs(group.first_take_profit - group.entry)
+            self._schedule(group)
+
+            # makes sure the account streams the prices of the symbol while the group trails
+            if state is not None:
+                asyncio.get_running_loop().create_task(self._subscribe(state, group.symbol))
+
+    def prune(self, account_id: str, openIds: set) -> None:
+        """Forgets the legs of an account that are no longer open, e.g. when their deal was missed during a reconnect.
+
+        Arguments:
+            account_id: MetaApi account id
+            openIds: ids of the open positions and pending orders of the account after a synchronization
+        """
+
+        for key, group in list(self.groups.items()):
+            if key[0] != account_id or key[1] in openIds:
+                continue
+
+            del self.groups[key]
+            group.legs.pop(key[1], None)
+
+            # stops trailing a group that has no legs left
+            if not group.legs:
+                group.version += 1
+
+    def _close(self, group: PositionGroup) -> None:
+        """Closes every remaining leg of a group.
+
+        Arguments:
+            group: managed group
+        """
+
+        for position_id in group.legs:
+            asyncio.get_running_loop().create_task(self._request(group.account_id, 'close_position', position_id))
+
+    def _trail(self, group: PositionGroup, stopLoss: float) -> None:
+        """Moves the stop loss of a trailing group and schedules its next move.
+
+        Arguments:
+            group: trailing group
+            stopLoss: new stop loss
+        """
+
+        self._move(group, stopLoss)
+        self._schedule(group)
+
+    def _schedule(self, group: PositionGroup) -> None:
+        """Pushes the price at which the stop loss of a trailing group moves next.
+
+        Arguments:
+            group: trailing group
+        """
+
+        buys, sells = self.triggers.setdefault((group.account_id, group.symbol), ([], []))
+        step = self.step_pips * group.pip_size
+
+        if group.side is Side.BUY:
+            heapq.heappush(buys, (group.stop_loss + group.trail_distance + step, next(self.sequence), group, group.version))
+        else:
+            heapq.heappush(sells, (-(group.stop_loss - group.trail_distance - step), next(self.sequence), group, group.version))
+
+    def _move(self, group: PositionGroup, stopLoss: float) -> None:
+        """Modifies the stop loss of every remaining leg of a group, keeping each leg's take profit.
+
+        Arguments:
+            group: managed group
+            stopLoss: new stop loss
+        """
+
+        group.stop_loss = round(stopLoss, group.digits)
+        group.version += 1
+
+        for position_id, takeProfit in group.legs.items():
+            asyncio.get_running_loop().create_task(self._request(group.account_id, 'modify_position', position_id, group.stop_loss, takeProfit))
+
+    async def _request(self, account_id: str, method: str, *arguments) -> None:
+        """Sends a position request through ORDER_SCHEDULER and logs failures instead of raising.
+
+        Arguments:
+            account_id: MetaApi account id
+            method: position method of the MetaApi connection
+            arguments: positional arguments for the method
+        """
+
+        try:
+            connection = await CONNECTION_MANAGER.get_connection(account_id)
+            await REQUEST_GUARD.write(account_id, connection, method, *arguments)
+            logger.info('%s of position %s on account %s: %s', method, arguments[0], account_id, arguments[1:])
+
+        except Exception as error:
+            logger.warning('%s of position %s on account %s failed: %s', method, arguments[0], account_id, error)
+
+    async def _subscribe(self, state: AccountState, symbol: str) -> None:
+        """Subscribes the streaming connection of an account to the quotes of a symbol.
+
+        Arguments:
+            state: streamed state of the account
+            symbol: broker symbol
+        """
+
+        try:
+            await state.connection.subscribe_to_market_data(symbol, [{'type': 'quotes'}], wait_for_quote=False)
+        except Exception as error:
+            logger.warning('Subscribing to quotes of %s failed: %s', symbol, error)
+
+
+# managed position groups shared by every handler in this process
+POSITION_MANAGER = PositionManager()
+
+# Telegram Messaging
+class MessageQueue:
+    """Sends Telegram replies in the background, in order per chat and within Telegram's flood limits.
+
+    Handlers only queue their replies, so no Telegram request sits in front of order execution. Every chat has
+    one sender task that works through its replies in order. Consecutive status updates of a signal are merged
+    into one message that is edited instead of sending a new one, and a reply refused with retry-after waits for
+    the requested time and is sent again.
+    """
+
+    def __init__(self, rate: float = TELEGRAM_RATE_LIMIT, chat_rate: float = TELEGRAM_CHAT_RATE_LIMIT, burst: int = MAX_MESSAGE_BURST, max_retries: int = MAX_SEND_RETRIES):
+        """Creates the queue without starting anything yet, senders start with the first reply of a chat.
+
+        Arguments:
+            rate: messages per second sent over all chats
+            chat_rate: messages per second sent to one chat
+            burst: messages that one chat can receive at once
+            max_retries: attempts of a message that fails with network errors
+        """
+
+        self.bucket = TokenBucket(rate)
+        self.chat_rate = chat_rate
+        self.burst = burst
+        self.max_retries = max_retries
+
+        # waiting replies, buckets and sender tasks keyed by chat id
+        self.queues = {}
+        self.buckets = {}
+        self.senders = {}
+
+        # the status message last sent to each chat and the message it answers, edited by the next status update
+        self.statuses = {}
+
+    def put(self, update: Update, text: str, status: bool = False, **kwargs) -> None:
+        """Queues a reply, must be called on the event loop of CONNECTION_MANAGER.
+
+        Arguments:
+            update: update from Telegram
+            text: message text
+            status: whether the text is a progress update that may replace the previous status update
+            kwargs: further arguments of reply_text such as parse_mode
+        """
+
+        message = update.effective_message
+        chatId = message.chat_id
+        queue = self.queues.setdefault(chatId, collections.deque())
+
+        # a status update that is still waiting is replaced by the newer one
+        if status and queue and queue[-1]['Status'] and queue[-1]['Message'] is message:
+            queue[-1].update(Text=text, Options=kwargs)
+            return
+
+        queue.append({'Message': message, 'Text': text, 'Options': kwargs, 'Status': status})
+
+        if chatId not in self.senders:
+            self.senders[chatId] = asyncio.get_running_loop().create_task(self._send(chatId))
+
+    async def _send(self, chatId) -> None:
+        """Sends the waiting replies of a chat in order until there are none left.
+
+        Arguments:
+            chatId: id of the chat
+        """
+
+        queue = self.queues[chatId]
+
+        try:
+            while queue:
+                await self._deliver(chatId, queue.popleft())
+        finally:
+            del self.senders[chatId]
+            del self.queues[chatId]
+
+    async def _deliver(self, chatId, reply: dict) -> None:
+        """Sends or edits one message, waiting out flood control and retrying network errors.
+
+        Arguments:
+            chatId: id of the chat
+            reply: queued reply
+        """
+
+        loop = asyncio.get_running_loop()
+        message = reply['Message']
+
+        # edits the last status message while nothing else was sent to the chat after it
+        previous = self.statuses.pop(chatId, (None, None))
+        edited = previous[1] if reply['Status'] and previous[0] is message else None
+
+        sent = None
+        attempt = 0
+
+        while True:
+            await self._wait(chatId)
+
+            try:
+                with METRICS.measure('reply'):
+                    if edited is not None:
+                        sent = await loop.run_in_executor(None, functools.partial(edited.edit_text, reply['Text'], **reply['Options']))
+                    else:
+                        sent = await loop.run_in_executor(None, functools.partial(message.reply_text, reply['Text'], **reply['Options']))
+
+                self.bucket.speed_up()
+                self.buckets[chatId].speed_up()
+                break
+
+            except RetryAfter as error:
+                logger.warning('Telegram asked to wait %s s before messaging chat %s', error.retry_after, chatId)
+                self.bucket.slow_down()
+                self.buckets[chatId].slow_down()
+                await asyncio.sleep(error.retry_after)
+
+            except BadRequest as error:
+                # the status message already shows the text
+                if edited is not None and 'not modified' in str(error).lower():
+                    sent = edited
+                    break
+
+                # the status message was deleted or can no longer be edited, so the update is sent as a new message
+                if edited is not None:
+                    edited = None
+                    continue
+
+                logger.error('Sending message to chat %s failed: %s', chatId, error)
+                return
+
+            except NetworkError as error:
+                attempt += 1
+
+                if attempt >= self.max_retries:
+                    logger.error('Sending message to chat %s failed after %s attempts: %s', chatId, attempt, error)
+                    return
+
+                await asyncio.sleep(min(2 ** attempt, MAX_RECONNECT_DELAY))
+
+            except Exception as error:
+                logger.error('Sending message to chat %s failed: %s', chatId, error)
+                return
+
+        if reply['Status']:
+            self.statuses[chatId] = (message, edited if edited is not None else sent)
+
+    async def _wait(self, chatId) -> None:
+        """Waits until both the shared bucket and the bucket of the chat allow another message.
+
+        Arguments:
+            chatId: id of the chat
+        """
+
+        bucket = self.buckets.setdefault(chatId, TokenBucket(self.chat_rate, self.burst))
+
+        while True:
+            now = time.monotonic()
+            delay = max(self.bucket.delay(now), bucket.delay(now))
+
+            if delay <= 0:
+                break
+
+            await asyncio.sleep(delay)
+
+        self.bucket.take()
+        bucket.take()
+
+    async def close(self, timeout: float = 5) -> None:
+        """Gives the waiting replies a little time to go out before shutting down.
+
+        Arguments:
+            timeout: seconds to wait for the senders
+        """
+
+        if self.senders:
+            await asyncio.wait(list(self.senders.values()), timeout=timeout)
+
+
+# outbound Telegram replies shared by every handler in this process
+MESSAGE_QUEUE = MessageQueue()
+
+
+def SendMessage(update: Update, text: str, status: bool = False, **kwargs) -> None:
+    """Queues a reply from a coroutine on the event loop, it is sent in the background by MESSAGE_QUEUE.
+
+    Arguments:
+        update: update from Telegram
+        text: message text
+        status: whether the text is a progress update that may be merged into the previous status message
+        kwargs: further arguments of reply_text such as parse_mode
+    """
+
+    MESSAGE_QUEUE.put(update, text, status, **kwargs)
+
+async def SendMessages(update: Update, *texts: str, **kwargs) -> None:
+    """Queues several replies in order.
+
+    Arguments:
+        update: update from Telegram
+        texts: message texts
+        kwargs: further arguments of reply_text such as parse_mode
+    """
+
+    for text in texts:
+        SendMessage(update, text, **kwargs)
+
+def Reply(update: Update, *texts: str, **kwargs) -> None:
+    """Queues replies from any thread so that handlers return to the dispatcher right away.
+
+    Arguments:
+        update: update from Telegram
+        texts: message texts, sent in order
+        kwargs: further arguments of reply_text such as parse_mode
+    """
+
+    CONNECTION_MANAGER.submit(SendMessages(update, *texts, **kwargs))
+
+    return
+
+
+async def ExecuteOnAccount(account: AccountSettings, trade: Trade, enterTrade: bool, update: Update = None, accountInformation: dict = None) -> dict:
+    """Sizes a trade for one MetaTrader account and enters it if requested.
+
+    Arguments:
+        account: settings of the account
+        trade: trade signal information, every step of sizing returns a new copy for the account
+        enterTrade: whether to place the orders or only calculate the trade
+        update: update from Telegram, progress messages and tables are sent to it when given
+        accountInformation: account information shared by the trades of a batch, fetched when not given
+
+    Returns:
+        a dictionary with the sized trade, its information table, the order report and any error
+    """
+
+    result = {'Account': account, 'Trade': None, 'Table': None, 'Report': None, 'Error': None}
+    start = time.perf_counter()
+
+    # every account sizes its own copy of the trade with its own risk factor
+    trade = dataclasses.replace(trade, risk_factor=account.get('RiskFactor', trade.risk_factor))
+
+    try:
+        # reuses the long-lived connection, only the first signal after startup waits for synchronization
+        with METRICS.measure('connect', trade.symbol):
+            connection = await CONNECTION_MANAGER.get_connection(account['AccountId'])
+
+        # obtains account information from MetaTrader server
+        with METRICS.measure('account_information', trade.symbol):
+            account_information = accountInformation or await PREWARMER.account_information(account['AccountId'], connection)
+
+        # reads the broker's contract data from the cache, only fetched after startup if nothing was persisted
+        specifications = await SYMBOL_CACHE.ensure(account['AccountId'], connection, account.get('Symbols'))
+        specification = specifications.get(trade.symbol)
+
+        if specification:
+            trade = dataclasses.replace(trade, broker_symbol=specification['symbol'])
+
+        if update is not None:
+            SendMessage(update, "Successfully connected to MetaTrader!\nCalculating trade risk ... 🤔", status=True)
+
+        symbol = trade.broker_symbol or trade.symbol
+
+        # any streamed quote is good enough to convert the pip value of pending orders
+        price = QUOTE_CACHE.get(account['AccountId'], symbol, math.inf)
+
+        # checks if the order is a market execution to get the current price of symbol
+        if(trade.entry is None):
+            price = await GetSymbolPrice(connection, symbol, account['AccountId'])
+
+            # uses bid price if the order type is a buy and ask price if it is a sell
+            trade = dataclasses.replace(trade, entry=float(price['bid'] if trade.side is Side.BUY else price['ask']))
+
+            # the market may have moved through the stop loss or a take profit since the signal was sent
+            error = trade.validate()
+
+            if error:
+                raise Exception(error)
+
+        # produces a table with trade information
+        trade, result['Table'] = GetTradeInformation(trade, account_information['balance'], specification, account_information['currency'], price, account)
+
+        if update is not None:
+            SendMessage(update, f"<pre>{result['Table']}</pre>", parse_mode=ParseMode.HTML)
+
+        # checks if the user has indicated to enter trade
+        if(enterTrade == True):
+
+            # refuses trades that exceed the free margin or the exposure limit of the streamed account state, or a limit of the risk engine
+            with METRICS.measure('risk_check', trade.symbol):
+                error = ACCOUNT_STATES.check(account, trade) or RISK_ENGINE.check(account, trade, account_information['balance'])
+
+            if error:
+                raise Exception(error)
+
+            # refuses market entries while the spread of the quote they are priced at is spiking on this account's broker
+            spread = price['ask'] - price['bid'] if price else None
+
+            if(trade.market and QUOTE_CACHE.is_spread_spiking(account['AccountId'], symbol, spread=spread)):
+                spreadStatistics = QUOTE_CACHE.spread_statistics(account['AccountId'], symbol)
+                raise Exception(f"The spread of {trade.symbol} is spiking on account {account['AccountId']} (current {spreadStatistics['Current'] if spread is None else spread:.5f}, median {spreadStatistics['Median']:.5f})")
+
+            # counts the trade against the limits right away, before a concurrent signal is checked
+            reservation = RISK_ENGINE.reserve(account['AccountId'], trade)
+
+            if update is not None:
+                SendMessage(update, "Entering trade on MetaTrader Account ... 👨🏾‍💻", status=True)
+
+            # sends every take profit leg at once and collects each result separately
+            try:
+                result['Report'] = await SubmitOrders(connection, trade, account['AccountId'])
+            finally:
+                RISK_ENGINE.release(account['AccountId'], reservation, trade, result['Report'])
+
+            # secures the remaining legs once the first take profit is hit
+            POSITION_MANAGER.track(account['AccountId'], trade, result['Report'])
+
+            # prints the result of each leg to console
+            for leg in result['Report']['Legs']:
+                logger.info('%s: TP %s leg %s in %.0f ms: %s', account['Name'], leg['TP'], leg['Status'], leg['Latency'] * 1000, leg['Error'] or leg['Code'])
+
+    except Exception as error:
+        logger.error(f"Error on {account['Name']}: {error}")
+        result['Error'] = str(error)
+
+    result['Trade'] = trade
+    result['Latency'] = time.perf_counter() - start
+
+    return result
+
+async def ExecuteOnAccounts(trade: Trade, enterTrade: bool, update: Update = None) -> list:
+    """Sends a trade to every registered account at the same time, at most MAX_CONCURRENT_ACCOUNTS at once.
+
+    Arguments:
+        trade: trade signal information
+        enterTrade: whether to place the orders or only calculate the trade
+        update: update from Telegram for progress messages, only used with a single account
+
+    Returns:
+        the result of ExecuteOnAccount for every account, in registry order
+    """
+
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_ACCOUNTS)
+
+    async def Execute(account: AccountSettings) -> dict:
+        async with semaphore:
+            if not WORKER_POOL.active:
+                return await ExecuteOnAccount(account, trade, enterTrade, update if len(ACCOUNTS) == 1 else None)
+
+            result = await ExecuteInPool(account, trade, enterTrade)
+
+            # workers do not talk to Telegram, so the table of a single account is sent from here
+            if update is not None and len(ACCOUNTS) == 1 and result['Table'] is not None:
+                SendMessage(update, f"<pre>{result['Table']}</pre>", parse_mode=ParseMode.HTML)
+
+            return result
+
+    return await asyncio.gather(*[Execute(account) for account in ACCOUNTS])
+
+def CreateAccountReport(results: list) -> PrettyTable:
+    """Creates PrettyTable object to display the outcome of a trade on every account to user.
+
+    Arguments:
+        results: results returned by ExecuteOnAccounts
+
+    Returns:
+        a Pretty Table object that contains the lot size, status and latency per account
+    """
+
+    table = PrettyTable()
+
+    table.title = "Account Report"
+    table.field_names = ["Account", "Lots", "Status", "Latency"]
+    table.align["Account"] = "l"
+    table.align["Lots"] = "r"
+    table.align["Status"] = "l"
+    table.align["Latency"] = "r"
+
+    for result in results:
+        table.add_row([result['Account']['Name'], result['Trade'].position_size or '-', AccountStatus(result), '{:,.0f} ms'.format(result['Latency'] * 1000)])
+
+    return table
+
+def AccountStatus(result: dict) -> str:
+    """Summarizes the outcome of a trade on one account.
+
+    Arguments:
+        result: result returned by ExecuteOnAccount
+
+    Returns:
+        'Error', 'Calculated', 'Entered', 'Rejected' or the number of accepted legs of a partial entry
+    """
+
+    report = result['Report']
+
+    if result['Error']:
+        return 'Error'
+    elif report is None:
+        return 'Calculated'
+    elif report['Rejected'] == 0:
+        return 'Entered'
+    elif report['Accepted'] == 0:
+        return 'Rejected'
+
+    return f"Partial {report['Accepted']}/{len(report['Legs'])}"
+
+def CreateBatchTable(results: list) -> PrettyTable:
+    """Creates PrettyTable object to display the combined risk of a batch of trades to user.
+
+    Arguments:
+        results: results returned by ExecuteBatch, one list of account results per trade
+
+    Returns:
+        a Pretty Table object with the lots, risk, potential profit and status of every trade on the first account
+    """
+
+    table = PrettyTable()
+
+    table.title = "Batch Information"
+    table.field_names = ["#", "Trade", "Lots", "Risk", "Profit", "Status"]
+    table.align["Trade"] = "l"
+    table.align["Lots"] = "r"
+    table.align["Risk"] = "r"
+    table.align["Profit"] = "r"
+    table.align["Status"] = "l"
+
+    totalRisk = 0
+    totalProfit = 0
+
+    for count, accountResults in enumerate(results):
+        result = accountResults[0]
+        trade = result['Trade']
+
+        # several accounts count the accounts on which the trade went through
+        if len(accountResults) > 1:
+            status = f"{sum(1 for accountResult in accountResults if AccountStatus(accountResult) in ['Calculated', 'Entered'])}/{len(accountResults)} accounts"
+        else:
+            status = AccountStatus(result)
+
+        if not trade.sized:
+            table.add_row([count + 1, f"{trade.order_type} {trade.symbol}", '-', '-', '-', status])
+            continue
+
+        risk = trade.position_size * trade.pip_value * trade.stop_loss_pips
+        profit = sum(trade.leg_volume * trade.pip_value * takeProfitPips for takeProfitPips in trade.take_profit_pips)
+
+        totalRisk += risk
+        totalProfit += profit
+
+        table.add_row([count + 1, f"{trade.order_type} {trade.symbol}", trade.position_size, '$ {:,.2f}'.format(risk), '$ {:,.2f}'.format(profit), status])
+
+    table.add_row(['', '\nTotal', '', '\n$ {:,.2f}'.format(totalRisk), '\n$ {:,.2f}'.format(totalProfit), ''])
+
+    return table
+
+def CreateHistoryTable(signals: list) -> PrettyTable:
+    """Creates PrettyTable object to display journaled signals to user.
+
+    Arguments:
+        signals: signals returned by SignalJournal.lookup
+
+    Returns:
+        a Pretty Table object that contains the time, order type, lots and outcome of each signal
+    """
+
+    table = PrettyTable()
+
+    table.title = "Signal History"
+    table.field_names = ["Time", "Order", "Lots", "Status"]
+    table.align["Time"] = "l"
+    table.align["Order"] = "l"
+    table.align["Lots"] = "r"
+    table.align["Status"] = "l"
+
+    for entry in signals:
+        results = entry['Results']
+        lots = sum(result['PositionSize'] or 0 for result in results)
+
+        if not results:
+            status = 'No result'
+        elif not entry['Entered']:
+            status = 'Calculated'
+        else:
+            status = f"{sum(result['Accepted'] or 0 for result in results)} legs / {sum(1 for result in results if result['Error'])} errors"
+
+        table.add_row([time.strftime('%m-%d %H:%M', time.gmtime(entry['ReceivedAt'])), entry['OrderType'], '{:,.2f}'.format(lots), status])
+
+    return table
+
+async def ConnectMetaTrader(update: Update, trade: Trade, enterTrade: bool):
+    """Attempts connection to MetaAPI and MetaTrader to place trade on every registered account.
+
+    Arguments:
+        update: update from Telegram
+        trade: trade signal information
+        enterTrade: whether to place the orders or only calculate the trade
+
+    Returns:
+        the result of ExecuteOnAccount for every account
+    """
+
+    results = await ExecuteOnAccounts(trade, enterTrade, update)
+
+    # a single account keeps the detailed replies of the trade information and order report
+    if len(results) == 1:
+        result = results[0]
+        report = result['Report']
+
+        if result['Error']:
+            SendMessage(update, f"There was an issue with the connection 😕\n\nError Message:\n{result['Error']}", status=True)
+            return results
+
+        if report is None:
+            return results
+
+        # collects the error message of every rejected leg
+        errors = '\n'.join(f"TP {count + 1}: {leg['Error']}" for count, leg in enumerate(report['Legs']) if leg['Error'])
+
+        # sends the per leg report to user
+        if(report['Rejected'] == 0):
+            SendMessage(update, "Trade entered successfully! 💰", status=True)
+        elif(report['Accepted'] == 0):
+            SendMessage(update, f"There was an issue 😕\n\nError Message:\n{errors}", status=True)
+        else:
+            SendMessage(update, f"Trade partially entered ⚠️\n\nError Message:\n{errors}", status=True)
+
+        SendMessage(update, f'<pre>{CreateOrderReport(report)}</pre>', parse_mode=ParseMode.HTML)
+
+        return results
+
+    # several accounts share one aggregated reply, with the trade information of the first account as an example
+    example = next((result for result in results if result['Table'] is not None), None)
+
+    if example is not None:
+        SendMessage(update, f"<pre>{example['Table']}</pre>", parse_mode=ParseMode.HTML)
+
+    SendMessage(update, f'<pre>{CreateAccountReport(results)}</pre>', parse_mode=ParseMode.HTML)
+
+    # lists the errors of the accounts that failed
+    errors = '\n'.join(f"{result['Account']['Name']}: {result['Error']}" for result in results if result['Error'])
+
+    if errors:
+        SendMessage(update, f"There was an issue on some accounts 😕\n\nError Message:\n{errors}")
+
+    return results
+
+
+# limits how many signals run on the shared event loop at the same time
+SIGNAL_SEMAPHORE = asyncio.Semaphore(MAX_CONCURRENT_SIGNALS)
+
+
+async def ProcessSignal(update: Update, trade: Trade, enterTrade: bool, notice: str = None, followUp: str = None) -> None:
+    """Runs ConnectMetaTrader for one parsed signal on the shared event loop.
+
+    Arguments:
+        update: update from Telegram
+        trade: trade signal information
+        enterTrade: whether to place the orders or only calculate the trade
+        notice: message sent before connecting, if any
+        followUp: message sent after the trade was processed, if any
+    """
+
+    # the chat is the provider of the signal for the risk engine
+    trade = dataclasses.replace(trade, provider=str(update.effective_message.chat_id))
+
+    # journals the signal before anything can fail, the writer thread commits it off the signal path
+    signalId = JOURNAL.record_signal(trade, enterTrade, update)
+    results = []
+
+    try:
+        if notice:
+            SendMessage(update, notice, status=True)
+
+        # waits for a free slot when MAX_CONCURRENT_SIGNALS signals are already running
+        async with SIGNAL_SEMAPHORE:
+            with METRICS.measure('signal', trade.symbol):
+                results = await ConnectMetaTrader(update, trade, enterTrade)
+
+        JOURNAL.record_results(signalId, results)
+
+        if followUp:
+            SendMessage(update, followUp)
+
+    except Exception as error:
+        logger.error(f'Error: {error}')
+
+    finally:
+        # keeps the duplicate check of an entered signal, a signal that no account accepted may be sent again
+        if enterTrade:
+            DEDUPLICATOR.settle(trade, update, results)
+
+    return
+
+
+async def ExecuteBatch(trades: list, enterTrade: bool) -> list:
+    """Sizes or enters a batch of trades on every registered account, pipelined over each account's connection.
+
+    Every account connects and fetches its account information once for the whole batch, then all trades are
+    sent at the same time and ORDER_SCHEDULER paces the orders.
+
+    Arguments:
+        trades: parsed trades of the batch
+        enterTrade: whether to place the orders or only calculate the trades
+
+    Returns:
+        for every trade, the result of ExecuteOnAccount on every account in registry order
+    """
+
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_ACCOUNTS)
+
+    async def ExecuteAccount(account: AccountSettings) -> list:
+        # the worker that owns the account shares its account information between the trades itself
+        if WORKER_POOL.active:
+            return await asyncio.gather(*[ExecuteInPool(account, trade, enterTrade) for trade in trades])
+
+        async with semaphore:
+            try:
+                connection = await CONNECTION_MANAGER.get_connection(account['AccountId'])
+                accountInformation = await PREWARMER.account_information(account['AccountId'], connection)
+
+            except Exception as error:
+                logger.error(f"Error on {account['Name']}: {error}")
+                return [{'Account': account, 'Trade': trade, 'Table': None, 'Report': None, 'Error': str(error), 'Latency': 0} for trade in trades]
+
+            return await asyncio.gather(*[ExecuteOnAccount(account, trade, enterTrade, accountInformation=accountInformation) for trade in trades])
+
+    accountResults = await asyncio.gather(*[ExecuteAccount(account) for account in ACCOUNTS])
+
+    # regroups the results by trade
+    return [list(results) for results in zip(*accountResults)]
+
+async def ProcessBatch(update: Update, text: str = None, document=None) -> list:
+    """Parses a batch of signals from a message or an uploaded file and shows their combined risk.
+
+    Arguments:
+        update: update from Telegram
+        text: message with the signals
+        document: uploaded signal file, downloaded off the event loop
+
+    Returns:
+        the valid trades to keep for /yes, None if there are none
+    """
+
+    try:
+        if document is not None:
+            loop = asyncio.get_running_loop()
+            file = await loop.run_in_executor(None, document.get_file)
+            text = (await loop.run_in_executor(None, file.download_as_bytearray)).decode('utf-8', errors='replace')
+
+        with METRICS.measure('parse'):
+            trades, invalid = ParseBatch(io.StringIO(text), DEFAULT_RISK_FACTOR)
+
+        if invalid:
+            SendMessage(update, "These signals could not be parsed and were left out 😕\n\n" + '\n'.join(invalid))
+
+        if not trades:
+            SendMessage(update, "There were no valid signals in this batch. Please send them again or use /cancel to cancel this action.")
+            return None
+
+        SendMessage(update, f"{len(trades)} signals parsed! 🥳\nCalculating the combined risk ... ⏰", status=True)
+
+        with METRICS.measure('batch'):
+            results = await ExecuteBatch(trades, False)
+
+        SendMessage(update, f'<pre>{CreateBatchTable(results)}</pre>', parse_mode=ParseMode.HTML)
+
+        # lists the errors of the trades that could not be calculated
+        errors = '\n'.join(f"{count + 1}. {result['Account']['Name']}: {result['Error']}" for count, accountResults in enumerate(results) for result in accountResults if result['Error'])
+
+        if errors:
+            SendMessage(update, f"There was an issue with some trades 😕\n\nError Message:\n{errors}")
+
+        SendMessage(update, f"Would you like to enter these {len(trades)} trades?\nTo enter, select: /yes\nTo decline, select: /no")
+
+        return trades
+
+    except Exception as error:
+        logger.error(f'Error: {error}')
+        SendMessage(update, f"There was an issue with this batch 😕\n\nError Message:\n{error}")
+
+    return None
+
+def StoreBatch(userData: dict, future: concurrent.futures.Future) -> None:
+    """Keeps the trades of a calculated batch in the user data for /yes.
+
+    Runs on a worker of the dispatcher, which journals the user data once it returns, so the batch survives
+    a restart and the user data is never changed on the event loop.
+
+    Arguments:
+        userData: user data of the conversation
+        future: future of ProcessBatch
+    """
+
+    if future.cancelled() or future.exception() is not None or not future.result():
+        return
+
+    userData['batch'] = future.result()
+
+async def EnterBatch(update: Update, trades: list, indices: list) -> None:
+    """Enters a batch of trades on every registered account and sends the combined report.
+
+    Arguments:
+        update: update from Telegram
+        trades: trades of the batch that are not duplicates
+        indices: position of every trade in the calculated batch, as passed to the duplicate check
+    """
+
+    trades = [dataclasses.replace(trade, provider=str(update.effective_message.chat_id)) for trade in trades]
+    signalIds = [JOURNAL.record_signal(trade, True, update) for trade in trades]
+    results = [[] for trade in trades]
+
+    try:
+        SendMessage(update, f"Entering {len(trades)} trades on MetaTrader ... 👨🏾‍💻", status=True)
+
+        async with SIGNAL_SEMAPHORE:
+            with METRICS.measure('batch'):
+                results = await ExecuteBatch(trades, True)
+
+        for signalId, accountResults in zip(signalIds, results):
+            JOURNAL.record_results(signalId, accountResults)
+
+        SendMessage(update, f'<pre>{CreateBatchTable(results)}</pre>', parse_mode=ParseMode.HTML)
+
+        # lists the errors of every rejected leg and failed account
+        errors = '\n'.join(f"{count + 1}. {result['Account']['Name']}: {result['Error'] or ', '.join(leg['Error'] for leg in result['Report']['Legs'] if leg['Error'])}" for count, accountResults in enumerate(results) for result in accountResults if AccountStatus(result) != 'Entered')
+
+        if errors:
+            SendMessage(update, f"There was an issue with some trades 😕\n\nError Message:\n{errors}")
+        else:
+            SendMessage(update, "All trades entered successfully! 💰")
+
+    except Exception as error:
+        logger.error(f'Error: {error}')
+
+    finally:
+        for trade, index, accountResults in zip(trades, indices, results):
+            DEDUPLICATOR.settle(trade, update, accountResults, index)
+
+    return
+
+
+# Handler Functions
+def PlaceTrade(update: Update, context: CallbackContext) -> int:
+    """Parses trade and places on MetaTrader account.   
+    
+    Arguments:
+        update: update from Telegram
+        context: CallbackContext object that stores commonly used objects in handler callbacks
+    """
+
+    notice = None
+
+    # checks if the trade has already been parsed or not
+    if(context.user_data['trade'] == None):
+
+        try: 
+            # parses signal from Telegram message
+            with METRICS.measure('parse'):
+                trade = ParseSignal(update.effective_message.text, DEFAULT_RISK_FACTOR)
+            
+            # checks if there was an issue with parsing the trade
+            if(not(trade)):
+                raise Exception('Invalid Trade')
+
+            # sets the user context trade equal to the parsed trade
+            context.user_data['trade'] = trade
+            notice = "Trade Successfully Parsed! 🥳\nConnecting to MetaTrader ... \n(May take a while) ⏰"
+        
+        except Exception as error:
+            logger.error(f'Error: {error}')
+            errorMessage = f"There was an error parsing this trade 😕\n\nError: {error}\n\nPlease re-enter trade with this format:\n\nBUY/SELL SYMBOL\nEntry \nSL \nTP \n\nOr use the /cancel to command to cancel this action."
+            Reply(update, errorMessage)
+
+            # returns to TRADE state to reattempt trade parsing
+            return TRADE
+    
+    # refuses a signal that was already entered, e.g. a webhook retry, a forwarded copy or a second /yes
+    if(DEDUPLICATOR.check(context.user_data['trade'], update)):
+        logger.warning('Ignoring duplicate signal: %s', context.user_data['trade'])
+        Reply(update, f"This {context.user_data['trade'].order_type} {context.user_data['trade'].symbol} signal was already entered in the last {DEDUP_WINDOW / 60:g} minutes, so it was ignored. 🔁")
+
+        context.user_data['trade'] = None
+
+        return ConversationHandler.END
+
+    # places the trade on the shared event loop without blocking the dispatcher
+    CONNECTION_MANAGER.submit(ProcessSignal(update, context.user_data['trade'], True, notice))
+    
+    # removes trade from user context data
+    context.user_data['trade'] = None
+
+    return ConversationHandler.END
+
+def CalculateTrade(update: Update, context: CallbackContext) -> int:
+    """Parses trade and places on MetaTrader account.   
+    
+    Arguments:
+        update: update from Telegram
+        context: CallbackContext object that stores commonly used objects in handler callbacks
+    """
+
+    notice = None
+
+    # checks if the trade has already been parsed or not
+    if(context.user_data['trade'] == None):
+
+        try: 
+            # parses signal from Telegram message
+            with METRICS.measure('parse'):
+                trade = ParseSignal(update.effective_message.text, DEFAULT_RISK_FACTOR)
+            
+            # checks if there was an issue with parsing the trade
+            if(not(trade)):
+                raise Exception('Invalid Trade')
+
+            # sets the user context trade equal to the parsed trade
+            context.user_data['trade'] = trade
+            notice = "Trade Successfully Parsed! 🥳\nConnecting to MetaTrader ... (May take a while) ⏰"
+        
+        except Exception as error:
+            logger.error(f'Error: {error}')
+            errorMessage = f"There was an error parsing this trade 😕\n\nError: {error}\n\nPlease re-enter trade with this format:\n\nBUY/SELL SYMBOL\nEntry \nSL \nTP \n\nOr use the /cancel to command to cancel this action."
+            Reply(update, errorMessage)
+
+            # returns to CALCULATE to reattempt trade parsing
+            return CALCULATE
+    
+    # calculates trade information on the shared event loop and then asks if user if they would like to enter or decline trade
+    CONNECTION_MANAGER.submit(ProcessSignal(update, context.user_data['trade'], False, notice, "Would you like to enter this trade?\nTo enter, select: /yes\nTo decline, select: /no"))
+
+    return DECISION
+
+def ReceiveBatch(update: Update, context: CallbackContext) -> int:
+    """Receives a message or file with several signals and calculates them together.
+
+    Arguments:
+        update: update from Telegram
+        context: CallbackContext object that stores commonly used objects in handler callbacks
+    """
+
+    document = update.effective_message.document
+
+    if(document != None and document.file_size and document.file_size > MAX_BATCH_FILE_SIZE):
+        Reply(update, f"This file is too large, please send at most {MAX_BATCH_FILE_SIZE // 1024} KB of signals.")
+        return BATCH
+
+    context.user_data['batch'] = None
+
+    # parses and calculates the batch on the shared event loop, the file is downloaded there as well
+    future = CONNECTION_MANAGER.submit(ProcessBatch(update, update.effective_message.text, document))
+
+    # hands the trades back to the dispatcher, which stores and journals them with the rest of the user data
+    future.add_done_callback(lambda future: context.dispatcher.run_async(StoreBatch, context.user_data, future, update=update))
+
+    return BATCH_DECISION
+
+def PlaceBatch(update: Update, context: CallbackContext) -> int:
+    """Enters the calculated batch of trades on every MetaTrader account.
+
+    Arguments:
+        update: update from Telegram
+        context: CallbackContext object that stores commonly used objects in handler callbacks
+    """
+
+    trades = context.user_data.get('batch')
+
+    if(not(trades)):
+        Reply(update, "There is no calculated batch to enter yet. Please wait for the combined risk table or use /cancel to cancel this action.")
+        return BATCH_DECISION
+
+    # leaves out the trades that were already entered
+    duplicates = [DEDUPLICATOR.check(trade, update, count) for count, trade in enumerate(trades)]
+    indices = [count for count, duplicate in enumerate(duplicates) if not duplicate]
+
+    if any(duplicates):
+        Reply(update, f"{sum(duplicates)} of these signals were already entered in the last {DEDUP_WINDOW / 60:g} minutes, so they were ignored. 🔁")
+
+    if indices:
+        CONNECTION_MANAGER.submit(EnterBatch(update, [trades[count] for count in indices], indices))
+
+    # removes the batch from user context data
+    context.user_data['batch'] = None
+
+    return ConversationHandler.END
+
+def unknown_command(update: Update, context: CallbackContext) -> None:
+    """Checks if the user is authorized to use this bot or shares to use /help command for instructions.
+
+    Arguments:
+        update: update from Telegram
+        context: CallbackContext object that stores commonly used objects in handler callbacks
+    """
+    if(not(update.effective_message.chat.username == TELEGRAM_USER)):
+        Reply(update, "You are not authorized to use this bot! 🙅🏽‍♂️")
+        return
+
+    Reply(update, "Unknown command. Use /trade to place a trade or /calculate to find information for a trade. You can also use the /help command to view instructions for this bot.")
+
+    return
+
+
+# Command Handlers
+def welcome(update: Update, context: CallbackContext) -> None:
+    """Sends welcome message to user.
+
+    Arguments:
+        update: update from Telegram
+        context: CallbackContext object that stores commonly used objects in handler callbacks
+    """
+
+    welcome_message = "Welcome to the FX Signal Copier Telegram Bot! 💻💸\n\nYou can use this bot to enter trades directly from Telegram and get a detailed look at your risk to reward ratio with profit, loss, and calculated lot size. You are able to change specific settings such as allowed symbols, risk factor, and more from your personalized Python script and environment variables.\n\nUse the /help command to view instructions and example trades."
+    
+    # sends messages to user
+    Reply(update, welcome_message)
+
+    return
+
+def help(update: Update, context: CallbackContext) -> None:
+    """Sends a help message when the command /help is issued
+
+    Arguments:
+        update: update from Telegram
+        context: CallbackContext object that stores commonly used objects in handler callbacks
+    """
+
+    help_message = "This bot is used to automatically enter trades onto your MetaTrader account directly from Telegram. To begin, ensure that you are authorized to use this bot by adjusting your Python script or environment variables.\n\nThis bot supports all trade order types (Market Execution, Limit, and Stop)\n\nAfter an extended period away from the bot, please be sure to re-enter the start command to restart the connection to your MetaTrader account."
+    commands = "List of commands:\n/start : displays welcome message\n/help : displays list of commands and example trades\n/trade : takes in user inputted trade for parsing and placement\n/calculate : calculates trade information for a user inputted trade\n/batch : calculates and enters several trades from one message or text file\n/stats : displays the latency of each stage of the recent signals\n/history : displays the journaled signals of a symbol, e.g. /history EURUSD 24"
+    trade_example = "Example Trades 💴:\n\n"
+    market_execution_example = "Market Execution:\nBUY GBPUSD\nEntry NOW\nSL 1.14336\nTP 1.28930\nTP 1.29845\n\n"
+    limit_example = "Limit Execution:\nBUY LIMIT GBPUSD\nEntry 1.14480\nSL 1.14336\nTP 1.28930\n\n"
+    note = "You are able to enter any number of take profits. Each take profit opens its own trade with an equal share of the position size, so two take profits open two half-size trades. By default, the stop loss of the remaining trades moves to breakeven once the first take profit is hit.\n\nLines may come in any order and labels such as SL:, S/L, TP1 and T/P are understood. A range like 'Entry 1.1000 - 1.1020' enters at the first price.\n\nNote: Use 'NOW' as the entry to enter a market execution trade."
+
+    # sends messages to user
+    Reply(update, help_message, commands, trade_example + market_execution_example + limit_example + note)
+
+    return
+
+def stats(update: Update, context: CallbackContext) -> None:
+    """Sends the latency percentiles of every stage of the signal path.
+
+    Arguments:
+        update: update from Telegram
+        context: CallbackContext object that stores commonly used objects in handler callbacks
+    """
+
+    if(not(update.effective_message.chat.username == TELEGRAM_USER)):
+        Reply(update, "You are not authorized to use this bot! 🙅🏽‍♂️")
+        return
+
+    Reply(update, f'<pre>{METRICS.render_table()}</pre>', parse_mode=ParseMode.HTML)
+
+    return
+
+def history(update: Update, context: CallbackContext) -> None:
+    """Sends the journaled signals of a symbol, e.g. /history EURUSD 24 for the last 24 hours.
+
+    Arguments:
+        update: update from Telegram
+        context: CallbackContext object that stores commonly used objects in handler callbacks
+    """
+
+    if(not(update.effective_message.chat.username == TELEGRAM_USER)):
+        Reply(update, "You are not authorized to use this bot! 🙅🏽‍♂️")
+        return
+
+    symbol = LookupSymbol(context.args[0]) if context.args else None
+
+    if(symbol == None):
+        Reply(update, "Please enter a symbol, e.g. /history EURUSD or /history EURUSD 24 for the last 24 hours.")
+        return
+
+    try:
+        hours = float(context.args[1]) if len(context.args) > 1 else 24
+    except ValueError:
+        hours = 24
+
+    signals = JOURNAL.lookup(symbol, time.time() - hours * 60 * 60)
+
+    if(not(signals)):
+        Reply(update, f"No {symbol} signals in the last {hours:g} hours.")
+        return
+
+    Reply(update, f'<pre>{CreateHistoryTable(signals)}</pre>', parse_mode=ParseMode.HTML)
+
+    return
+
+def cancel(update: Update, context: CallbackContext) -> int:
+    """Cancels and ends the conversation.   
+    
+    Arguments:
+        update: update from Telegram
+        context: CallbackContext object that stores commonly used objects in handler callbacks
+    """
+
+    Reply(update, "Command has been canceled.")
+
+    # removes trade and batch from user context data
+    context.user_data['trade'] = None
+    context.user_data['batch'] = None
+
+    return ConversationHandler.END
+
+def error(update: Update, context: CallbackContext) -> None:
+    """Logs Errors caused by updates.
+
+    Arguments:
+        update: update from Telegram
+        context: CallbackContext object that stores commonly used objects in handler callbacks
+    """
+
+    logger.warning('Update "%s" caused error "%s"', update, context.error)
+
+    return
+
+def Trade_Command(update: Update, context: CallbackContext) -> int:
+    """Asks user to enter the trade they would like to place.
+
+    Arguments:
+        update: update from Telegram
+        context: CallbackContext object that stores commonly used objects in handler callbacks
+    """
+    if(not(update.effective_message.chat.username == TELEGRAM_USER)):
+        Reply(update, "You are not authorized to use this bot! 🙅🏽‍♂️")
+        return ConversationHandler.END
+    
+    # initializes the user's trade as empty prior to input and parsing
+    context.user_data['trade'] = None
+    
+    # starts connecting while the user pastes the signal
+    PREWARMER.start(ACCOUNTS)
+
+    # asks user to enter the trade
+    Reply(update, "Please enter the trade that you would like to place.")
+
+    return TRADE
+
+def Calculation_Command(update: Update, context: CallbackContext) -> int:
+    """Asks user to enter the trade they would like to calculate trade information for.
+
+    Arguments:
+        update: update from Telegram
+        context: CallbackContext object that stores commonly used objects in handler callbacks
+    """
+    if(not(update.effective_message.chat.username == TELEGRAM_USER)):
+        Reply(update, "You are not authorized to use this bot! 🙅🏽‍♂️")
+        return ConversationHandler.END
+
+    # initializes the user's trade as empty prior to input and parsing
+    context.user_data['trade'] = None
+
+    # starts connecting while the user pastes the signal
+    PREWARMER.start(ACCOUNTS)
+
+    # asks user to enter the trade
+    Reply(update, "Please enter the trade that you would like to calculate.")
+
+    return CALCULATE
+
+def Batch_Command(update: Update, context: CallbackContext) -> int:
+    """Asks user to send several signals in one message or as a text file.
+
+    Arguments:
+        update: update from Telegram
+        context: CallbackContext object that stores commonly used objects in handler callbacks
+    """
+    if(not(update.effective_message.chat.username == TELEGRAM_USER)):
+        Reply(update, "You are not authorized to use this bot! 🙅🏽‍♂️")
+        return ConversationHandler.END
+
+    # initializes the user's batch as empty prior to input and parsing
+    context.user_data['batch'] = None
+
+    # starts connecting while the user pastes the signals
+    PREWARMER.start(ACCOUNTS)
+
+    # asks user to enter the signals
+    Reply(update, f"Please send the signals that you would like to enter, in one message or as a text file with up to {MAX_BATCH_SIGNALS} signals.")
+
+    return BATCH
+
+
+# Channel Copying
+# cheap checks that a message can be a signal before it is parsed
+SIGNAL_HINT = re.compile(r'\b(?:buy|sell)\b', re.IGNORECASE)
+STOP_LOSS_HINT = re.compile(r'\b(?:s/l|sl|stop[ \t]*loss)\b', re.IGNORECASE)
+
+# follow-up instructions of a provider, e.g. 'move SL to BE', 'SL to 1.0950' or 'close EURUSD'
+INSTRUCTION_TOKENS = re.compile(r"""
+    (?P<breakeven>\b(?:s/l|sl|stop[ \t]*loss)\b[^\n]*?\b(?:be|b/e|break[ \t]*even|entry)\b|\bbreak[ \t]*even\b)
+  | (?P<stoploss>\b(?:s/l|sl|stop[ \t]*loss)\b[ \t]*(?:to|at|@|:|=)?[ \t]*(?P<price>\d+(?:[.,]\d+)?))
+  | (?P<close>\b(?:close|exit|cancel)\b)
+  | (?P<hedge>\b(?:don['’]?t|do[ \t]+not|not|never|no|may|might|could|maybe|perhaps|if|when|consider(?:ing)?)\b)
+  | (?P<word>\#?[a-z]{3}/?[a-z]{3,}(?:\.[a-z0-9]+)?\b|\b[a-z]{4,}\b)
+""", re.IGNORECASE | re.VERBOSE)
+
+# words that may come before the action of an instruction that leads its message, e.g. 'EURUSD: please move SL to BE'
+LEADING_WORDS = frozenset(['please', 'pls', 'now', 'move', 'set', 'put', 'take'])
+WORD = re.compile(r'[^\W\d_]+')
+
+def LooksLikeSignal(text: str) -> bool:
+    """Checks whether a message has an order type and a stop loss, which every signal has.
+
+    Arguments:
+        text: message text
+
+    Returns:
+        True if the message is worth parsing with ParseSignal
+    """
+
+    return SIGNAL_HINT.search(text) is not None and STOP_LOSS_HINT.search(text) is not None
+
+def ParseInstruction(text: str) -> dict:
+    """Parses a provider's instruction to manage an earlier signal.
+
+    Arguments:
+        text: message text
+
+    Returns:
+        a dictionary with the action (Breakeven, StopLoss or Close), the symbol if one is named, whether the
+        action leads the message with nothing but a symbol before it and the new stop loss of StopLoss, or None
+        if the message is no instruction, e.g. because the action is negated or hedged ('don't close yet',
+        'we may exit')
+    """
+
+    instruction = None
+    symbol = None
+
+    # the text before the action without the symbols named there
+    prefix = []
+    position = 0
+
+    for token in INSTRUCTION_TOKENS.finditer(text):
+        kind = token.lastgroup if token.lastgroup != 'price' else 'stoploss'
+
+        if kind == 'word':
+            word = LookupSymbol(token.group())
+            symbol = symbol or word
+
+            if instruction is None and word is not None:
+                prefix.append(text[position:token.start()])
+                position = token.end()
+
+            continue
+
+        if instruction is not None:
+            continue
+
+        if kind == 'hedge':
+            return None
+
+        elif kind == 'breakeven':
+            instruction = {'Action': 'Breakeven'}
+
+        elif kind == 'stoploss':
+            instruction = {'Action': 'StopLoss', 'Price': ParsePrice(token.group('price'))}
+
+        elif kind == 'close':
+            instruction = {'Action': 'Close'}
+
+        prefix.append(text[position:token.start()])
+
+    if instruction is not None:
+        instruction['Symbol'] = symbol
+        instruction['Leading'] = all(word.lower() in LEADING_WORDS for word in WORD.findall(''.join(prefix)))
+
+    return instruction
+
+
+class ChannelCopier:
+    """Copies the signals posted in SOURCE_CHATS to every account without /trade.
+
+    Updates of the source chats skip the dispatcher thread. The webhook hands them straight to a task on the
+    event loop, which pre-filters, parses and enters them. Every copied signal is remembered with the position
+    ids of its legs on every account, so a reply such as 'move SL to BE', an edit of the signal or a message
+    such as 'close EURUSD' changes the positions of the original trade.
+    """
+
+    def __init__(self, sources: frozenset = SOURCE_CHATS, journal: SignalJournal = JOURNAL, size: int = COPY_CACHE_SIZE):
+        """Creates the copier.
+
+        Arguments:
+            sources: chat ids or @usernames of the source chats
+            journal: journal that copies are persisted to and looked up in after they left the memory
+            size: number of copies kept in memory
+        """
+
+        self.sources = sources
+        self.journal = journal
+        self.size = size
+
+        # recent copies keyed by chat and message id, and the newest copy of every symbol per chat
+        self.copies = collections.OrderedDict()
+        self.latest = {}
+
+        # running ingestion tasks, referenced so they are not garbage collected before they finish
+        self.tasks = set()
+
+    def accepts(self, update: Update) -> bool:
+        """Checks whether an update is a message of a source chat.
+
+        Arguments:
+            update: update from Telegram
+
+        Returns:
+            True if the update is copied instead of dispatched
+        """
+
+        chat = update.effective_chat
+
+        if not self.sources or chat is None or update.effective_message is None:
+            return False
+
+        return str(chat.id) in self.sources or f'@{chat.username}' in self.sources
+
+    def ingest(self, update: Update, receivedAt: float) -> None:
+        """Starts processing a message of a source chat on the running event loop.
+
+        Arguments:
+            update: update from Telegram
+            receivedAt: performance counter when the webhook received the update
+        """
+
+        task = asyncio.get_running_loop().create_task(self._process(update, receivedAt))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _process(self, update: Update, receivedAt: float) -> None:
+        """Enters a new signal, amends an edited one or applies an instruction to an earlier one.
+
+        Arguments:
+            update: update from Telegram
+            receivedAt: performance counter when the webhook received the update
+        """
+
+        message = update.effective_message
+        text = message.text or message.caption or ''
+        edited = update.edited_message is not None or update.edited_channel_post is not None
+
+        try:
+            looksLikeSignal = LooksLikeSignal(text)
+            trade = ParseSignal(text, DEFAULT_RISK_FACTOR) if looksLikeSignal else None
+
+            # an edited signal changes the trade that was entered from it, or is entered if it was not
+            if edited:
+                original = await self.find(message.chat_id, message.message_id)
+
+                if original is not None and trade is not None:
+                    await self._amend(original, trade)
+                    return
+
+            if trade is not None:
+                await self._enter(update, trade, receivedAt)
+                return
+
+            # a message that looks like a signal but is not a valid one is no instruction either
+            if looksLikeSignal:
+                logger.info('Ignored invalid signal %r in chat %s', text, message.chat_id)
+                return
+
+            instruction = ParseInstruction(text)
+
+            if instruction is None:
+                return
+
+            # a reply points at its signal, otherwise the newest signal of the named symbol is meant, but only
+            # when the message starts with the instruction instead of mentioning it in passing
+            if message.reply_to_message is not None:
+                original = await self.find(message.chat_id, message.reply_to_message.message_id)
+            elif instruction['Symbol'] is not None and instruction['Leading']:
+                original = await self.find(message.chat_id, symbol=instruction['Symbol'])
+            else:
+                original = None
+
+            if original is None:
+                logger.info('No copied signal for instruction %r in chat %s', text, message.chat_id)
+                return
+
+            await self._manage(original, instruction)
+
+        except Exception as error:
+            logger.error('Copying message %s of chat %s failed: %s', message.message_id, message.chat_id, error)
+
+    async def _enter(self, update: Update, trade: Trade, receivedAt: float) -> None:
+        """Enters a copied signal on every account and remembers the position ids of its legs.
+
+        Arguments:
+            update: update from Telegram
+            trade: parsed signal
+            receivedAt: performance counter when the webhook received the update
+        """
+
+        message = update.effective_message
+
+        if DEDUPLICATOR.check(trade, update):
+            logger.info('Ignored duplicate %s %s signal in chat %s', trade.order_type, trade.symbol, message.chat_id)
+            return
+
+        # the source chat is the provider of the signal for the risk engine
+        trade = dataclasses.replace(trade, provider=str(message.chat_id))
+        signalId = JOURNAL.record_signal(trade, True, update)
+        results = []
+
+        try:
+            async with SIGNAL_SEMAPHORE:
+                results = await ExecuteOnAccounts(trade, True)
+
+        finally:
+            DEDUPLICATOR.settle(trade, update, results)
+
+        # time from the webhook to the last account's order result
+        METRICS.observe('ingest_to_order', time.perf_counter() - receivedAt, trade.symbol)
+        JOURNAL.record_results(signalId, results)
+
+        # position ids of every leg in take profit order, rejected legs keep their place
+        positions = {}
+
+        for result in results:
+            if result['Report'] is not None:
+                positions[result['Account']['AccountId']] = [leg['PositionId'] or leg['OrderId'] if leg['Status'] != 'Rejected' else None for leg in result['Report']['Legs']]
+
+        self.remember({'ChatId': message.chat_id, 'MessageId': message.message_id, 'CopiedAt': time.time(), 'Trade': trade, 'Positions': positions})
+
+        for result in results:
+            logger.info('Copied %s %s to %s: %s', trade.order_type, trade.symbol, result['Account']['Name'], AccountStatus(result))
+
+    async def _amend(self, original: dict, trade: Trade) -> None:
+        """Moves the stop loss and take profits of an entered signal to the ones of its edited message.
+
+        Arguments:
+            original: copy of the signal
+            trade: signal parsed from the edited message
+        """
+
+        changes = []
+
+        for account_id, legs in original['Positions'].items():
+            for count, legId in enumerate(legs):
+                # legs beyond the take profits of the edit keep their own take profit
+                takeProfit = trade.take_profits[count] if count < len(trade.take_profits) else None
+
+                if legId is not None:
+                    changes.append(self._route(account_id, legId, stopLoss=trade.stop_loss, takeProfit=takeProfit, entry=trade.entry))
+
+        self._log(original, 'Amend', await asyncio.gather(*changes, return_exceptions=True))
+        self.remember(dict(original, Trade=dataclasses.replace(original['Trade'], stop_loss=trade.stop_loss, take_profits=trade.take_profits)))
+
+    async def _manage(self, original: dict, instruction: dict) -> None:
+        """Applies an instruction to every open leg of an entered signal.
+
+        Arguments:
+            original: copy of the signal
+            instruction: instruction returned by ParseInstruction
+        """
+
+        changes = []
+
+        for account_id, legs in original['Positions'].items():
+            for legId in legs:
+                if legId is None:
+                    continue
+
+                if instruction['Action'] == 'Close':
+                    changes.append(self._route(account_id, legId, close=True))
+                elif instruction['Action'] == 'Breakeven':
+                    changes.append(self._route(account_id, legId, breakeven=True))
+                else:
+                    changes.append(self._route(account_id, legId, stopLoss=instruction['Price']))
+
+        self._log(original, instruction['Action'], await asyncio.gather(*changes, return_exceptions=True))
+
+    async def _route(self, account_id: str, legId: str, **changes) -> str:
+        """Changes one leg in this process, or in the worker that owns the account when WORKER_POOL runs.
+
+        Arguments:
+            account_id: MetaApi account id
+            legId: position id of the leg
+            changes: keyword arguments of change
+
+        Returns:
+            the result of change
+        """
+
+        if WORKER_POOL.active:
+            return await WORKER_POOL.call(account_id, 'change', account_id, legId, changes)
+
+        return await self.change(account_id, legId, **changes)
+
+    async def change(self, account_id: str, legId: str, close: bool = False, breakeven: bool = False, stopLoss: float = None, takeProfit: float = None, entry: float = None) -> str:
+        """Closes or modifies one leg, whether it is an open position or still a pending order.
+
+        Arguments:
+            account_id: MetaApi account id
+            legId: position id of the leg, which is the order id while the order is pending
+            close: whether to close the position or cancel the order
+            breakeven: whether to move the stop loss of the position to its open price
+            stopLoss: new stop loss, None keeps it
+            takeProfit: new take profit, None keeps it
+            entry: new open price of a pending order, None keeps it
+
+        Returns:
+            the MetaApi method that was called, or the reason nothing was done
+        """
+
+        connection = await CONNECTION_MANAGER.get_connection(account_id)
+        state = ACCOUNT_STATES.get(account_id)
+
+        # the streamed state knows whether the leg is open, pending or gone without asking the account
+        if state is not None:
+            position = state.positions.get(legId)
+            order = state.orders.get(legId) if position is None else None
+        else:
+            position = await self._fetch(account_id, connection, 'get_position', legId)
+            order = await self._fetch(account_id, connection, 'get_order', legId) if position is None else None
+
+        if position is None and order is None:
+            return 'Closed'
+
+        if close:
+            method, arguments = ('close_position', (legId,)) if position is not None else ('cancel_order', (legId,))
+
+        elif position is not None:
+            newStopLoss = position['openPrice'] if breakeven else stopLoss
+            method, arguments = 'modify_position', (legId, position.get('stopLoss') if newStopLoss is None else newStopLoss, position.get('takeProfit') if takeProfit is None else takeProfit)
+
+        elif breakeven:
+            return 'Pending'
+
+        else:
+            method, arguments = 'modify_order', (legId, order['openPrice'] if entry is None else entry, order.get('stopLoss') if stopLoss is None else stopLoss, order.get('takeProfit') if takeProfit is None else takeProfit)
+
+        await REQUEST_GUARD.write(account_id, connection, method, *arguments)
+
+        return method
+
+    @staticmethod
+    async def _fetch(account_id: str, connection, method: str, legId: str) -> dict:
+        """Asks the account for a position or pending order.
+
+        Arguments:
+            account_id: MetaApi account id
+            connection: synchronized RPC connection to the account
+            method: 'get_position' or 'get_order'
+            legId: id of the position or order
+
+        Returns:
+            the position or order, or None if the account does not know it
+        """
+
+        try:
+            return await REQUEST_GUARD.read(account_id, connection, method, legId, priority=PRIORITY_MARKET)
+
+        except Exception as error:
+            # an account that cannot be reached says nothing about whether the leg is still open
+            if IsTransient(error):
+                raise
+
+            return None
+
+    def _log(self, original: dict, action: str, outcomes: list) -> None:
+        """Logs the outcome of an instruction on every leg of a copied signal.
+
+        Arguments:
+            original: copy of the signal
+            action: name of the instruction
+            outcomes: results of change, exceptions included
+        """
+
+        failures = [outcome for outcome in outcomes if isinstance(outcome, Exception)]
+        logger.info('%s on %s %s of message %s: %d legs, %d failed %s', action, original['Trade'].order_type, original['Trade'].symbol, original['MessageId'], len(outcomes), len(failures), [str(failure) for failure in failures])
+
+    def remember(self, copy: dict) -> None:
+        """Keeps a copy in memory and persists it to the journal.
+
+        Arguments:
+            copy: copy with the chat and message id, the trade and the positions per account
+        """
+
+        key = (copy['ChatId'], copy['MessageId'])
+
+        self.copies[key] = copy
+        self.copies.move_to_end(key)
+        self.latest[(copy['ChatId'], copy['Trade'].symbol)] = key
+        self.journal.record_copy(copy)
+
+        while len(self.copies) > self.size:
+            self.copies.popitem(last=False)
+
+    async def find(self, chatId: int, messageId: int = None, symbol: str = None) -> dict:
+        """Returns a copy by its message, or the newest copy of a symbol in a chat, from memory or the journal.
+
+        Arguments:
+            chatId: id of the source chat
+            messageId: id of the message that carried the signal
+            symbol: symbol from SYMBOLS, used when no message id is given
+
+        Returns:
+            the copy, or None if there is none
+        """
+
+        key = (chatId, messageId) if messageId is not None else self.latest.get((chatId, symbol))
+        copy = self.copies.get(key)
+
+        if copy is not None:
+            return copy
+
+        # reads the journal off the event loop
+        return await asyncio.get_running_loop().run_in_executor(None, self.journal.find_copy, chatId, messageId, symbol)
+
+
+# copier of the source chats shared by every handler in this process
+COPIER = ChannelCopier()
+
+
+# Worker Processes
+def ShardOf(account_id: str, workers: int) -> int:
+    """Returns the worker that owns an account, the same in every process and after every restart.
+
+    Arguments:
+        account_id: MetaApi account id
+        workers: number of workers
+
+    Returns:
+        the index of the worker
+    """
+
+    return int.from_bytes(hashlib.blake2b(account_id.encode(), digest_size=8).digest(), 'big') % workers
+
+async def ExecuteInWorker(account: AccountSettings, trade: Trade, enterTrade: bool) -> dict:
+    """Runs ExecuteOnAccount in a worker and renders its table there, so the front end only forwards text.
+
+    Arguments:
+        account: settings of the account
+        trade: trade signal information
+        enterTrade: whether to place the orders or only calculate the trade
+
+    Returns:
+        the result of ExecuteOnAccount with the table as text
+    """
+
+    result = await ExecuteOnAccount(account, trade, enterTrade)
+
+    if result['Table'] is not None:
+        result['Table'] = result['Table'].get_string()
+
+    return result
+
+async def PrewarmInWorker(account: AccountSettings) -> None:
+    """Warms an account in the worker that owns it.
+
+    Arguments:
+        account: settings of the account
+    """
+
+    await PREWARMER._start([account])
+
+    # waits for the warm-up so that a caller that waits knows the account is ready
+    entry = PREWARMER.snapshots.get(account['AccountId'])
+
+    if entry is not None:
+        await asyncio.shield(entry[1])
+
+async def ChangeInWorker(account_id: str, legId: str, changes: dict) -> str:
+    """Changes a copied leg in the worker that owns its account.
+
+    Arguments:
+        account_id: MetaApi account id
+        legId: position id of the leg
+        changes: keyword arguments of ChannelCopier.change
+
+    Returns:
+        the result of ChannelCopier.change
+    """
+
+    return await COPIER.change(account_id, legId, **changes)
+
+# jobs that the front end can send to a worker
+WORKER_JOBS = {'execute': ExecuteInWorker, 'prewarm': PrewarmInWorker, 'change': ChangeInWorker}
+
+async def RunJob(job: tuple, results) -> None:
+    """Runs a job in a worker and sends its result back unless the job is fire and forget.
+
+    Arguments:
+        job: job id, or None when nobody waits for the result, job name and arguments
+        results: queue that the results of every worker go to
+    """
+
+    jobId, name, arguments = job
+
+    try:
+        result, error = await WORKER_JOBS[name](*arguments), None
+    except Exception as exception:
+        result, error = None, str(exception)
+
+    if jobId is not None:
+        results.put((jobId, result, error))
+
+def RunWorker(index: int, workers: int, requests, results, initializer=None) -> None:
+    """Entry point of a worker process, which owns the connections of the accounts of its shard.
+
+    Jobs are started on the worker's event loop in the order they arrive, so the requests of an account keep
+    the order in which the front end sent them.
+
+    Arguments:
+        index: index of the worker
+        workers: number of workers
+        requests: queue of the jobs of this worker, None stops it
+        results: queue that the results of every worker go to
+        initializer: function called first, for example to install stand-ins
+    """
+
+    global SYMBOL_CACHE
+
+    # the front end handles SIGINT and stops the workers itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    # every worker keeps the specifications of its own accounts in its own file
+    if SYMBOL_CACHE.path:
+        root, extension = os.path.splitext(SYMBOL_CACHE.path)
+        SYMBOL_CACHE = SymbolSpecificationCache(f'{root}.{index}{extension}')
+
+    if initializer is not None:
+        initializer()
+
+    accounts = [account for account in ACCOUNTS if ShardOf(account['AccountId'], workers) == index]
+    logger.info('Worker %d owns %d accounts', index, len(accounts))
+
+    CONNECTION_MANAGER.start()
+    CONNECTION_MANAGER.submit(PrepareAccounts(accounts))
+
+    while True:
+        job = requests.get()
+
+        if job is None:
+            break
+
+        CONNECTION_MANAGER.submit(RunJob(job, results))
+
+    CONNECTION_MANAGER.run(ACCOUNT_STATES.close())
+    CONNECTION_MANAGER.run(CONNECTION_MANAGER.close())
+
+
+class WorkerPool:
+    """Splits the MetaApi work of the webhook process over worker processes, sharded by account id.
+
+    The front end keeps Telegram, parsing, the journal and the duplicate check. Every job for an account goes
+    to the queue of the one worker that owns the account, so each account has one set of connections and its
+    jobs are started in order, and the results of all workers come back on one queue. The queues are local
+    multiprocessing queues, so the whole pool runs on one machine.
+    """
+
+    def __init__(self, workers: int = WORKERS, initializer=None, check_interval: float = WORKER_CHECK_INTERVAL):
+        """Creates the pool without starting any process.
+
+        Arguments:
+            workers: number of worker processes, 0 keeps all work in this process
+            initializer: function every worker calls first
+            check_interval: seconds between the checks that restart workers that died
+        """
+
+        self.workers = workers
+        self.initializer = initializer
+        self.check_interval = check_interval
+        self.context = multiprocessing.get_context('spawn')
+
+        # worker process, job queue and number of times the worker was started, keyed by worker index
+        self.processes = {}
+        self.requests = {}
+        self.generations = collections.Counter()
+
+        # worker index, generation of the worker the job was queued to and future of every job that waits for
+        # its result, keyed by job id
+        self.pending = {}
+        self.ids = itertools.count(1)
+
+        self.results = None
+        self.loop = None
+        self.stopping = False
+
+        # a job is queued together with the generation of its worker, never in between a restart
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    @property
+    def active(self) -> bool:
+        """Whether jobs go to worker processes."""
+
+        return bool(self.processes)
+
+    def start(self) -> None:
+        """Starts the workers and the thread that collects their results."""
+
+        if not self.workers or self.processes:
+            return
+
+        self.results = self.context.Queue()
+
+        for index in range(self.workers):
+            self._spawn(index)
+
+        threading.Thread(target=self._collect, name='worker-results', daemon=True).start()
+        threading.Thread(target=self._watch, name='worker-supervisor', daemon=True).start()
+
+    def _spawn(self, index: int) -> None:
+        """Starts a worker with a new job queue.
+
+        Arguments:
+            index: index of the worker
+        """
+
+        with self._lock:
+            self.generations[index] += 1
+            self.requests[index] = self.context.Queue()
+            self.processes[index] = self.context.Process(target=RunWorker, args=(index, self.workers, self.requests[index], self.results, self.initializer), name=f'worker-{index}', daemon=True)
+            self.processes[index].start()
+
+    async def call(self, account_id: str, name: str, *arguments):
+        """Runs a job in the worker that owns an account and waits for its result.
+
+        Arguments:
+            account_id: MetaApi account id that selects the worker
+            name: name of the job in WORKER_JOBS
+            arguments: positional arguments of the job
+
+        Returns:
+            the result of the job
+        """
+
+        self.loop = asyncio.get_running_loop()
+
+        shard = ShardOf(account_id, self.workers)
+        jobId = next(self.ids)
+        future = self.loop.create_future()
+
+        with self._lock:
+            self.pending[jobId] = (shard, self.generations[shard], future)
+            self.requests[shard].put((jobId, name, arguments))
+
+        return await future
+
+    def send(self, account_id: str, name: str, *arguments) -> None:
+        """Runs a job in the worker that owns an account without waiting for it.
+
+        Arguments:
+            account_id: MetaApi account id that selects the worker
+            name: name of the job in WORKER_JOBS
+            arguments: positional arguments of the job
+        """
+
+        with self._lock:
+            self.requests[ShardOf(account_id, self.workers)].put((None, name, arguments))
+
+    def _collect(self) -> None:
+        """Hands the results of the workers to the event loop."""
+
+        while True:
+            item = self.results.get()
+
+            if item is None:
+                return
+
+            self.loop.call_soon_threadsafe(self._resolve, *item)
+
+    def _watch(self) -> None:
+        """Checks the workers on a timer, however many results arrive in between."""
+
+        while not self._stopped.wait(self.check_interval):
+            self._supervise()
+
+    def _resolve(self, jobId: int, result, error: str) -> None:
+        """Completes the future of a job.
+
+        Arguments:
+            jobId: id of the job
+            result: result of the job
+            error: message of the exception the job raised, None if it succeeded
+        """
+
+        entry = self.pending.pop(jobId, None)
+
+        if entry is None or entry[2].done():
+            return
+
+        if error is not None:
+            entry[2].set_exception(Exception(error))
+        else:
+            entry[2].set_result(result)
+
+    def _supervise(self) -> None:
+        """Fails the jobs of workers that died and starts them again."""
+
+        for index, process in list(self.processes.items()):
+            if self.stopping or process.is_alive():
+                continue
+
+            logger.error('Worker %d exited with code %s, restarting it', index, process.exitcode)
+
+            generation = self.generations[index]
+            self._spawn(index)
+
+            if self.loop is not None:
+                self.loop.call_soon_threadsafe(self._fail, index, generation)
+
+    def _fail(self, index: int, generation: int) -> None:
+        """Fails every job that was queued to a worker that died, but none queued to the worker that replaced it.
+
+        Arguments:
+            index: index of the worker
+            generation: generation of the worker that died
+        """
+
+        for jobId, (shard, jobGeneration, future) in list(self.pending.items()):
+            if shard == index and jobGeneration == generation:
+                del self.pending[jobId]
+
+                if not future.done():
+                    future.set_exception(Exception(f'Worker {index} exited'))
+
+    def close(self, timeout: float = 30) -> None:
+        """Stops the workers after the jobs they already received, and the result thread.
+
+        Arguments:
+            timeout: seconds to wait for every worker
+        """
+
+        self.stopping = True
+        self._stopped.set()
+
+        for requests in self.requests.values():
+            requests.put(None)
+
+        for process in self.processes.values():
+            process.join(timeout)
+
+        if self.results is not None:
+            self.results.put(None)
+
+        self.processes.clear()
+
+
+async def ExecuteInPool(account: AccountSettings, trade: Trade, enterTrade: bool) -> dict:
+    """Runs ExecuteOnAccount in the worker that owns an account.
+
+    Arguments:
+        account: settings of the account
+        trade: trade signal information
+        enterTrade: whether to place the orders or only calculate the trade
+
+    Returns:
+        the result of ExecuteOnAccount, or an error result if the worker failed
+    """
+
+    try:
+        return await WORKER_POOL.call(account['AccountId'], 'execute', account, trade, enterTrade)
+
+    except Exception as error:
+        logger.error(f"Error on {account['Name']}: {error}")
+        return {'Account': account, 'Trade': trade, 'Table': None, 'Report': None, 'Error': str(error), 'Latency': 0}
+
+
+# worker processes shared by every handler in this process
+WORKER_POOL = WorkerPool()
+
+
+# Webhook Server
+async def StartWebhookServer(dispatcher) -> web.AppRunner:
+    """Starts the HTTP server that receives Telegram updates on the shared event loop.
+
+    Updates are decoded and queued for the dispatcher, which only routes them since the handlers hand all
+    slow work back to the event loop. Messages of the source chats go to COPIER directly. The latency metrics
+    are served on /metrics.
+
+    Arguments:
+        dispatcher: dispatcher of the Telegram bot
+
+    Returns:
+        the runner of the server, used to stop it
+    """
+
+    async def ReceiveUpdate(request: web.Request) -> web.Response:
+        receivedAt = time.perf_counter()
+
+        with METRICS.measure('webhook'):
+            data = await request.json()
+            update = Update.de_json(data, dispatcher.bot)
+
+            # messages of the source chats are copied on the event loop without waiting for the dispatcher
+            if COPIER.accepts(update):
+                COPIER.ingest(update, receivedAt)
+            else:
+                dispatcher.update_queue.put(update)
+
+        return web.Response()
+
+    async def ServeMetrics(request: web.Request) -> web.Response:
+        return web.Response(text=METRICS.render_prometheus(), content_type='text/plain')
+
+    app = web.Application()
+    app.router.add_post(f'/{TOKEN}', ReceiveUpdate)
+    app.router.add_get('/metrics', ServeMetrics)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+
+    site = web.TCPSite(runner, '0.0.0.0', PORT)
+    await site.start()
+
+    logger.info('Listening for Telegram updates on port %s', PORT)
+
+    return runner
+
+def RunWebhook(updater: Updater) -> None:
+    """Serves the Telegram webhook until the process receives SIGINT or SIGTERM.
+
+    Arguments:
+        updater: updater of the Telegram bot with all handlers registered
+    """
+
+    dispatcher = updater.dispatcher
+
+    # routes updates on its own thread
+    threading.Thread(target=dispatcher.start, name='dispatcher', daemon=True).start()
+
+    runner = CONNECTION_MANAGER.run(StartWebhookServer(dispatcher))
+    updater.bot.set_webhook(url=APP_URL + TOKEN)
+
+    stopping = threading.Event()
+
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda signum, frame: stopping.set())
+
+    while not stopping.wait(1):
+        pass
+
+    logger.info('Shutting down ...')
+
+    CONNECTION_MANAGER.run(runner.cleanup())
+    dispatcher.stop()
+
+    # gives the queued replies a moment to reach Telegram
+    CONNECTION_MANAGER.run(MESSAGE_QUEUE.close())
+    CONNECTION_MANAGER.run(ACCOUNT_STATES.close())
+    CONNECTION_MANAGER.run(CONNECTION_MANAGER.close())
+    WORKER_POOL.close()
+
+    # commits the last journal entries before the process exits
+    JOURNAL.close()
+
+    return
+
+
+def main() -> None:
+    """Runs the Telegram bot."""
+
+    # replays the conversations, pending trades and recently entered signals of the previous run
+    JOURNAL.open()
+    DEDUPLICATOR.restore()
+
+    updater = Updater(TOKEN, persistence=JOURNAL, use_context=True)
+
+    # connects to MetaTrader and loads the symbol specifications in the background so the first signal does not wait for them,
+    # in the worker processes when the accounts are sharded
+    WORKER_POOL.start()
+    CONNECTION_MANAGER.start()
+
+    if WORKER_POOL.active:
+        logger.info('Sharding %d accounts over %d workers', len(ACCOUNTS), WORKERS)
+    else:
+        CONNECTION_MANAGER.submit(PrepareAccounts())
+
+    if SOURCE_CHATS:
+        logger.info('Copying the signals of %s', ', '.join(sorted(SOURCE_CHATS)))
+
+    # get the dispatcher to register handlers
+    dp = updater.dispatcher
+
+    # message handler
+    dp.add_handler(CommandHandler("start", welcome))
 
     # help command handler
     dp.add_handler(CommandHandler("help", help))
 
+    # latency statistics command handler
+    dp.add_handler(CommandHandler("stats", stats))
+
+    # signal journal command handler
+    dp.add_handler(CommandHandler("history", history))
+
     conv_handler = ConversationHandler(
-        entry_points=[CommandHandler("trade", Trade_Command), CommandHandler("calculate", Calculation_Command)],
+        entry_points=[CommandHandler("trade", Trade_Command), CommandHandler("calculate", Calculation_Command), CommandHandler("batch", Batch_Command)],
         states={
             TRADE: [MessageHandler(Filters.text & ~Filters.command, PlaceTrade)],
             CALCULATE: [MessageHandler(Filters.text & ~Filters.command, CalculateTrade)],
-            DECISION: [CommandHandler("yes", PlaceTrade), CommandHandler("no", cancel)]
+            DECISION: [CommandHandler("yes", PlaceTrade), CommandHandler("no", cancel)],
+            BATCH: [MessageHandler((Filters.text & ~Filters.command) | Filters.document, ReceiveBatch)],
+            BATCH_DECISION: [CommandHandler("yes", PlaceBatch), CommandHandler("no", cancel)]
         },
         fallbacks=[CommandHandler("cancel", cancel)],
+        name="trade",
+        persistent=True,
     )
 
     # conversation handler for entering trade or calculating trade information
@@ -570,9 +5995,8 @@ def main() -> None:
     # log all errors
     dp.add_error_handler(error)
     
-    # listens for incoming updates from Telegram
-    updater.start_webhook(listen="0.0.0.0", port=PORT, url_path=TOKEN, webhook_url=APP_URL + TOKEN)
-    updater.idle()
+    # listens for incoming updates from Telegram on the shared event loop
+    RunWebhook(updater)
 
     return
 
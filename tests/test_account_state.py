@@ -0,0 +1,93 @@
+import asyncio
+import dataclasses
+
+import pytest
+
+import run
+from run import ParseSignal
+
+
+ACCOUNT = {'AccountId': 'first', 'Name': 'Main'}
+
+
+@pytest.fixture(autouse=True)
+def engine(monkeypatch):
+    monkeypatch.setattr(run, 'RISK_ENGINE', run.RiskEngine())
+    monkeypatch.setattr(run, 'POSITION_MANAGER', run.PositionManager())
+
+
+def Position(positionId, volume):
+    return {'id': positionId, 'symbol': 'EURUSD', 'type': 'POSITION_TYPE_BUY', 'openPrice': 1.085, 'stopLoss': 1.08, 'volume': volume}
+
+
+def Synchronized(information):
+    state = run.AccountState('first')
+
+    async def main():
+        await state.on_connected('0', 1)
+        await state.on_account_information_updated('0', information)
+        await state.on_positions_replaced('0', [])
+        await state.on_positions_synchronized('0', 'sync')
+        await state.on_pending_orders_replaced('0', [])
+        await state.on_pending_orders_synchronized('0', 'sync')
+
+    asyncio.run(main())
+
+    return state
+
+
+def Sized(lots):
+    trade = ParseSignal("BUY LIMIT EURUSD 1.0850\nSL 1.0800\nTP 1.0900", 0.01)
+
+    return dataclasses.replace(trade, pip_size=0.0001, pip_value=10, position_size=lots, stop_loss_pips=50)
+
+
+def test_state_follows_the_streamed_events():
+    state = Synchronized({'balance': 10000, 'equity': 10000, 'freeMargin': 10000, 'leverage': 100, 'currency': 'USD'})
+
+    assert state.live
+
+    async def main():
+        await state.on_position_updated('0', Position('1', 0.5))
+        await state.on_position_updated('0', Position('2', 0.3))
+        await state.on_symbol_prices_updated('0', [], equity=9950, margin=868, free_margin=9082)
+        await state.on_position_removed('0', '1')
+
+    asyncio.run(main())
+
+    assert state.information['equity'] == 9950
+    assert state.information['freeMargin'] == 9082
+    assert state.exposure('EURUSD') == pytest.approx(0.3)
+
+    # a disconnect leaves the state untrusted until the next synchronization
+    asyncio.run(state.on_disconnected('0'))
+    assert not state.live
+
+
+def test_estimate_margin():
+    # 1 lot of 100,000 EUR at 1.085 with a leverage of 100
+    assert run.EstimateMargin(Sized(1), 100) == pytest.approx(1085)
+    assert run.EstimateMargin(Sized(1), None) is None
+
+
+def test_trades_above_the_free_margin_are_refused():
+    cache = run.AccountStateCache()
+    cache.states['first'] = Synchronized({'balance': 10000, 'equity': 10000, 'freeMargin': 2000, 'leverage': 100, 'currency': 'USD'})
+
+    # 1.5 lots need about 1,628 of margin, 2 lots about 2,170, and 90% of the free margin may be used
+    assert cache.check(ACCOUNT, Sized(1.5)) is None
+    assert 'free margin' in cache.check(ACCOUNT, Sized(2))
+
+    # a stream that is down does not refuse anything
+    cache.states['first'].instances.clear()
+    assert cache.check(ACCOUNT, Sized(2)) is None
+
+
+def test_trades_above_the_symbol_exposure_are_refused():
+    cache = run.AccountStateCache()
+    cache.states['first'] = Synchronized({'balance': 10000, 'equity': 10000, 'freeMargin': 10000, 'leverage': 100, 'currency': 'USD'})
+
+    asyncio.run(cache.states['first'].on_position_updated('0', Position('1', 0.3)))
+
+    assert cache.check(dict(ACCOUNT, MaxSymbolExposure=0.5), Sized(0.2)) is None
+    assert 'exposure' in cache.check(dict(ACCOUNT, MaxSymbolExposure=0.4), Sized(0.2))
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+import backtest
+
+
+BARS = [
+    ('2021.01.04', '00:01:00', '1.22450', '1.22480', '1.22440', '1.22470'),
+    ('2021.01.04', '00:00:00', '1.22400', '1.22460', '1.22390', '1.22450'),
+]
+
+
+@pytest.mark.parametrize('delimiter', [',', '\t', ';'])
+def test_metatrader_exports_are_read_with_any_delimiter(tmp_path, delimiter):
+    path = tmp_path / 'EURUSD.csv'
+    path.write_text('\n'.join(delimiter.join(row) for row in [('<DATE>', '<TIME>', '<OPEN>', '<HIGH>', '<LOW>', '<CLOSE>')] + BARS) + '\n')
+
+    times, prices = backtest.ReadPriceFile(str(path))
+
+    assert list(times) == [1609718400, 1609718460]
+    assert np.array_equal(prices[:, 0], [1.224, 1.2246, 1.2239, 1.2245])
+
+
+def test_ticks_become_bars_of_the_bid(tmp_path):
+    path = tmp_path / 'EURUSD.csv'
+    path.write_text('time,bid,ask\n1609718400,1.2240,1.2241\n1609718401,1.2242,1.2243\n')
+
+    times, prices = backtest.ReadPriceFile(str(path))
+
+    assert list(times) == [1609718400, 1609718401]
+    assert np.array_equal(prices[3], [1.224, 1.2242])
+
+
+@pytest.mark.parametrize('header, column', [('open,high,low,close', 'time'), ('time,open,high,close', 'low'), ('time,ask', 'open')])
+def test_missing_columns_are_named(tmp_path, header, column):
+    path = tmp_path / 'EURUSD.csv'
+    path.write_text(header + '\n')
+
+    with pytest.raises(ValueError, match=column):
+        backtest.ReadPriceFile(str(path))
@@ -0,0 +1,82 @@
+import types
+
+import run
+from run import ParseSignal
+
+
+class Journal:
+    def __init__(self):
+        self.deduplication_keys = []
+        self.recorded = {}
+
+    def record_deduplication_key(self, key, expiresAt):
+        self.recorded[key] = expiresAt
+
+
+def Update(chat_id=1, message_id=1):
+    return types.SimpleNamespace(effective_message=types.SimpleNamespace(chat_id=chat_id, message_id=message_id))
+
+
+def Result(accepted):
+    return {'Report': {'Accepted': accepted, 'Rejected': 1 - accepted, 'Legs': []}, 'Error': None if accepted else 'Rejected'}
+
+
+TRADE = ParseSignal("BUY LIMIT EURUSD 1.0850\nSL 1.0800\nTP 1.0900", 1)
+
+
+def test_repeated_signal_is_a_duplicate():
+    deduplicator = run.SignalDeduplicator(Journal(), window=60)
+
+    assert not deduplicator.check(TRADE, Update(message_id=1))
+
+    # a second paste while the first one is still being entered
+    assert deduplicator.check(TRADE, Update(message_id=2))
+    assert deduplicator.check(TRADE, Update(message_id=1))
+
+
+def test_keys_are_journaled_once_an_order_was_accepted():
+    journal = Journal()
+    deduplicator = run.SignalDeduplicator(journal, window=60)
+
+    deduplicator.check(TRADE, Update())
+    assert journal.recorded == {}
+
+    deduplicator.settle(TRADE, Update(), [Result(0), Result(1)])
+
+    assert len(journal.recorded) == 2
+    assert deduplicator.check(TRADE, Update(message_id=2))
+
+
+def test_failed_signal_can_be_sent_again():
+    journal = Journal()
+    deduplicator = run.SignalDeduplicator(journal, window=60)
+
+    deduplicator.check(TRADE, Update())
+    deduplicator.settle(TRADE, Update(), [])
+
+    assert not deduplicator.check(TRADE, Update())
+
+    deduplicator.settle(TRADE, Update(), [Result(0), {'Report': None, 'Error': 'The circuit is open'}])
+
+    assert journal.recorded == {}
+    assert not deduplicator.check(TRADE, Update(message_id=2))
+
+
+def test_trades_of_one_message_are_kept_apart():
+    deduplicator = run.SignalDeduplicator(Journal(), window=60)
+    other = ParseSignal("SELL GBPJPY\nSL 190.50\nTP 189.00", 1)
+
+    assert not deduplicator.check(TRADE, Update(), 0)
+    assert not deduplicator.check(other, Update(), 1)
+
+    deduplicator.settle(other, Update(), [], 1)
+
+    assert not deduplicator.check(other, Update(), 1)
+    assert deduplicator.check(TRADE, Update(), 0)
+
+
+def test_disabled_window_never_refuses():
+    deduplicator = run.SignalDeduplicator(Journal(), window=0)
+
+    assert not deduplicator.check(TRADE, Update())
+    assert not deduplicator.check(TRADE, Update())
@@ -0,0 +1,118 @@
+import asyncio
+
+import pytest
+
+import run
+
+
+class Scheduler:
+    async def call(self, account_id, endpoint, priority, function, *arguments):
+        return await function(*arguments)
+
+
+class Connection:
+    def __init__(self, *answers, delay=0):
+        self.answers = list(answers)
+        self.delay = delay
+        self.calls = 0
+
+    async def get_account_information(self):
+        self.calls += 1
+        answer = self.answers.pop(0) if len(self.answers) > 1 else self.answers[0]
+
+        await asyncio.sleep(self.delay if self.calls == 1 else 0)
+
+        if isinstance(answer, Exception):
+            raise answer
+
+        return answer
+
+    create_market_buy_order = get_account_information
+
+
+@pytest.fixture(autouse=True)
+def scheduler(monkeypatch):
+    monkeypatch.setattr(run, 'ORDER_SCHEDULER', Scheduler())
+    monkeypatch.setattr(run, 'RetryDelay', lambda error, attempt: 0)
+
+
+def test_breaker_opens_after_transient_failures_in_a_row():
+    breaker = run.CircuitBreaker(threshold=3, reset_timeout=60)
+
+    breaker.failed('first')
+    breaker.failed('first')
+    breaker.succeeded()
+    breaker.failed('first')
+    breaker.failed('first')
+    breaker.check('first')
+
+    breaker.failed('first')
+
+    with pytest.raises(run.CircuitOpenError):
+        breaker.check('first')
+
+
+def test_breaker_lets_one_trial_through_after_the_reset_timeout():
+    breaker = run.CircuitBreaker(threshold=1, reset_timeout=60)
+
+    breaker.failed('first')
+    breaker.opened_at -= 60
+
+    # the trial goes through, the requests after it keep failing until it returns
+    breaker.check('first')
+
+    with pytest.raises(run.CircuitOpenError):
+        breaker.check('first')
+
+    breaker.failed('first')
+
+    with pytest.raises(run.CircuitOpenError):
+        breaker.check('first')
+
+    breaker.opened_at -= 60
+    breaker.check('first')
+    breaker.succeeded()
+
+    breaker.check('first')
+    assert breaker.opened_at is None
+
+
+def test_reads_are_retried_after_transient_failures():
+    guard = run.RequestGuard(max_retries=2, hedge_delay=0)
+    connection = Connection(ConnectionError('reset'), asyncio.TimeoutError(), {'balance': 100})
+
+    assert asyncio.run(guard.read('first', connection, 'get_account_information')) == {'balance': 100}
+    assert connection.calls == 3
+    assert guard.breaker('first').failures == 0
+
+
+def test_refused_reads_are_not_retried():
+    guard = run.RequestGuard(max_retries=2, hedge_delay=0)
+    connection = Connection(ValueError('invalid symbol'))
+
+    with pytest.raises(ValueError):
+        asyncio.run(guard.read('first', connection, 'get_account_information'))
+
+    assert connection.calls == 1
+
+
+def test_slow_reads_are_hedged():
+    guard = run.RequestGuard(hedge_delay=0.01)
+    connection = Connection({'balance': 100}, delay=5)
+
+    assert asyncio.run(asyncio.wait_for(guard.read('first', connection, 'get_account_information'), 1)) == {'balance': 100}
+    assert connection.calls == 2
+
+
+def test_orders_are_sent_once_and_fail_fast_while_the_circuit_is_open():
+    guard = run.RequestGuard()
+    guard.breakers['first'] = run.CircuitBreaker(threshold=1, reset_timeout=60)
+    connection = Connection(ConnectionError('reset'))
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(guard.write('first', connection, 'create_market_buy_order'))
+
+    with pytest.raises(run.CircuitOpenError):
+        asyncio.run(guard.write('first', connection, 'create_market_buy_order'))
+
+    assert connection.calls == 1
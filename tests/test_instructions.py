@@ -0,0 +1,82 @@
+import asyncio
+import types
+
+import pytest
+
+import run
+from run import ParseInstruction
+
+
+# instruction text, then action, symbol, whether it leads the message and new stop loss
+INSTRUCTIONS = [
+    ("close EURUSD", 'Close', 'EURUSD', True, None),
+    ("EURUSD: close now", 'Close', 'EURUSD', True, None),
+    ("move SL to BE", 'Breakeven', None, True, None),
+    ("GBPJPY move SL to breakeven", 'Breakeven', 'GBPJPY', True, None),
+    ("Please move SL to 1.0950 on EURUSD", 'StopLoss', 'EURUSD', True, 1.095),
+    ("SL to entry", 'Breakeven', None, True, None),
+    ("Great run on GBPJPY, close it here", 'Close', 'GBPJPY', False, None),
+]
+
+# messages that talk about closing or stop losses without asking for it
+NOT_INSTRUCTIONS = [
+    "Don't close your EURUSD yet",
+    "GBPJPY looking strong, we may exit before NFP",
+    "Do not move SL to BE on GBPJPY",
+    "If EURUSD breaks 1.0900 close half",
+    "EURUSD looking strong today",
+]
+
+
+@pytest.mark.parametrize('text, action, symbol, leading, price', INSTRUCTIONS)
+def test_parse_instruction(text, action, symbol, leading, price):
+    instruction = ParseInstruction(text)
+
+    assert instruction['Action'] == action
+    assert instruction['Symbol'] == symbol
+    assert instruction['Leading'] == leading
+    assert instruction.get('Price') == price
+
+
+@pytest.mark.parametrize('text', NOT_INSTRUCTIONS)
+def test_not_instructions(text):
+    assert ParseInstruction(text) is None
+
+
+class ChannelCopier(run.ChannelCopier):
+    def __init__(self):
+        super().__init__(frozenset(['1']))
+
+        self.managed = []
+
+    async def find(self, chatId, messageId=None, symbol=None):
+        return {'MessageId': messageId, 'Symbol': symbol}
+
+    async def _manage(self, original, instruction):
+        self.managed.append((original, instruction['Action']))
+
+    async def _enter(self, update, trade, receivedAt):
+        raise AssertionError('nothing should be entered')
+
+
+def Process(text, replyTo=None):
+    message = types.SimpleNamespace(chat_id=1, message_id=2, text=text, caption=None, reply_to_message=None if replyTo is None else types.SimpleNamespace(message_id=replyTo))
+    update = types.SimpleNamespace(effective_message=message, edited_message=None, edited_channel_post=None)
+    copier = ChannelCopier()
+
+    asyncio.run(copier._process(update, 0))
+
+    return copier.managed
+
+
+def test_copier_applies_leading_instructions():
+    assert Process("close EURUSD") == [({'MessageId': None, 'Symbol': 'EURUSD'}, 'Close')]
+
+
+def test_copier_applies_replies_to_their_signal():
+    assert Process("Great run, close it here", replyTo=1) == [({'MessageId': 1, 'Symbol': None}, 'Close')]
+
+
+@pytest.mark.parametrize('text', ["Don't close your EURUSD yet", "GBPJPY looking strong, we may exit before NFP", "Great run on GBPJPY, close it here", "SELL LIMIT EURUSD 1.0850 / SL 1.0800 / TP 1.0900"])
+def test_copier_ignores_other_messages(text):
+    assert Process(text) == []
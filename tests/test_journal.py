@@ -0,0 +1,44 @@
+import concurrent.futures
+
+import run
+from run import ParseSignal
+
+
+def test_pending_batch_survives_a_restart(tmp_path):
+    path = str(tmp_path / 'journal.db')
+    trades = [ParseSignal("BUY LIMIT EURUSD 1.0850\nSL 1.0800\nTP 1.0900", 1), ParseSignal("SELL GBPJPY\nSL 190.50\nTP 189.00", 1)]
+
+    journal = run.SignalJournal(path, flush_interval=0)
+    journal.open()
+    journal.update_user_data(1, {'trade': None, 'batch': trades})
+    journal.close()
+
+    restarted = run.SignalJournal(path, flush_interval=0)
+    restarted.open()
+    restarted.close()
+
+    assert restarted.get_user_data()[1]['batch'] == trades
+
+
+def test_store_batch_keeps_only_calculated_batches():
+    userData = {'batch': None}
+    future = concurrent.futures.Future()
+    future.set_result(None)
+
+    run.StoreBatch(userData, future)
+    assert userData['batch'] is None
+
+    trades = [ParseSignal("SELL GBPJPY\nSL 190.50\nTP 189.00", 1)]
+    future = concurrent.futures.Future()
+    future.set_result(trades)
+
+    run.StoreBatch(userData, future)
+    assert userData['batch'] == trades
+
+
+def test_frozen_trades_are_not_walked_for_bots():
+    journal = run.SignalJournal('', flush_interval=0)
+    userData = {'trade': ParseSignal("BUY EURUSD\nSL 1.0800\nTP 1.0900", 1), 'batch': None}
+
+    assert journal.replace_bot(userData) is userData
+    assert journal.insert_bot(userData) is userData
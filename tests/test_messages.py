@@ -0,0 +1,101 @@
+import asyncio
+import threading
+import time
+import types
+
+import run
+from telegram.error import RetryAfter
+
+
+class Bot:
+    """Records every message sent or edited, and refuses the first request with retry-after if asked to."""
+
+    def __init__(self, retryAfter=None):
+        self.retry_after = retryAfter
+        self.sent = []
+        self.lock = threading.Lock()
+
+    def request(self, kind, chatId, text):
+        with self.lock:
+            if self.retry_after is not None:
+                retryAfter, self.retry_after = self.retry_after, None
+                raise RetryAfter(retryAfter)
+
+            self.sent.append((kind, chatId, text, time.monotonic()))
+
+        return Sent(self, chatId)
+
+
+class Sent:
+    def __init__(self, bot, chatId):
+        self.bot = bot
+        self.chat_id = chatId
+
+    def edit_text(self, text, **options):
+        return self.bot.request('edit', self.chat_id, text)
+
+
+class Message(Sent):
+    def reply_text(self, text, **options):
+        return self.bot.request('send', self.chat_id, text)
+
+
+def Update(message):
+    return types.SimpleNamespace(effective_message=message)
+
+
+def Run(put):
+    messages = run.MessageQueue(rate=1000, chat_rate=1000, burst=100)
+
+    async def main():
+        await put(messages)
+        await messages.close()
+
+    asyncio.run(main())
+
+
+def test_message_is_sent_again_after_retry_after():
+    bot = Bot(retryAfter=0.2)
+    message = Message(bot, 1)
+    start = time.monotonic()
+
+    async def put(messages):
+        messages.put(Update(message), 'Trade entered')
+
+    Run(put)
+
+    assert [(kind, text) for kind, _, text, _ in bot.sent] == [('send', 'Trade entered')]
+    assert bot.sent[0][3] - start >= 0.2
+
+
+def test_waiting_status_updates_are_coalesced_into_edits():
+    bot = Bot()
+    message = Message(bot, 1)
+
+    async def put(messages):
+        messages.put(Update(message), 'Connecting ...', status=True)
+        await messages.close()
+
+        messages.put(Update(message), 'Calculating ...', status=True)
+        messages.put(Update(message), 'Entering ...', status=True)
+        messages.put(Update(message), 'Entered!', status=True)
+
+    Run(put)
+
+    # the later updates waited together, only the newest of them edits the status message that was sent
+    assert [(kind, text) for kind, _, text, _ in bot.sent] == [('send', 'Connecting ...'), ('edit', 'Entered!')]
+
+
+def test_every_chat_keeps_its_order():
+    bot = Bot()
+    chats = [Message(bot, chatId) for chatId in range(3)]
+
+    async def put(messages):
+        for count in range(5):
+            for message in chats:
+                messages.put(Update(message), f'{message.chat_id}-{count}')
+
+    Run(put)
+
+    for message in chats:
+        assert [text for _, chatId, text, _ in bot.sent if chatId == message.chat_id] == [f'{message.chat_id}-{count}' for count in range(5)]
@@ -0,0 +1,74 @@
+import asyncio
+import dataclasses
+
+import pytest
+
+import run
+from run import ParseSignal
+
+
+class Scheduler:
+    async def call(self, account_id, endpoint, priority, function, *arguments):
+        return await function(*arguments)
+
+
+class InvalidStops(Exception):
+    stringCode = 'TRADE_RETCODE_INVALID_STOPS'
+
+
+class Connection:
+    """Accepts every leg except the one with the rejected take profit and records every request."""
+
+    def __init__(self, rejected):
+        self.rejected = rejected
+        self.requests = []
+
+    def __getattr__(self, method):
+        async def request(*arguments):
+            self.requests.append((method,) + arguments)
+
+            if arguments[-1] == self.rejected:
+                raise InvalidStops('Invalid stops')
+
+            return {'stringCode': 'TRADE_RETCODE_DONE', 'orderId': f'order-{len(self.requests)}', 'positionId': f'position-{len(self.requests)}'}
+
+        return request
+
+
+@pytest.fixture(autouse=True)
+def guard(monkeypatch):
+    monkeypatch.setattr(run, 'ORDER_SCHEDULER', Scheduler())
+    monkeypatch.setattr(run, 'REQUEST_GUARD', run.RequestGuard())
+
+
+def Sized(text):
+    return dataclasses.replace(ParseSignal(text, 0.01), leg_volume=0.1)
+
+
+def test_one_rejected_leg_leaves_the_others_in_place():
+    trade = Sized("BUY EURUSD\nSL 1.0800\nTP1 1.0900\nTP2 1.0950\nTP3 1.1000")
+    connection = Connection(rejected=1.095)
+
+    report = asyncio.run(run.SubmitOrders(connection, trade, 'first'))
+
+    assert report['Accepted'] == 2
+    assert report['Rejected'] == 1
+    assert [leg['Status'] for leg in report['Legs']] == ['Filled', 'Rejected', 'Filled']
+    assert [leg['PositionId'] is not None for leg in report['Legs']] == [True, False, True]
+    assert report['Legs'][1]['Error'] == 'Invalid stops'
+    assert report['Legs'][1]['Code'] == 'TRADE_RETCODE_INVALID_STOPS'
+
+    # every leg is sent once, nothing is retried, closed or cancelled
+    assert sorted(request[-1] for request in connection.requests) == [1.09, 1.095, 1.1]
+    assert {request[0] for request in connection.requests} == {'create_market_buy_order'}
+
+
+def test_pending_legs_are_placed_at_the_entry():
+    trade = Sized("SELL LIMIT EURUSD 1.0850\nSL 1.0900\nTP1 1.0800\nTP2 1.0750")
+    connection = Connection(rejected=1.08)
+
+    report = asyncio.run(run.SubmitOrders(connection, trade, 'first'))
+
+    assert [leg['Status'] for leg in report['Legs']] == ['Rejected', 'Placed']
+    assert report['Legs'][1]['OrderId'] is not None
+    assert sorted(connection.requests) == [('create_limit_sell_order', 'EURUSD', 0.1, 1.085, 1.09, 1.075), ('create_limit_sell_order', 'EURUSD', 0.1, 1.085, 1.09, 1.08)]
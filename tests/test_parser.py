@@ -0,0 +1,92 @@
+import io
+
+import pytest
+
+import run
+from run import OrderType, ParseSignal
+
+
+# signal text, then order type, symbol, entry, stop loss and take profits of the parsed trade
+CORPUS = [
+    ("BUY EURUSD\nEntry NOW\nSL 1.0800\nTP 1.0900", OrderType.BUY, 'EURUSD', None, 1.08, (1.09,)),
+    ("Sell Limit #GBP/JPY @ 190.50\nS/L: 191.00\nTP1: 190.00\nTP2: 189.50", OrderType.SELL_LIMIT, 'GBPJPY', 190.5, 191.0, (190.0, 189.5)),
+    ("buy stop gold 1,920.50\nsl 1,915.00\ntp 1,930.00", OrderType.BUY_STOP, 'XAUUSD', 1920.5, 1915.0, (1930.0,)),
+    ("SL 1.0800\nTP 1.0900\nBUY LIMIT EURUSD.m 1.0850", OrderType.BUY_LIMIT, 'EURUSD', 1.085, 1.08, (1.09,)),
+    ("BUY LIMIT EURUSD 1,0850\nSL 1,0800\nTP 1,0900", OrderType.BUY_LIMIT, 'EURUSD', 1.085, 1.08, (1.09,)),
+    ("Buy Limit USDJPY\nEntry 150.20 - 150.00\nSL 149.50\nTP 151.00 151.50", OrderType.BUY_LIMIT, 'USDJPY', 150.2, 149.5, (151.0, 151.5)),
+    ("Take Profit 1 = 1.0900\nStop Loss 1.0800\nBuy Limit EURUSD @ 1.0850", OrderType.BUY_LIMIT, 'EURUSD', 1.085, 1.08, (1.09,)),
+    # a label digit followed by a comma is part of the label, not a take profit at 1.0
+    ("SELL GBPJPY\nSL 190.50\nTP 189.00\nClose half at TP1, move SL to BE", OrderType.SELL, 'GBPJPY', None, 190.5, (189.0,)),
+    ("SELL GBPJPY\nSL 190.50\nTP 189.00\nClose half at TP1", OrderType.SELL, 'GBPJPY', None, 190.5, (189.0,)),
+    # distances in pips, points or percent annotate a take profit instead of adding one
+    ("BUY EURUSD\nSL 1.0800\nTP 1.1200 (40 pips)", OrderType.BUY, 'EURUSD', None, 1.08, (1.12,)),
+    ("BUY EURUSD\nSL 1.0800\nTP1 1.1200 - 40 pips\nTP2 1.1300", OrderType.BUY, 'EURUSD', None, 1.08, (1.12, 1.13)),
+    ("SELL EURUSD\nSL 1.1300\nTP 1.1000 (30 points)\nTP 1.0950 2%", OrderType.SELL, 'EURUSD', None, 1.13, (1.1, 1.095)),
+    # a numbered take profit label has a single price
+    ("BUY EURUSD\nSL 1.0800\nTP1 1.1200 40\nTP2 1.1300", OrderType.BUY, 'EURUSD', None, 1.08, (1.12, 1.13)),
+    # a comma before three digits of an FX quote is a decimal comma
+    ("EURUSD sell limit 1,085 / sl 1,088 / tp 1,080", OrderType.SELL_LIMIT, 'EURUSD', 1.085, 1.088, (1.08,)),
+    ("EURUSD sell limit 1,085 / sl 1.0880 / tp 1.0800", OrderType.SELL_LIMIT, 'EURUSD', 1.085, 1.088, (1.08,)),
+    # and a thousands separator for gold, or next to prices of the same size
+    ("XAUUSD buy limit 1,920 / sl 1,915 / tp 1,930", OrderType.BUY_LIMIT, 'XAUUSD', 1920.0, 1915.0, (1930.0,)),
+    ("XAUUSD buy limit 1,920 / sl 1915.5 / tp 1930", OrderType.BUY_LIMIT, 'XAUUSD', 1920.0, 1915.5, (1930.0,)),
+]
+
+# texts that are not complete or valid signals
+INVALID = [
+    "EURUSD looking strong today",
+    "BUY EURUSD\nSL 1.0800",
+    "BUY ABCDEF NOW\nSL 1.0800\nTP 1.0900",
+    "SELL LIMIT EURUSD 1.0850\nSL 1.0800\nTP 1.0900",
+]
+
+
+@pytest.mark.parametrize('text, orderType, symbol, entry, stopLoss, takeProfits', CORPUS)
+def test_parses_corpus(text, orderType, symbol, entry, stopLoss, takeProfits):
+    trade = ParseSignal(text, 0.01)
+
+    assert trade is not None
+    assert trade.order_type is orderType
+    assert trade.symbol == symbol
+    assert trade.entry == pytest.approx(entry) if entry is not None else trade.entry is None
+    assert trade.stop_loss == pytest.approx(stopLoss)
+    assert trade.take_profits == pytest.approx(takeProfits)
+    assert trade.risk_factor == 0.01
+
+
+@pytest.mark.parametrize('text', INVALID)
+def test_refuses_invalid_signals(text):
+    assert ParseSignal(text, 0.01) is None
+
+
+def test_entry_range():
+    trade = ParseSignal("Buy Limit USDJPY\nEntry 150.20 - 150.00\nSL 149.50\nTP 151.00", 0.01)
+
+    assert trade.entry_range == (150.0, 150.2)
+
+
+@pytest.mark.parametrize('text, thousands, expected', [
+    ('1,920.50', True, 1920.5),
+    ('1,0850', True, 1.085),
+    ('1,085', True, 1085.0),
+    ('1,085', False, 1.085),
+    ('190.5', False, 190.5),
+])
+def test_parse_price(text, thousands, expected):
+    assert run.ParsePrice(text, thousands) == pytest.approx(expected)
+
+
+def test_thousands_separated_follows_the_other_prices():
+    assert run.ThousandsSeparated(['1,085', '1.0880'], 'EURUSD') is False
+    assert run.ThousandsSeparated(['1,920', '1915.5'], 'EURUSD') is True
+    assert run.ThousandsSeparated(['1,920', '1,915'], 'XAUUSD') is True
+    assert run.ThousandsSeparated(['1,085', '1,088'], 'EURUSD') is False
+
+
+def test_parse_batch():
+    lines = io.StringIO("BUY EURUSD\nSL 1.0800\nTP 1.0900\nSELL GBPJPY\nTP 189.00\n\nSell Limit USDJPY 150.20\nSL 150.70\nTP 149.50\n")
+
+    trades, invalid = run.ParseBatch(lines, 1)
+
+    assert [(trade.order_type, trade.symbol) for trade in trades] == [(OrderType.BUY, 'EURUSD'), (OrderType.SELL_LIMIT, 'USDJPY')]
+    assert invalid == ['SELL GBPJPY']
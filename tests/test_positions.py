@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+
+import run
+from run import ParseSignal
+
+
+TRADE = ParseSignal("BUY LIMIT EURUSD 1.0850\nSL 1.0800\nTP1 1.0900\nTP2 1.0950", 1)
+
+REPORT = {'Legs': [{'PositionId': '1', 'OrderId': '1', 'TP': 1.09, 'Status': 'Accepted'}, {'PositionId': '2', 'OrderId': '2', 'TP': 1.095, 'Status': 'Accepted'}]}
+
+
+class ConnectionManager:
+    async def get_connection(self, account_id):
+        return None
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    monkeypatch.setattr(run, 'CONNECTION_MANAGER', ConnectionManager())
+    monkeypatch.setattr(run, 'QUOTE_CACHE', run.QuoteCache())
+
+    manager = run.PositionManager('breakeven')
+    manager.requests = []
+
+    async def request(account_id, method, *arguments):
+        manager.requests.append((method,) + arguments)
+
+    manager._request = request
+
+    return manager
+
+
+def TakeProfit(manager, bid, ask):
+    async def main():
+        manager.track('first', TRADE, REPORT)
+        run.QUOTE_CACHE.record('first', [{'symbol': 'EURUSD', 'bid': bid, 'ask': ask}])
+
+        manager.on_deal('first', {'entryType': 'DEAL_ENTRY_OUT', 'positionId': '1', 'reason': 'DEAL_REASON_TP'})
+
+        for _ in range(5):
+            await asyncio.sleep(0)
+
+    asyncio.run(main())
+
+
+def test_stop_loss_moves_to_the_entry(manager):
+    TakeProfit(manager, 1.0890, 1.0891)
+
+    assert manager.requests == [('modify_position', '2', 1.085, 1.095)]
+
+
+def test_legs_are_closed_when_the_price_is_back_at_the_entry(manager):
+    TakeProfit(manager, 1.0849, 1.0850)
+
+    assert manager.requests == [('close_position', '2')]
+
+
+def test_groups_without_open_legs_are_pruned(manager):
+    async def main():
+        manager.track('first', TRADE, REPORT)
+        manager.track('second', TRADE, REPORT)
+
+    asyncio.run(main())
+
+    manager.prune('first', {'2'})
+    assert set(manager.groups) == {('first', '2'), ('second', '1'), ('second', '2')}
+
+    manager.prune('first', set())
+    assert set(manager.groups) == {('second', '1'), ('second', '2')}
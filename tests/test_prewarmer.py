@@ -0,0 +1,42 @@
+import asyncio
+
+import run
+
+
+class Prewarmer(run.Prewarmer):
+    async def _warm(self, account):
+        await asyncio.sleep(60)
+
+
+def test_unused_snapshots_expire_on_a_timer():
+    async def main():
+        prewarmer = Prewarmer(ttl=0.01)
+
+        await prewarmer._start([{'AccountId': 'first'}])
+        task = prewarmer.snapshots['first'][1]
+
+        await asyncio.sleep(0.05)
+
+        return prewarmer, task
+
+    prewarmer, task = asyncio.run(main())
+
+    assert prewarmer.snapshots == {}
+    assert task.cancelled()
+
+
+def test_snapshots_handed_to_a_trade_are_not_cancelled():
+    async def main():
+        prewarmer = Prewarmer(ttl=0.01)
+
+        await prewarmer._start([{'AccountId': 'first'}])
+        entry = prewarmer.snapshots.pop('first')
+
+        await asyncio.sleep(0.05)
+
+        cancelled = entry[1].cancelled()
+        entry[1].cancel()
+
+        return cancelled
+
+    assert not asyncio.run(main())
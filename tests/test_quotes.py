@@ -0,0 +1,51 @@
+import run
+
+
+def Price(symbol, bid, ask):
+    return {'symbol': symbol, 'bid': bid, 'ask': ask}
+
+
+def test_quotes_are_kept_per_account():
+    cache = run.QuoteCache()
+
+    cache.record('first', [Price('EURUSD', 1.0850, 1.0851)])
+    cache.record('second', [Price('EURUSD', 1.0840, 1.0843)])
+
+    assert cache.get('first', 'EURUSD')['bid'] == 1.0850
+    assert cache.get('second', 'EURUSD')['bid'] == 1.0840
+    assert cache.get('third', 'EURUSD') is None
+
+
+def test_stale_quotes_are_ignored():
+    cache = run.QuoteCache(max_age=0)
+
+    cache.record('first', [Price('EURUSD', 1.0850, 1.0851)])
+
+    assert cache.get('first', 'EURUSD') is None
+    assert cache.get('first', 'EURUSD', max_age=60) is not None
+
+
+def test_spread_spikes_are_judged_per_account():
+    cache = run.QuoteCache()
+
+    for _ in range(20):
+        cache.record('first', [Price('EURUSD', 1.0850, 1.0851)])
+        cache.record('second', [Price('EURUSD', 1.0850, 1.0853)])
+
+    # a 4 pip spread is a spike on the first broker but not on the second
+    cache.record('first', [Price('EURUSD', 1.0850, 1.0854)])
+    cache.record('second', [Price('EURUSD', 1.0850, 1.0854)])
+
+    assert cache.is_spread_spiking('first', 'EURUSD')
+    assert not cache.is_spread_spiking('second', 'EURUSD')
+
+
+def test_spread_of_the_order_quote_is_used():
+    cache = run.QuoteCache()
+
+    for _ in range(20):
+        cache.record('first', [Price('EURUSD', 1.0850, 1.0851)])
+
+    assert not cache.is_spread_spiking('first', 'EURUSD')
+    assert cache.is_spread_spiking('first', 'EURUSD', spread=0.0005)
+    assert not cache.is_spread_spiking('first', 'EURUSD', min_samples=50, spread=0.0005)
@@ -0,0 +1,99 @@
+import dataclasses
+import types
+
+import pytest
+
+import run
+from run import ParseSignal
+
+
+ACCOUNT = {'AccountId': 'first', 'Name': 'Main'}
+
+
+class AccountStates:
+    def get(self, account_id):
+        return types.SimpleNamespace()
+
+
+@pytest.fixture(autouse=True)
+def states(monkeypatch):
+    monkeypatch.setattr(run, 'ACCOUNT_STATES', AccountStates())
+
+
+def Sized(text, lots, provider='chat'):
+    trade = ParseSignal(text, 0.01)
+
+    # 50 pips at 10 per pip and lot
+    return dataclasses.replace(trade, pip_size=0.0001, pip_value=10, position_size=lots, stop_loss_pips=50, provider=provider)
+
+
+BUY = "BUY LIMIT EURUSD 1.0850\nSL 1.0800\nTP 1.0900"
+SELL = "SELL LIMIT EURUSD 1.0850\nSL 1.0900\nTP 1.0800"
+
+
+def Report(*orderIds, error=None):
+    return {'Legs': [{'PositionId': None, 'OrderId': orderId, 'Volume': 0.2, 'Error': error} for orderId in orderIds]}
+
+
+def test_trades_above_the_risk_factor_are_refused():
+    engine = run.RiskEngine()
+
+    assert engine.check(ACCOUNT, Sized(BUY, 0.2), 10000) is None
+    assert 'risk factor' in engine.check(ACCOUNT, Sized(BUY, 0.21), 10000)
+
+
+def test_reservations_count_against_the_account_limit():
+    engine = run.RiskEngine(account_risk=0.02, currency_risk=0, provider_risk=0)
+
+    key = engine.reserve('first', Sized(BUY, 0.2))
+
+    assert engine.check(ACCOUNT, Sized(BUY, 0.2), 10000) is None
+    engine.reserve('first', Sized(BUY, 0.2))
+    assert 'already risk' in engine.check(ACCOUNT, Sized(BUY, 0.2), 10000)
+
+    engine.release('first', key, Sized(BUY, 0.2))
+    assert engine.check(ACCOUNT, Sized(BUY, 0.2), 10000) is None
+
+
+def test_hedged_trades_pass_the_currency_limit():
+    engine = run.RiskEngine(account_risk=0, currency_risk=0.01, provider_risk=0)
+
+    engine.reserve('first', Sized(BUY, 0.2))
+
+    assert 'on EUR' in engine.check(ACCOUNT, Sized(BUY, 0.1), 10000)
+    assert engine.check(ACCOUNT, Sized(SELL, 0.2), 10000) is None
+
+
+def test_check_has_no_side_effects():
+    engine = run.RiskEngine(account_risk=0.01, provider_risk=0.01)
+    engine.reserve('first', Sized(BUY, 0.2))
+
+    before = (dict(engine.values), dict(engine.account_totals), dict(engine.leg_counts), dict(engine.provider_totals))
+
+    assert engine.check(ACCOUNT, Sized(BUY, 0.2, provider='other'), 10000) is not None
+    assert engine.check({'AccountId': 'second', 'Name': 'Other'}, Sized(BUY, 0.2), 10000) is None
+
+    assert (engine.values, dict(engine.account_totals), dict(engine.leg_counts), dict(engine.provider_totals)) == before
+
+
+def test_providers_of_failed_and_cancelled_legs_are_forgotten():
+    engine = run.RiskEngine()
+    trade = Sized(BUY, 0.2)
+
+    engine.release('first', engine.reserve('first', trade), trade, Report('1', '2'))
+    engine.release('first', engine.reserve('first', trade), trade, Report('3', error='Rejected'))
+
+    assert set(engine.providers) == {('first', '1'), ('first', '2')}
+
+    # order 1 is filled and continues as position 1, order 2 is cancelled
+    engine.update('first', 'position', {'id': '1', 'symbol': 'EURUSD', 'type': 'POSITION_TYPE_BUY', 'openPrice': 1.085, 'stopLoss': 1.08, 'volume': 0.2})
+    engine.remove('first', 'order', '1')
+    engine.remove('first', 'order', '2')
+
+    assert set(engine.providers) == {('first', '1')}
+    assert engine.provider_totals[('first', 'chat')] == pytest.approx(100)
+
+    engine.remove('first', 'position', '1')
+
+    assert engine.providers == {}
+    assert engine.account_totals['first'] == pytest.approx(0)
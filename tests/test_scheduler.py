@@ -0,0 +1,100 @@
+import asyncio
+
+import run
+
+
+def test_bucket_allows_a_burst_then_the_rate():
+    bucket = run.TokenBucket(10, capacity=3)
+    now = bucket.updated
+
+    for _ in range(3):
+        assert bucket.delay(now) == 0
+        bucket.take()
+
+    assert bucket.delay(now) == 0.1
+
+    # tokens come back at the rate and never above the capacity
+    assert bucket.delay(now + 0.1) == 0
+    assert bucket.delay(now + 60) == 0
+    assert bucket.tokens == 3
+
+
+def test_bucket_slows_down_and_recovers():
+    bucket = run.TokenBucket(10)
+    now = bucket.updated
+
+    bucket.slow_down()
+
+    assert bucket.rate == 5
+    assert bucket.tokens == 0
+    assert bucket.delay(now) == 0.2
+
+    for _ in range(20):
+        bucket.slow_down()
+
+    assert bucket.rate == 0.1
+
+    for _ in range(100):
+        bucket.speed_up()
+
+    assert bucket.rate == 10
+
+
+def test_scheduler_sends_market_orders_first():
+    order = []
+
+    async def request(name):
+        order.append(name)
+
+    async def main():
+        scheduler = run.OrderScheduler({'trade': 10, 'information': 10}, account_rate=10)
+
+        # uses up the only token, the others wait for the next one
+        await scheduler.call('first', 'information', run.PRIORITY_INFORMATION, request, 'warm')
+
+        await asyncio.gather(
+            scheduler.call('first', 'information', run.PRIORITY_INFORMATION, request, 'information'),
+            scheduler.call('first', 'trade', run.PRIORITY_PENDING, request, 'pending'),
+            scheduler.call('first', 'trade', run.PRIORITY_MARKET, request, 'market'),
+        )
+
+        scheduler.workers['first'].cancel()
+
+    asyncio.run(main())
+
+    assert order == ['warm', 'market', 'pending', 'information']
+
+
+def test_scheduler_retries_rate_limited_requests():
+    attempts = []
+
+    class RateLimited(Exception):
+        stringCode = 'TRADE_RETCODE_TOO_MANY_REQUESTS'
+
+    async def request():
+        attempts.append(len(attempts))
+
+        if len(attempts) < 2:
+            raise RateLimited()
+
+        return 'accepted'
+
+    async def main():
+        scheduler = run.OrderScheduler({'trade': 1000}, account_rate=1000, max_retries=1)
+        scheduler.paused_until = PausedUntil()
+
+        result = await scheduler.call('first', 'trade', run.PRIORITY_MARKET, request)
+        scheduler.workers['first'].cancel()
+
+        return result, scheduler.buckets['first']['trade'].rate
+
+    # retries right away instead of sleeping for the recommended time
+    class PausedUntil(dict):
+        def __setitem__(self, key, value):
+            super().__setitem__(key, 0)
+
+    result, rate = asyncio.run(main())
+
+    assert result == 'accepted'
+    assert attempts == [0, 1]
+    assert rate < 1000
@@ -0,0 +1,83 @@
+import pytest
+
+import run
+from run import ParseSignal
+
+
+def Specification(symbol, digits, base, profit, minVolume=0.01, maxVolume=100, volumeStep=0.01):
+    return {'symbol': symbol, 'digits': digits, 'point': 10 ** -digits, 'tickSize': 10 ** -digits, 'contractSize': 100000, 'baseCurrency': base, 'profitCurrency': profit, 'minVolume': minVolume, 'maxVolume': maxVolume, 'volumeStep': volumeStep}
+
+
+EURUSD = Specification('EURUSD', 5, 'EUR', 'USD')
+USDJPY = Specification('USDJPY', 3, 'USD', 'JPY')
+EURGBP = Specification('EURGBP', 5, 'EUR', 'GBP')
+
+
+# symbol, specification, entry, then the expected pip size
+PIP_SIZES = [
+    ('EURUSD', EURUSD, 1.085, 0.0001),
+    ('USDJPY', USDJPY, 150.2, 0.01),
+    ('EURUSD', dict(EURUSD, pipSize=0.001), 1.085, 0.001),
+    ('EURUSD', dict(EURUSD, digits=4, point=0.0001), 1.085, 0.0001),
+    ('XAUUSD', Specification('XAUUSD', 2, 'XAU', 'USD'), 1920.5, 0.1),
+    # without a specification the pip size is guessed from the price
+    ('EURUSD', None, 1.085, 0.0001),
+    ('USDJPY', None, 150.2, 0.01),
+]
+
+
+@pytest.mark.parametrize('symbol, specification, entry, pipSize', PIP_SIZES)
+def test_pip_size(symbol, specification, entry, pipSize):
+    assert run.GetPipSize(symbol, specification, entry) == pytest.approx(pipSize)
+
+
+# specification, pip size, entry, account currency, price, then the expected value of a pip per lot
+PIP_VALUES = [
+    (EURUSD, 0.0001, 1.085, 'USD', None, 10),
+    # a JPY profit in a JPY account, and a USD account converting through the base currency
+    (USDJPY, 0.01, 150.0, 'JPY', None, 1000),
+    (USDJPY, 0.01, 150.0, 'USD', None, 1000 / 150),
+    # a cross with neither currency of the account converts with the tick value of the broker
+    (EURGBP, 0.0001, 0.855, 'USD', {'lossTickValue': 1.27}, 12.7),
+    (None, 0.0001, 1.085, 'USD', None, 10),
+]
+
+
+@pytest.mark.parametrize('specification, pipSize, entry, currency, price, pipValue', PIP_VALUES)
+def test_pip_value(specification, pipSize, entry, currency, price, pipValue):
+    assert run.GetPipValue(specification, pipSize, entry, currency, price) == pytest.approx(pipValue)
+
+
+# specification, balance, risk factor, stop loss pips, pip value, legs, account limits, then the expected lots
+POSITION_SIZES = [
+    (EURUSD, 10000, 0.01, 50, 10, 1, {}, 0.2),
+    # every leg is rounded down to the volume step
+    (EURUSD, 10000, 0.01, 30, 10, 1, {}, 0.33),
+    (EURUSD, 10000, 0.01, 30, 10, 3, {}, 0.33),
+    (dict(EURUSD, volumeStep=0.1), 10000, 0.01, 30, 10, 2, {}, 0.2),
+    # the broker's and the account's minimum and maximum lot sizes
+    (dict(EURUSD, minVolume=0.1), 1000, 0.01, 50, 10, 1, {}, 0.1),
+    (EURUSD, 1000, 0.01, 50, 10, 2, {'minLot': 0.05}, 0.1),
+    (dict(EURUSD, maxVolume=1), 1000000, 0.01, 50, 10, 2, {}, 2),
+    (EURUSD, 1000000, 0.01, 50, 10, 1, {'maxLot': 5}, 5),
+    (EURUSD, 10000, 0.01, 0, 10, 2, {}, 0.02),
+]
+
+
+@pytest.mark.parametrize('specification, balance, riskFactor, stopLossPips, pipValue, legs, limits, lots', POSITION_SIZES)
+def test_position_size(specification, balance, riskFactor, stopLossPips, pipValue, legs, limits, lots):
+    assert run.GetPositionSize(specification, balance, riskFactor, stopLossPips, pipValue, legs, limits.get('minLot'), limits.get('maxLot')) == pytest.approx(lots)
+
+
+def test_size_trade():
+    trade = ParseSignal("Buy Limit USDJPY 150.00\nSL 149.50\nTP1 150.50\nTP2 151.00", 0.01)
+
+    trade = run.SizeTrade(trade, 10000, USDJPY, 'USD', account={'MaxLot': 1})
+
+    assert trade.pip_size == pytest.approx(0.01)
+    assert trade.stop_loss_pips == 50
+    assert trade.pip_value == pytest.approx(1000 / 150)
+
+    # 100 at risk over 50 pips of 6.67 is 0.3 lots, or 0.15 per leg
+    assert trade.position_size == pytest.approx(0.3)
+    assert trade.leg_volume == pytest.approx(0.15)
@@ -0,0 +1,38 @@
+import dataclasses
+import json
+import pickle
+
+import pytest
+
+from run import OrderType, ParseSignal, Side, Trade
+
+
+TRADES = [
+    ParseSignal("BUY EURUSD\nSL 1.0800\nTP1 1.0900\nTP2 1.0950", 0.01),
+    ParseSignal("Buy Limit USDJPY\nEntry 150.20 - 150.00\nSL 149.50\nTP 151.00 151.50", 0.02),
+    dataclasses.replace(ParseSignal("SELL STOP GBPJPY 190.50\nSL 191.00\nTP 189.00", 0.01), broker_symbol='GBPJPY.m', pip_size=0.01, pip_value=6.67, position_size=0.3, leg_volume=0.3, stop_loss_pips=50, provider='-100123'),
+]
+
+
+@pytest.mark.parametrize('trade', TRADES)
+def test_round_trip(trade):
+    assert Trade.from_dict(trade.to_dict()) == trade
+
+    # the journal stores the trades as JSON and the worker processes receive them pickled
+    assert Trade.from_dict(json.loads(json.dumps(trade.to_dict()))) == trade
+    assert pickle.loads(pickle.dumps(trade)) == trade
+
+
+def test_serialized_fields():
+    market, pending, sized = (trade.to_dict() for trade in TRADES)
+
+    assert market == {'OrderType': 'Buy', 'Symbol': 'EURUSD', 'Entry': 'NOW', 'StopLoss': 1.08, 'TP': [1.09, 1.095], 'RiskFactor': 0.01}
+    assert pending['EntryRange'] == (150.0, 150.2)
+    assert sized['Provider'] == '-100123'
+
+    restored = Trade.from_dict(json.loads(json.dumps(pending)))
+
+    assert restored.order_type is OrderType.BUY_LIMIT
+    assert restored.side is Side.BUY
+    assert restored.take_profits == (151.0, 151.5)
+    assert restored.entry_range == (150.0, 150.2)
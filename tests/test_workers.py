@@ -0,0 +1,67 @@
+import asyncio
+import queue
+
+import pytest
+
+import run
+
+
+class Process:
+    def __init__(self, target, args, name, daemon):
+        self.alive = True
+        self.exitcode = None
+
+    def start(self):
+        pass
+
+    def is_alive(self):
+        return self.alive
+
+    def join(self, timeout):
+        pass
+
+
+class Context:
+    Queue = queue.Queue
+    Process = Process
+
+
+def test_dead_workers_fail_only_their_own_jobs():
+    pool = run.WorkerPool(1, check_interval=0.01)
+    pool.context = Context()
+
+    async def main():
+        pool.start()
+
+        first = asyncio.ensure_future(pool.call('account', 'execute'))
+        await asyncio.sleep(0)
+
+        # the worker dies while results of other jobs keep arriving
+        pool.processes[0].alive = False
+        pool.processes[0].exitcode = -9
+
+        for _ in range(50):
+            pool.results.put((0, None, None))
+            await asyncio.sleep(0.002)
+
+            if first.done():
+                break
+
+        with pytest.raises(Exception, match='Worker 0 exited'):
+            await first
+
+        second = asyncio.ensure_future(pool.call('account', 'execute'))
+        await asyncio.sleep(0.05)
+
+        assert not second.done()
+        assert pool.generations[0] == 2
+
+        jobId, name, arguments = pool.requests[0].get_nowait()
+        pool.results.put((jobId, 'filled', None))
+
+        return await second
+
+    try:
+        assert asyncio.run(main()) == 'filled'
+    finally:
+        pool.close(0)